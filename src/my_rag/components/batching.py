@@ -0,0 +1,205 @@
+import gc
+import logging
+from typing import Callable, Iterator, List, Optional, Sequence, Tuple, TypeVar
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+R = TypeVar("R")
+
+
+def is_oom_error(error: BaseException) -> bool:
+    """
+    Returns whether an exception is an out-of-memory allocation failure.
+    """
+    if isinstance(error, MemoryError):
+        return True
+    oom_type = getattr(torch.cuda, "OutOfMemoryError", None)
+    if oom_type is not None and isinstance(error, oom_type):
+        return True
+    return isinstance(error, RuntimeError) and "out of memory" in str(error).lower()
+
+
+class BatchPolicy:
+    """
+    Decides how many items go into each batch.
+
+    Batches are capped both by item count and, if `max_tokens` is set, by their
+    padded token cost (items x longest item). With `adaptive` enabled, both caps
+    are halved when a batch fails with an out-of-memory error and the batch is
+    retried; after `grow_after` consecutive successes they are doubled again, up
+    to the configured values. Every repeated failure doubles the number of
+    successes required before the next growth, so the policy settles instead of
+    oscillating around the largest size that fits.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = 32,
+        max_tokens: Optional[int] = None,
+        adaptive: bool = False,
+        grow_after: int = 16,
+    ):
+        """
+        Args:
+            batch_size (int): Maximum number of items per batch.
+            max_tokens (Optional[int]): Maximum padded tokens per batch.
+            adaptive (bool): Whether to shrink on out-of-memory errors and grow
+                back after successes.
+            grow_after (int): Consecutive successful batches before growing.
+        """
+        if batch_size < 1:
+            raise ValueError(f"batch_size must be at least 1, got {batch_size}")
+        if max_tokens is not None and max_tokens < 1:
+            raise ValueError(f"max_tokens must be at least 1, got {max_tokens}")
+
+        self.batch_size = batch_size
+        self.max_tokens = max_tokens
+        self.adaptive = adaptive
+        self.grow_after = grow_after
+        # Fraction of the configured limits currently in use
+        self.scale = 1.0
+        self._successes = 0
+        self._required_successes = grow_after
+
+    @property
+    def current_batch_size(self) -> int:
+        return max(1, int(self.batch_size * self.scale))
+
+    @property
+    def current_max_tokens(self) -> Optional[int]:
+        if self.max_tokens is None:
+            return None
+        return max(1, int(self.max_tokens * self.scale))
+
+    def next_batch_end(
+        self, lengths: Optional[Sequence[int]], start: int, end: int
+    ) -> int:
+        """
+        Returns the end index of the batch starting at `start`.
+
+        Args:
+            lengths (Optional[Sequence[int]]): Token count of each item, in
+                processing order. Only needed when max_tokens is set.
+            start (int): Index of the first item of the batch.
+            end (int): Index one past the last item available.
+        """
+        stop = min(end, start + self.current_batch_size)
+        max_tokens = self.current_max_tokens
+        if max_tokens is None or lengths is None:
+            return stop
+
+        longest = 0
+        for i in range(start, stop):
+            longest = max(longest, lengths[i])
+            # Always take at least one item, even if it exceeds the budget
+            if i > start and (i - start + 1) * longest > max_tokens:
+                return i
+        return stop
+
+    def on_success(self):
+        """Records a successful batch, growing the limits if due."""
+        if not self.adaptive or self.scale >= 1.0:
+            return
+        self._successes += 1
+        if self._successes >= self._required_successes:
+            self.scale = min(1.0, self.scale * 2)
+            self._successes = 0
+            logger.info(
+                f"Growing batches to {self.scale:.3g}x of the configured limits"
+            )
+
+    def on_oom(self, batch_items: int) -> bool:
+        """
+        Records an out-of-memory failure.
+
+        Args:
+            batch_items (int): Size of the batch that failed.
+
+        Returns:
+            bool: Whether the batch should be retried with smaller limits.
+        """
+        if not self.adaptive or batch_items <= 1:
+            return False
+        if self.scale < 1.0:
+            self._required_successes = min(self._required_successes * 2, 1024)
+        # Shrink below the failed batch, not just below the configured limit
+        self.scale = min(self.scale, batch_items / self.batch_size) / 2
+        self._successes = 0
+        logger.warning(
+            f"Out of memory on a batch of {batch_items} items; "
+            f"retrying with batches of at most {self.current_batch_size} items"
+        )
+        return True
+
+    def run(
+        self,
+        num_items: int,
+        process_fn: Callable[[int, int], R],
+        lengths: Optional[Sequence[int]] = None,
+    ) -> Iterator[Tuple[int, int, R]]:
+        """
+        Processes items [0, num_items) in batches chosen by this policy.
+
+        Args:
+            num_items (int): Number of items to process.
+            process_fn (Callable[[int, int], R]): Processes items [start, end).
+            lengths (Optional[Sequence[int]]): Token count of each item.
+
+        Yields:
+            Tuple[int, int, R]: Start, end and result of each batch, in order.
+        """
+        start = 0
+        while start < num_items:
+            end = self.next_batch_end(lengths, start, num_items)
+            failed = False
+            try:
+                result = process_fn(start, end)
+            except Exception as e:
+                if not is_oom_error(e) or not self.on_oom(end - start):
+                    raise
+                failed = True
+            if failed:
+                # Outside the except block, so the traceback no longer pins
+                # the failed batch's tensors
+                release_memory()
+                continue
+            self.on_success()
+            yield start, end, result
+            start = end
+
+
+def release_memory():
+    """
+    Releases cached device memory and runs garbage collection.
+    """
+    gc.collect()
+    if torch.cuda.is_available():
+        torch.cuda.empty_cache()
+
+
+def batched_apply(
+    items: List,
+    process_fn: Callable[[List], List[R]],
+    policy: BatchPolicy,
+    lengths: Optional[Sequence[int]] = None,
+) -> List[R]:
+    """
+    Applies a batch function to a list of items and concatenates the results.
+
+    Args:
+        items (List): Items to process.
+        process_fn (Callable[[List], List[R]]): Returns one result per item.
+        policy (BatchPolicy): Batching policy.
+        lengths (Optional[Sequence[int]]): Token count of each item.
+
+    Returns:
+        List[R]: Results in item order.
+    """
+    results: List[R] = []
+    for start, end, batch_results in policy.run(
+        len(items), lambda start, end: process_fn(items[start:end]), lengths
+    ):
+        results.extend(batch_results)
+    return results
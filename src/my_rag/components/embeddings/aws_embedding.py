@@ -1,10 +1,51 @@
 import boto3
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Optional
 import numpy as np
 import json
+from botocore.config import Config
 from botocore.exceptions import ClientError
 from .base import BaseEmbedding
 
+# Error codes worth retrying with backoff; anything else fails immediately
+RETRYABLE_ERROR_CODES = {
+    "ThrottlingException",
+    "TooManyRequestsException",
+    "ServiceUnavailableException",
+    "ModelNotReadyException",
+}
+
+
+class _TokenBucket:
+    """
+    Thread-safe token bucket limiting the request rate across worker threads.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Blocks until a token is available, then consumes it."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
 
 class AWSBedrockEmbedding(BaseEmbedding):
     """
@@ -18,6 +59,12 @@ class AWSBedrockEmbedding(BaseEmbedding):
         aws_session_token: Optional[str] = None,
         region_name: str = "us-east-1",
         model_id: str = "amazon.titan-embed-text-v2:0",
+        max_concurrency: int = 8,
+        requests_per_second: Optional[float] = None,
+        max_retries: int = 6,
+        backoff_base: float = 0.5,
+        backoff_max: float = 20.0,
+        endpoint_url: Optional[str] = None,
         **kwargs,
     ):
         """
@@ -29,9 +76,30 @@ class AWSBedrockEmbedding(BaseEmbedding):
             aws_session_token (Optional[str]): AWS session token
             region_name (str): AWS region name
             model_id (str): Bedrock model ID for embeddings
+            max_concurrency (int): Maximum number of requests in flight. Also sizes
+                the client's connection pool.
+            requests_per_second (Optional[float]): Client-side rate limit shared by
+                all threads. None disables rate limiting.
+            max_retries (int): Retries per text on throttling or unavailability
+            backoff_base (float): Initial backoff in seconds, doubled per retry
+            backoff_max (float): Upper bound on a single backoff in seconds
+            endpoint_url (Optional[str]): Override for the bedrock-runtime endpoint,
+                e.g. a local stub server
             **kwargs: Additional keyword arguments
         """
+        if max_concurrency < 1:
+            raise ValueError(
+                f"max_concurrency must be at least 1, got {max_concurrency}"
+            )
+
         self.model_id = model_id
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.rate_limiter = (
+            _TokenBucket(requests_per_second) if requests_per_second else None
+        )
 
         try:
             self.session = boto3.Session(
@@ -39,12 +107,50 @@ class AWSBedrockEmbedding(BaseEmbedding):
                 aws_secret_access_key=aws_secret_access_key,
                 aws_session_token=aws_session_token,
             )
+            # One client is shared by all threads; botocore clients are thread
+            # safe and reuse pooled connections. Retries are handled in
+            # _embed_text so they also respect the rate limiter.
             self.client = self.session.client(
-                "bedrock-runtime", region_name=region_name
+                "bedrock-runtime",
+                region_name=region_name,
+                endpoint_url=endpoint_url,
+                config=Config(
+                    max_pool_connections=max_concurrency,
+                    retries={"max_attempts": 1, "mode": "standard"},
+                ),
             )
         except Exception as e:
             raise ValueError(f"Failed to initialize Bedrock client: {str(e)}")
 
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrency)
+
+    def _embed_text(self, text: str) -> List[float]:
+        """
+        Embeds a single text, retrying throttled requests with exponential backoff.
+        """
+        for attempt in range(self.max_retries + 1):
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+            try:
+                response = self.client.invoke_model(
+                    modelId=self.model_id,
+                    contentType="application/json",
+                    accept="application/json",
+                    body=json.dumps({"inputText": text}),
+                )
+                response_body = json.loads(response["body"].read())
+                return response_body["embedding"]
+
+            except ClientError as e:
+                code = e.response.get("Error", {}).get("Code")
+                if code not in RETRYABLE_ERROR_CODES or attempt == self.max_retries:
+                    raise Exception(f"Bedrock API error: {str(e)}")
+                # Full jitter keeps concurrent threads from retrying in lockstep
+                backoff = min(self.backoff_max, self.backoff_base * 2**attempt)
+                time.sleep(random.uniform(0, backoff))
+            except Exception as e:
+                raise Exception(f"Error generating embedding: {str(e)}")
+
     def embed(
         self,
         texts: List[str],
@@ -54,6 +160,9 @@ class AWSBedrockEmbedding(BaseEmbedding):
         """
         Embeds a list of texts using AWS Bedrock.
 
+        Requests are issued concurrently (up to max_concurrency at a time) and the
+        embeddings are returned in input order.
+
         Args:
             texts (List[str]): The texts to embed
             instruction (Optional[str]): Instruction text (not used for Bedrock)
@@ -62,45 +171,19 @@ class AWSBedrockEmbedding(BaseEmbedding):
         Returns:
             np.ndarray: Array of embeddings
         """
-        all_embeddings = []
-
-        for text in texts:
-            if instruction:
-                text = f"{instruction} {text}"
-            try:
-                # Prepare request body
-                body_content = {"inputText": text}
-
-                # Call Bedrock API
-                response = self.client.invoke_model(
-                    modelId=self.model_id,
-                    contentType="application/json",
-                    accept="application/json",
-                    body=json.dumps(body_content),
-                )
-
-                # Parse response
-                response_body = json.loads(response["body"].read())
-                embedding = response_body["embedding"]
-                all_embeddings.append(embedding)
-
-            except ClientError as e:
-                raise Exception(f"Bedrock API error: {str(e)}")
-            except Exception as e:
-                raise Exception(f"Error generating embedding: {str(e)}")
-
-        all_embeddings = np.array(all_embeddings)
-        # # Combine all batches
-        # embeddings = np.vstack(all_embeddings)
+        if instruction:
+            texts = [f"{instruction} {text}" for text in texts]
 
-        # # Normalize embeddings
-        # embeddings = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+        # map() yields results in input order regardless of completion order
+        all_embeddings = list(self.executor.map(self._embed_text, texts))
 
-        return all_embeddings
+        return np.array(all_embeddings)
 
     def clean_up(self):
         """
         Cleans up resources.
         """
+        if hasattr(self, "executor"):
+            self.executor.shutdown(wait=True)
         if hasattr(self, "client"):
             self.client.close()
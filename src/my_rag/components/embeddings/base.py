@@ -1,5 +1,6 @@
 from abc import ABC, abstractmethod
-from typing import List, Any
+from typing import Iterator, List, Any, Optional, Tuple
+import numpy as np
 
 class BaseEmbedding(ABC):
     """
@@ -20,6 +21,104 @@ class BaseEmbedding(ABC):
         """
         pass
 
+    def embed_iter(
+        self, texts: List[str], batch_size: int = 32, **kwargs
+    ) -> Iterator[Tuple[int, np.ndarray]]:
+        """
+        Embeds a list of texts, yielding one block of embeddings at a time.
+
+        Args:
+            texts (List[str]): The texts to embed.
+            batch_size (int): Number of texts per block.
+            **kwargs: Additional keyword arguments passed to `embed`.
+
+        Yields:
+            Tuple[int, np.ndarray]: Offset of the block in `texts` and its embeddings.
+        """
+        for offset in range(0, len(texts), batch_size):
+            embeddings = self.embed(
+                texts[offset : offset + batch_size], batch_size=batch_size, **kwargs
+            )
+            if hasattr(embeddings, "cpu"):
+                embeddings = embeddings.cpu().numpy()
+            yield offset, np.asarray(embeddings, dtype=np.float32)
+
+    def embed_into(self, texts: List[str], out: np.ndarray, **kwargs) -> np.ndarray:
+        """
+        Embeds a list of texts directly into a preallocated array.
+
+        Args:
+            texts (List[str]): The texts to embed.
+            out (np.ndarray): Array (or np.memmap) of shape (len(texts), dim).
+            **kwargs: Additional keyword arguments passed to `embed_iter`.
+
+        Returns:
+            np.ndarray: The `out` array.
+        """
+        if len(out) != len(texts):
+            raise ValueError(
+                f"Output array has {len(out)} rows but {len(texts)} texts were given"
+            )
+        for offset, embeddings in self.embed_iter(texts, **kwargs):
+            out[offset : offset + len(embeddings)] = embeddings
+        if isinstance(out, np.memmap):
+            out.flush()
+        return out
+
+    def embed_to_memmap(
+        self,
+        texts: List[str],
+        path: str,
+        inverse: Optional[List[int]] = None,
+        **kwargs,
+    ) -> np.memmap:
+        """
+        Embeds a list of texts into a float32 .npy file backed by a memory map.
+
+        The file is created once the embedding dimension is known from the first
+        block, so peak memory is bounded by a single block.
+
+        Args:
+            texts (List[str]): The texts to embed.
+            path (str): Path of the .npy file to create.
+            inverse (Optional[List[int]]): For deduplicated texts, the index in
+                `texts` of each output row. Each block is then written to all
+                rows that share it, instead of one row per text.
+            **kwargs: Additional keyword arguments passed to `embed_iter`.
+
+        Returns:
+            np.memmap: The embeddings, readable later with np.load(path, mmap_mode="r").
+        """
+        if inverse is not None:
+            inverse = np.asarray(inverse)
+            # Rows grouped by text, so each block maps to a contiguous range
+            rows_by_text = np.argsort(inverse, kind="stable")
+            sorted_inverse = inverse[rows_by_text]
+
+        out = None
+        for offset, embeddings in self.embed_iter(texts, **kwargs):
+            if out is None:
+                out = np.lib.format.open_memmap(
+                    path,
+                    mode="w+",
+                    dtype=np.float32,
+                    shape=(
+                        len(texts) if inverse is None else len(inverse),
+                        embeddings.shape[1],
+                    ),
+                )
+            if inverse is None:
+                out[offset : offset + len(embeddings)] = embeddings
+            else:
+                lo, hi = np.searchsorted(
+                    sorted_inverse, [offset, offset + len(embeddings)]
+                )
+                out[rows_by_text[lo:hi]] = embeddings[sorted_inverse[lo:hi] - offset]
+        if out is None:
+            raise ValueError("No texts were given to embed")
+        out.flush()
+        return out
+
     @abstractmethod
     def clean_up(self):
         """
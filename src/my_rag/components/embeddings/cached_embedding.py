@@ -0,0 +1,325 @@
+import hashlib
+import json
+import logging
+import os
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from .base import BaseEmbedding
+from ..utils import alphanumeric_string
+
+logger = logging.getLogger(__name__)
+
+# Attributes of a wrapped model that change the vectors it produces
+LOAD_ATTRIBUTES = ("backend", "onnx_quantize", "load_in_8bit")
+
+
+class EmbeddingCacheStore:
+    """
+    Append-only on-disk store of embedding vectors keyed by content hash.
+
+    Vectors live in a single memory-mapped file of fixed-width rows. Keys are
+    appended to a text file (one per line, in row order) only after their
+    vectors have been flushed, so an interrupted write never leaves a key
+    pointing at a missing vector.
+    """
+
+    def __init__(self, path: str, dtype: str = "float32", initial_capacity: int = 1024):
+        """
+        Opens (or creates) a cache store.
+
+        Args:
+            path (str): Directory holding the store files.
+            dtype (str): Storage dtype for vectors, 'float32' or 'float16'.
+            initial_capacity (int): Number of rows to allocate on first write.
+        """
+        if dtype not in ("float32", "float16"):
+            raise ValueError(f"Unsupported cache dtype '{dtype}'")
+
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.initial_capacity = initial_capacity
+        self.dim: Optional[int] = None
+        self.capacity = 0
+        self.index: Dict[str, int] = {}
+        self._vectors: Optional[np.memmap] = None
+
+        os.makedirs(path, exist_ok=True)
+        self._meta_path = os.path.join(path, "meta.json")
+        self._keys_path = os.path.join(path, "keys.txt")
+        self._vectors_path = os.path.join(path, "vectors.bin")
+
+        if os.path.exists(self._meta_path):
+            with open(self._meta_path) as f:
+                meta = json.load(f)
+            if meta["dtype"] != self.dtype.name:
+                raise ValueError(
+                    f"Cache at '{path}' stores {meta['dtype']}, not {self.dtype.name}"
+                )
+            self.dim = meta["dim"]
+            if os.path.exists(self._keys_path):
+                with open(self._keys_path) as f:
+                    for row, key in enumerate(f.read().split()):
+                        self.index[key] = row
+            if os.path.exists(self._vectors_path):
+                self._open(os.path.getsize(self._vectors_path) // self._row_bytes)
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.index
+
+    @property
+    def _row_bytes(self) -> int:
+        return self.dim * self.dtype.itemsize
+
+    def _open(self, capacity: int):
+        """Maps the vector file, growing it to hold `capacity` rows."""
+        if self._vectors is not None:
+            self._vectors.flush()
+            self._vectors = None
+        with open(self._vectors_path, "ab") as f:
+            f.truncate(max(capacity * self._row_bytes, os.path.getsize(f.name)))
+        self.capacity = capacity
+        self._vectors = np.memmap(
+            self._vectors_path, dtype=self.dtype, mode="r+", shape=(capacity, self.dim)
+        )
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        """
+        Returns the stored vector for a key as float32, or None if absent.
+        """
+        row = self.index.get(key)
+        if row is None:
+            return None
+        return np.array(self._vectors[row], dtype=np.float32)
+
+    def add(self, keys: List[str], vectors: np.ndarray):
+        """
+        Appends vectors for keys that are not already stored.
+
+        Args:
+            keys (List[str]): Content keys, one per row of `vectors`.
+            vectors (np.ndarray): 2D array of embeddings.
+        """
+        new_rows = [i for i, key in enumerate(keys) if key not in self.index]
+        if not new_rows:
+            return
+
+        if self.dim is None:
+            self.dim = int(vectors.shape[1])
+            with open(self._meta_path, "w") as f:
+                json.dump({"dim": self.dim, "dtype": self.dtype.name}, f)
+        elif vectors.shape[1] != self.dim:
+            raise ValueError(
+                f"Embedding dimension {vectors.shape[1]} does not match cache dimension {self.dim}"
+            )
+
+        start = len(self.index)
+        needed = start + len(new_rows)
+        if needed > self.capacity:
+            self._open(max(needed, 2 * self.capacity, self.initial_capacity))
+
+        self._vectors[start:needed] = vectors[new_rows].astype(self.dtype)
+        self._vectors.flush()
+
+        with open(self._keys_path, "a") as f:
+            for offset, i in enumerate(new_rows):
+                f.write(keys[i] + "\n")
+                self.index[keys[i]] = start + offset
+
+    def close(self):
+        """Flushes and unmaps the vector file."""
+        if self._vectors is not None:
+            self._vectors.flush()
+            self._vectors = None
+
+
+class CachedEmbedding(BaseEmbedding):
+    """
+    Wraps any embedding model with a persistent, content-addressed cache.
+
+    Entries are keyed on the model name and load settings, instruction,
+    max_length and a hash of the text, so only texts that have never been
+    embedded with the same settings are sent to the wrapped model.
+    """
+
+    def __init__(
+        self,
+        embedding_model: BaseEmbedding,
+        cache_dir: str,
+        dtype: str = "float32",
+        lru_size: int = 10000,
+        model_name: Optional[str] = None,
+        load_config: Optional[Dict[str, Any]] = None,
+    ):
+        """
+        Initializes the cached embedding model.
+
+        Args:
+            embedding_model (BaseEmbedding): The model used to compute cache misses.
+            cache_dir (str): Root directory for the on-disk cache.
+            dtype (str): Storage dtype for cached vectors, 'float32' or 'float16'.
+            lru_size (int): Number of vectors kept in the in-memory LRU.
+            model_name (Optional[str]): Name used in the cache key. Defaults to the
+                wrapped model's `model_name` or `model_id` attribute.
+            load_config (Optional[Dict[str, Any]]): Settings the wrapped model was
+                loaded with (backend, quantization, dtype, ...). Models loaded
+                differently never share cache entries. Defaults to the wrapped
+                model's `backend`, `onnx_quantize` and `load_in_8bit` attributes.
+        """
+        self.embedding_model = embedding_model
+        self.cache_dir = cache_dir
+        self.dtype = dtype
+        self.lru_size = lru_size
+        self.model_name = (
+            model_name
+            or getattr(embedding_model, "model_name", None)
+            or getattr(embedding_model, "model_id", None)
+        )
+        if self.model_name is None:
+            raise ValueError(
+                "model_name must be provided for models without a 'model_name' or 'model_id' attribute"
+            )
+
+        if load_config is None:
+            load_config = {
+                key: getattr(embedding_model, key)
+                for key in LOAD_ATTRIBUTES
+                if hasattr(embedding_model, key)
+            }
+        self.load_config = load_config
+
+        self._stores: Dict[str, EmbeddingCacheStore] = {}
+        self._lru: "OrderedDict[tuple, np.ndarray]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _get_store(
+        self, instruction: Optional[str], max_length: Optional[int]
+    ) -> EmbeddingCacheStore:
+        """Returns the store for one (model, load config, instruction, max_length) namespace."""
+        namespace = json.dumps(
+            {
+                "model": self.model_name,
+                "load_config": self.load_config,
+                "instruction": instruction or "",
+                "max_length": max_length,
+            },
+            sort_keys=True,
+            # Load settings may hold values such as torch dtypes
+            default=str,
+        )
+        if namespace not in self._stores:
+            digest = hashlib.sha1(namespace.encode("utf-8")).hexdigest()[:16]
+            path = os.path.join(
+                self.cache_dir, f"{alphanumeric_string(self.model_name)}_{digest}"
+            )
+            self._stores[namespace] = EmbeddingCacheStore(path, dtype=self.dtype)
+        return self._stores[namespace]
+
+    def _lru_get(self, key: tuple) -> Optional[np.ndarray]:
+        vector = self._lru.get(key)
+        if vector is not None:
+            self._lru.move_to_end(key)
+        return vector
+
+    def _lru_put(self, key: tuple, vector: np.ndarray):
+        if self.lru_size <= 0:
+            return
+        self._lru[key] = vector
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
+
+    def embed(
+        self,
+        texts: List[str],
+        instruction: Optional[str] = None,
+        max_length: Optional[int] = None,
+        **kwargs,
+    ) -> np.ndarray:
+        """
+        Embeds a list of texts, computing only the ones missing from the cache.
+
+        Args:
+            texts (List[str]): The texts to embed.
+            instruction (Optional[str]): Instruction text passed to the wrapped model.
+            max_length (Optional[int]): Maximum sequence length passed to the wrapped model.
+            **kwargs: Additional keyword arguments for the wrapped model.
+
+        Returns:
+            np.ndarray: float32 embeddings in input order.
+        """
+        store = self._get_store(instruction, max_length)
+        namespace = (store.path,)
+        keys = [hashlib.sha1(text.encode("utf-8")).hexdigest() for text in texts]
+
+        found: Dict[str, np.ndarray] = {}
+        miss_keys, miss_texts, pending = [], [], set()
+        for key, text in zip(keys, texts):
+            if key in found or key in pending:
+                continue
+            vector = self._lru_get(namespace + (key,))
+            if vector is None:
+                vector = store.get(key)
+                if vector is not None:
+                    self._lru_put(namespace + (key,), vector)
+            if vector is None:
+                miss_keys.append(key)
+                miss_texts.append(text)
+                pending.add(key)
+            else:
+                found[key] = vector
+
+        self.hits += len(texts) - len(miss_texts)
+        self.misses += len(miss_texts)
+
+        if miss_texts:
+            if max_length is not None:
+                kwargs["max_length"] = max_length
+            vectors = self.embedding_model.embed(
+                miss_texts, instruction=instruction, **kwargs
+            )
+            if hasattr(vectors, "cpu"):
+                vectors = vectors.cpu().numpy()
+            vectors = np.asarray(vectors, dtype=np.float32)
+            store.add(miss_keys, vectors)
+            for key, vector in zip(miss_keys, vectors):
+                found[key] = vector
+                self._lru_put(namespace + (key,), vector)
+
+        logger.info(
+            f"Embedding cache: {len(texts) - len(miss_texts)} hits, {len(miss_texts)} misses"
+        )
+
+        if not texts:
+            return np.empty((0, store.dim or 0), dtype=np.float32)
+        return np.stack([found[key] for key in keys]).astype(np.float32, copy=False)
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """
+        Get statistics about the cache.
+
+        Returns:
+            Dict[str, Any]: Hit/miss counts and stored vector counts per namespace
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "lru_entries": len(self._lru),
+            "stored": {store.path: len(store) for store in self._stores.values()},
+        }
+
+    def clean_up(self):
+        """
+        Closes the cache stores and cleans up the wrapped model.
+        """
+        for store in self._stores.values():
+            store.close()
+        self._stores.clear()
+        self._lru.clear()
+        self.embedding_model.clean_up()
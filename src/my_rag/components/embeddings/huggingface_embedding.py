@@ -2,10 +2,18 @@ import torch
 import torch.nn.functional as F
 from transformers import AutoTokenizer, AutoModel
 import gc
-from typing import List, Optional, Dict
+import os
+import numpy as np
+from typing import Iterator, List, Optional, Dict, Tuple
+from .base import BaseEmbedding
+from .onnx_export import export_to_onnx, quantize_onnx
+from ..batching import BatchPolicy
+from ..utils import alphanumeric_string
 
+ONNX_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "my_rag", "onnx")
 
-class HuggingFaceEmbedding:
+
+class HuggingFaceEmbedding(BaseEmbedding):
     """
     Embedding model using Hugging Face transformers.
     """
@@ -18,6 +26,9 @@ class HuggingFaceEmbedding:
         load_in_8bit: bool = False,
         device_map: Optional[str] = None,
         max_memory: Optional[Dict] = None,
+        backend: str = "torch",
+        onnx_quantize: bool = False,
+        onnx_dir: Optional[str] = None,
         **kwargs,
     ):
         """
@@ -30,6 +41,12 @@ class HuggingFaceEmbedding:
             load_in_8bit (bool): Whether to load the model in 8-bit precision.
             device_map (Optional[str]): Device map for model parallelism.
             max_memory (Optional[Dict]): Maximum memory allocation for devices.
+            backend (str): 'torch' to run the PyTorch model, or 'onnx' to run an
+                exported copy with ONNX Runtime on the CPU.
+            onnx_quantize (bool): Whether the 'onnx' backend uses int8 dynamic
+                quantization.
+            onnx_dir (Optional[str]): Directory for the exported ONNX files.
+                Defaults to a per-model directory under ~/.cache/my_rag/onnx.
             **kwargs: Additional keyword arguments for model/tokenizer initialization.
         """
         self.supported_models = [
@@ -47,7 +64,14 @@ class HuggingFaceEmbedding:
                 f"Model '{model_name}' is not supported. Supported models are: {self.supported_models}"
             )
 
+        if backend not in ("torch", "onnx"):
+            raise ValueError(
+                f"Unsupported backend '{backend}'. Supported backends are: ['torch', 'onnx']"
+            )
+
         self.model_name = model_name
+        self.backend = backend
+        self.onnx_quantize = onnx_quantize
         self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
         self.trust_remote_code = trust_remote_code
         self.load_in_8bit = load_in_8bit
@@ -59,6 +83,10 @@ class HuggingFaceEmbedding:
                 self.model_name, trust_remote_code=self.trust_remote_code, **kwargs
             )
 
+            if self.backend == "onnx":
+                self._load_onnx_session(onnx_dir, onnx_quantize, **kwargs)
+                return
+
             self.model = AutoModel.from_pretrained(
                 self.model_name,
                 trust_remote_code=self.trust_remote_code,
@@ -73,12 +101,64 @@ class HuggingFaceEmbedding:
         except Exception as e:
             raise ValueError(f"Failed to load model '{self.model_name}': {str(e)}")
 
+    def _load_onnx_session(self, onnx_dir: Optional[str], quantize: bool, **kwargs):
+        """
+        Exports the model to ONNX on first use and opens a CPU inference session.
+
+        Exported (and quantized) files are reused on later runs, in which case
+        the PyTorch weights are never loaded.
+        """
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise ImportError(
+                "The 'onnx' backend requires onnxruntime. Install it with 'pip install onnxruntime'."
+            ) from e
+
+        onnx_dir = onnx_dir or os.path.join(
+            ONNX_CACHE_DIR, alphanumeric_string(self.model_name)
+        )
+        onnx_path = os.path.join(onnx_dir, "model.onnx")
+
+        if not os.path.exists(onnx_path):
+            model = AutoModel.from_pretrained(
+                self.model_name, trust_remote_code=self.trust_remote_code, **kwargs
+            ).eval()
+            if hasattr(model, "encode"):
+                raise ValueError(
+                    f"Model '{self.model_name}' uses a custom 'encode' method and cannot be exported to ONNX"
+                )
+            os.makedirs(onnx_dir, exist_ok=True)
+            export_to_onnx(model, self.tokenizer, onnx_path)
+            del model
+            gc.collect()
+
+        if quantize:
+            quantized_path = os.path.join(onnx_dir, "model_int8.onnx")
+            if not os.path.exists(quantized_path):
+                quantize_onnx(onnx_path, quantized_path)
+            onnx_path = quantized_path
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(
+            onnx_path, options, providers=["CPUExecutionProvider"]
+        )
+        self.onnx_input_names = [i.name for i in self.session.get_inputs()]
+        self.onnx_path = onnx_path
+        self.model = None
+        self.device = "cpu"
+
     def embed(
         self,
         texts: List[str],
         instruction: Optional[str] = "",
         max_length: Optional[int] = None,
         batch_size: int = 32,
+        sort_by_length: bool = False,
+        cleanup_every: int = 0,
+        max_tokens: Optional[int] = None,
+        adaptive_batching: bool = False,
         **kwargs,
     ) -> torch.Tensor:
         """
@@ -89,54 +169,264 @@ class HuggingFaceEmbedding:
             instruction (Optional[str]): Instruction text for models that support it.
             max_length (Optional[int]): Maximum sequence length for tokenization.
             batch_size (int): Batch size for processing texts.
+            sort_by_length (bool): Whether to bucket texts of similar tokenized length
+                into the same batch to reduce padding. Embeddings are still returned
+                in the original input order.
+            cleanup_every (int): Release cached device memory every N batches.
+                0 only releases it once, after the last batch.
+            max_tokens (Optional[int]): Maximum padded tokens per batch. batch_size
+                still caps the number of texts per batch.
+            adaptive_batching (bool): Whether to halve batches and retry on
+                out-of-memory errors, growing them back after successes.
             **kwargs: Additional keyword arguments.
 
         Returns:
             torch.Tensor: Normalized embeddings.
         """
-        all_embeddings = []
-
-        if not hasattr(self.model, "encode"):
-            if instruction:
-                texts = [f"{instruction}{text}" for text in texts]
-            # Define default embedding extraction for models without 'encode'
-            for i in range(0, len(texts), batch_size):
-                batch_texts = texts[i : i + batch_size]
-                inputs = self.tokenizer(
-                    batch_texts,
-                    padding=True,
-                    truncation=True,
-                    max_length=max_length,
-                    return_tensors="pt",
-                ).to(self.device)
-
-                with torch.no_grad():
-                    outputs = self.model(**inputs)
-                    # Use the last hidden state as embeddings
-                    embeddings = outputs.last_hidden_state.mean(dim=1)
-                    embeddings = F.normalize(embeddings, p=2, dim=1)
-                    all_embeddings.append(embeddings.cpu())
+        policy = BatchPolicy(batch_size, max_tokens, adaptive_batching)
+        order, lengths = self._batch_order(
+            texts, max_length, sort_by_length, instruction, max_tokens is not None
+        )
+
+        all_embeddings = None
+        for batch_num, (indices, embeddings) in enumerate(
+            self._iter_batches(
+                texts,
+                order,
+                lengths,
+                policy,
+                instruction=instruction,
+                max_length=max_length,
+                **kwargs,
+            )
+        ):
+            if all_embeddings is None:
+                # Allocate the output once instead of concatenating batches
+                all_embeddings = torch.empty(
+                    (len(texts), embeddings.shape[1]), dtype=embeddings.dtype
+                )
+            all_embeddings[indices] = embeddings
+            del embeddings
+            if cleanup_every and (batch_num + 1) % cleanup_every == 0:
+                self._release_memory()
+        self._release_memory()
+
+        if all_embeddings is None:
+            return torch.empty((0, 0))
+        return all_embeddings
+
+    def embed_iter(
+        self,
+        texts: List[str],
+        instruction: Optional[str] = "",
+        max_length: Optional[int] = None,
+        batch_size: int = 32,
+        sort_by_length: bool = False,
+        cleanup_every: int = 0,
+        window_size: Optional[int] = None,
+        max_tokens: Optional[int] = None,
+        adaptive_batching: bool = False,
+        **kwargs,
+    ) -> Iterator[Tuple[int, np.ndarray]]:
+        """
+        Embeds a list of texts, yielding contiguous blocks as they are ready.
+
+        Args:
+            texts (List[str]): The texts to embed.
+            instruction (Optional[str]): Instruction text for models that support it.
+            max_length (Optional[int]): Maximum sequence length for tokenization.
+            batch_size (int): Batch size for processing texts.
+            sort_by_length (bool): Whether to bucket texts by tokenized length. Texts
+                are only reordered within a window, so memory stays bounded.
+            cleanup_every (int): Release cached device memory every N batches.
+                0 only releases it once, after the last batch.
+            window_size (Optional[int]): Number of texts embedded per yielded
+                block, and sorted together when sort_by_length is set.
+                Defaults to 32 batches.
+            max_tokens (Optional[int]): Maximum padded tokens per batch.
+            adaptive_batching (bool): Whether to halve batches and retry on
+                out-of-memory errors, growing them back after successes.
+            **kwargs: Additional keyword arguments.
+
+        Yields:
+            Tuple[int, np.ndarray]: Offset of the block in `texts` and its
+                normalized float32 embeddings.
+        """
+        if window_size is None:
+            window_size = batch_size * 32
+
+        # Shared by all windows, so batch sizes learned after an OOM carry over
+        policy = BatchPolicy(batch_size, max_tokens, adaptive_batching)
+        batch_num = 0
+        for start in range(0, len(texts), window_size):
+            window = texts[start : start + window_size]
+            order, lengths = self._batch_order(
+                window, max_length, sort_by_length, instruction, max_tokens is not None
+            )
+
+            block = None
+            for indices, embeddings in self._iter_batches(
+                window,
+                order,
+                lengths,
+                policy,
+                instruction=instruction,
+                max_length=max_length,
+                **kwargs,
+            ):
+                if block is None:
+                    block = np.empty(
+                        (len(window), embeddings.shape[1]), dtype=np.float32
+                    )
+                block[indices.numpy()] = embeddings.float().numpy()
                 del embeddings
-                torch.cuda.empty_cache()
-                gc.collect()
+                batch_num += 1
+                if cleanup_every and batch_num % cleanup_every == 0:
+                    self._release_memory()
+
+            yield start, block
+        self._release_memory()
+
+    def _iter_batches(
+        self,
+        texts: List[str],
+        order: torch.Tensor,
+        lengths: Optional[List[int]],
+        policy: BatchPolicy,
+        instruction: Optional[str],
+        max_length: Optional[int],
+        **kwargs,
+    ) -> Iterator[Tuple[torch.Tensor, torch.Tensor]]:
+        """
+        Runs the model over `texts` in the given order, in batches chosen by
+        `policy`.
+
+        Yields:
+            Tuple[torch.Tensor, torch.Tensor]: Input indices of the batch and their
+                embeddings on the CPU.
+        """
+
+        def embed_span(start: int, end: int) -> torch.Tensor:
+            return self._embed_batch(
+                [texts[j] for j in order[start:end]],
+                instruction=instruction,
+                max_length=max_length,
+                batch_size=end - start,
+                **kwargs,
+            ).cpu()
+
+        for start, end, embeddings in policy.run(len(texts), embed_span, lengths):
+            yield order[start:end], embeddings
+
+    def _batch_order(
+        self,
+        texts: List[str],
+        max_length: Optional[int],
+        sort_by_length: bool,
+        instruction: Optional[str] = None,
+        need_lengths: bool = False,
+    ) -> Tuple[torch.Tensor, Optional[List[int]]]:
+        """
+        Returns the order in which texts are fed to the model, and their
+        tokenized lengths in that order if sorting or need_lengths is set.
+
+        With sort_by_length, texts are ordered by descending tokenized length so
+        that each batch holds texts of similar length and the longest (most
+        memory hungry) batch runs first.
+        """
+        if not sort_by_length and not need_lengths:
+            return torch.arange(len(texts)), None
+
+        if instruction:
+            texts = [f"{instruction}{text}" for text in texts]
+        encoded = self.tokenizer(texts, truncation=True, max_length=max_length)
+        lengths = [len(ids) for ids in encoded["input_ids"]]
+        if sort_by_length:
+            order = torch.argsort(torch.tensor(lengths), descending=True, stable=True)
         else:
+            order = torch.arange(len(texts))
+        return order, [lengths[i] for i in order]
+
+    def _embed_batch(
+        self,
+        batch_texts: List[str],
+        instruction: Optional[str],
+        max_length: Optional[int],
+        batch_size: int,
+        **kwargs,
+    ) -> torch.Tensor:
+        """
+        Embeds a single batch of texts and normalizes the result.
+        """
+        if hasattr(self.model, "encode"):
             # Use the model's 'encode' method
-            for i in range(0, len(texts), batch_size):
-                batch_texts = texts[i : i + batch_size]
-                embeddings = self.model.encode(
-                    batch_texts,
-                    instruction=instruction,
-                    max_length=max_length,
-                    batch_size=batch_size,
-                    **kwargs,
-                )
-                embeddings = F.normalize(embeddings, p=2, dim=1)
-                all_embeddings.append(embeddings.cpu())
-                del embeddings
-                torch.cuda.empty_cache()
-                gc.collect()
+            embeddings = self.model.encode(
+                batch_texts,
+                instruction=instruction,
+                max_length=max_length,
+                batch_size=batch_size,
+                **kwargs,
+            )
+            return F.normalize(embeddings, p=2, dim=1)
+
+        # Define default embedding extraction for models without 'encode'
+        if instruction:
+            batch_texts = [f"{instruction}{text}" for text in batch_texts]
 
-        return torch.cat(all_embeddings, dim=0)
+        if self.backend == "onnx":
+            inputs = self.tokenizer(
+                batch_texts,
+                padding=True,
+                truncation=True,
+                max_length=max_length,
+                return_tensors="np",
+            )
+            last_hidden_state = self.session.run(
+                None,
+                {name: inputs[name].astype(np.int64) for name in self.onnx_input_names},
+            )[0]
+            embeddings = self._mean_pool(
+                torch.from_numpy(last_hidden_state),
+                torch.from_numpy(inputs["attention_mask"]),
+            )
+            return F.normalize(embeddings, p=2, dim=1)
+
+        inputs = self.tokenizer(
+            batch_texts,
+            padding=True,
+            truncation=True,
+            max_length=max_length,
+            return_tensors="pt",
+        ).to(self.device)
+
+        with torch.no_grad():
+            outputs = self.model(**inputs)
+            embeddings = self._mean_pool(
+                outputs.last_hidden_state, inputs["attention_mask"]
+            )
+            return F.normalize(embeddings, p=2, dim=1)
+
+    @staticmethod
+    def _mean_pool(
+        last_hidden_state: torch.Tensor, attention_mask: torch.Tensor
+    ) -> torch.Tensor:
+        """
+        Mean-pools the last hidden state over real (non-padding) tokens.
+        """
+        mask = attention_mask.unsqueeze(-1).to(last_hidden_state.dtype)
+        return (last_hidden_state * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1e-9)
+
+    def _release_memory(self):
+        """
+        Releases cached device memory and runs garbage collection.
+
+        Skipped on the CPU, where there is no allocator cache to release and a
+        full collection dominates the latency of small (single query) calls.
+        """
+        if self.device == "cpu":
+            return
+        torch.cuda.empty_cache()
+        gc.collect()
 
     def clean_up(self):
         """
@@ -144,5 +434,7 @@ class HuggingFaceEmbedding:
         """
         del self.model
         del self.tokenizer
+        if hasattr(self, "session"):
+            del self.session
         torch.cuda.empty_cache()
         gc.collect()
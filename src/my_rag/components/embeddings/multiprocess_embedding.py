@@ -0,0 +1,137 @@
+import multiprocessing as mp
+import os
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import torch
+
+from .base import BaseEmbedding
+from .huggingface_embedding import HuggingFaceEmbedding
+
+# Model owned by each worker process, loaded once by _init_worker
+_worker_model: Optional[HuggingFaceEmbedding] = None
+
+
+def _init_worker(model_name: str, num_threads: int, model_kwargs: Dict[str, Any]):
+    """Loads a private model copy and pins the intra-op thread count."""
+    global _worker_model
+    torch.set_num_threads(num_threads)
+    _worker_model = HuggingFaceEmbedding(model_name, device="cpu", **model_kwargs)
+
+
+def _embed_shard(args: Tuple[List[str], Dict[str, Any]]) -> np.ndarray:
+    """Embeds one shard of texts in a worker process."""
+    texts, embed_kwargs = args
+    embeddings = _worker_model.embed(texts, **embed_kwargs)
+    return embeddings.float().numpy()
+
+
+class MultiProcessEmbedding(BaseEmbedding):
+    """
+    CPU embedding engine that shards texts across a pool of worker processes.
+
+    Every worker loads its own copy of a Hugging Face embedding model and runs
+    with a fixed number of torch threads, so N workers on N * threads cores
+    do not oversubscribe the CPU. Results are streamed back in input order.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        num_workers: Optional[int] = None,
+        threads_per_worker: Optional[int] = None,
+        shard_size: Optional[int] = None,
+        start_method: str = "spawn",
+        model_kwargs: Optional[Dict[str, Any]] = None,
+    ):
+        """
+        Starts the worker pool.
+
+        Args:
+            model_name (str): The name of the Hugging Face model to use.
+            num_workers (Optional[int]): Number of worker processes. Defaults to the
+                number of CPU cores divided by threads_per_worker.
+            threads_per_worker (Optional[int]): torch intra-op threads per worker.
+                Defaults to 1 when num_workers is not given.
+            shard_size (Optional[int]): Texts sent to a worker per task. Defaults to
+                four batches.
+            start_method (str): multiprocessing start method.
+            model_kwargs (Optional[Dict[str, Any]]): Keyword arguments for
+                HuggingFaceEmbedding in each worker.
+        """
+        cpu_count = os.cpu_count() or 1
+        if num_workers is None:
+            threads_per_worker = threads_per_worker or 1
+            num_workers = max(1, cpu_count // threads_per_worker)
+        elif threads_per_worker is None:
+            threads_per_worker = max(1, cpu_count // num_workers)
+
+        self.model_name = model_name
+        self.num_workers = num_workers
+        self.threads_per_worker = threads_per_worker
+        self.shard_size = shard_size
+
+        context = mp.get_context(start_method)
+        self.pool = context.Pool(
+            processes=num_workers,
+            initializer=_init_worker,
+            initargs=(model_name, threads_per_worker, model_kwargs or {}),
+        )
+
+    def embed_iter(
+        self, texts: List[str], batch_size: int = 32, **kwargs
+    ) -> Iterator[Tuple[int, np.ndarray]]:
+        """
+        Embeds a list of texts across the worker pool.
+
+        Args:
+            texts (List[str]): The texts to embed.
+            batch_size (int): Batch size used inside each worker.
+            **kwargs: Additional keyword arguments for HuggingFaceEmbedding.embed.
+
+        Yields:
+            Tuple[int, np.ndarray]: Offset of the shard in `texts` and its
+                normalized float32 embeddings, in input order.
+        """
+        shard_size = self.shard_size or batch_size * 4
+        kwargs["batch_size"] = batch_size
+        offsets = range(0, len(texts), shard_size)
+        shards = ((texts[offset : offset + shard_size], kwargs) for offset in offsets)
+        # imap keeps result order while letting every worker run ahead
+        for offset, embeddings in zip(offsets, self.pool.imap(_embed_shard, shards)):
+            yield offset, embeddings
+
+    def embed(self, texts: List[str], batch_size: int = 32, **kwargs) -> np.ndarray:
+        """
+        Embeds a list of texts across the worker pool.
+
+        Args:
+            texts (List[str]): The texts to embed.
+            batch_size (int): Batch size used inside each worker.
+            **kwargs: Additional keyword arguments for HuggingFaceEmbedding.embed.
+
+        Returns:
+            np.ndarray: Normalized float32 embeddings.
+        """
+        all_embeddings = None
+        for offset, embeddings in self.embed_iter(
+            texts, batch_size=batch_size, **kwargs
+        ):
+            if all_embeddings is None:
+                all_embeddings = np.empty(
+                    (len(texts), embeddings.shape[1]), dtype=np.float32
+                )
+            all_embeddings[offset : offset + len(embeddings)] = embeddings
+
+        if all_embeddings is None:
+            return np.empty((0, 0), dtype=np.float32)
+        return all_embeddings
+
+    def clean_up(self):
+        """
+        Shuts down the worker pool and releases the model copies.
+        """
+        if hasattr(self, "pool"):
+            self.pool.close()
+            self.pool.join()
+            del self.pool
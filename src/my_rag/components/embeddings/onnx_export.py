@@ -0,0 +1,153 @@
+import inspect
+import logging
+import os
+from typing import List
+
+import numpy as np
+import torch
+
+logger = logging.getLogger(__name__)
+
+ONNX_INPUT_NAMES = ("input_ids", "attention_mask", "token_type_ids")
+
+# Texts of different lengths than the export example, so the parity check
+# also exercises the dynamic batch and sequence axes
+PARITY_PROBE_TEXTS = [
+    "Is RANKL secreted from the cells?",
+    "Which miRNAs could be used as potential biomarkers for epithelial ovarian cancer?",
+    "Are long non coding RNAs spliced?",
+]
+
+
+class _LastHiddenState(torch.nn.Module):
+    """Exposes a transformer's last hidden state through positional inputs."""
+
+    def __init__(self, model: torch.nn.Module):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, attention_mask, token_type_ids=None):
+        kwargs = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if token_type_ids is not None:
+            kwargs["token_type_ids"] = token_type_ids
+        return self.model(**kwargs).last_hidden_state
+
+
+def onnx_parity_error(
+    model: torch.nn.Module, tokenizer, onnx_path: str, texts: List[str]
+) -> float:
+    """
+    Returns the largest absolute difference between the PyTorch and ONNX
+    last hidden states over non-padding tokens.
+    """
+    import onnxruntime as ort
+
+    session = ort.InferenceSession(onnx_path, providers=["CPUExecutionProvider"])
+    input_names = [i.name for i in session.get_inputs()]
+
+    inputs = tokenizer(texts, padding=True, truncation=True, return_tensors="np")
+    onnx_hidden = session.run(
+        None, {name: inputs[name].astype(np.int64) for name in input_names}
+    )[0]
+    with torch.no_grad():
+        torch_hidden = model(
+            **{name: torch.from_numpy(inputs[name]) for name in input_names}
+        ).last_hidden_state.numpy()
+
+    mask = inputs["attention_mask"][..., None]
+    return float(np.abs((onnx_hidden - torch_hidden) * mask).max())
+
+
+def export_to_onnx(
+    model: torch.nn.Module,
+    tokenizer,
+    onnx_path: str,
+    opset_version: int = 17,
+    tolerance: float = 1e-3,
+):
+    """
+    Exports a Hugging Face encoder to ONNX with dynamic batch and sequence axes.
+
+    The dynamo-based exporter is tried first where available, then the
+    TorchScript exporter. An export is only kept if its output matches the
+    PyTorch model on probe texts.
+
+    Args:
+        model (torch.nn.Module): The encoder, in eval mode on the CPU.
+        tokenizer: The model's tokenizer.
+        onnx_path (str): Destination .onnx file.
+        opset_version (int): ONNX opset for the TorchScript exporter.
+        tolerance (float): Maximum allowed absolute hidden-state difference.
+
+    Raises:
+        RuntimeError: If no exporter produces a graph within tolerance.
+    """
+    input_names = [n for n in ONNX_INPUT_NAMES if n in tokenizer.model_input_names]
+    example = tokenizer(
+        ["a short example", "a somewhat longer example sentence for export"],
+        padding=True,
+        return_tensors="pt",
+    )
+    args = tuple(example[name] for name in input_names)
+    wrapper = _LastHiddenState(model).eval()
+
+    has_dynamo = "dynamo" in inspect.signature(torch.onnx.export).parameters
+    errors = []
+    for use_dynamo in (True, False) if has_dynamo else (False,):
+        try:
+            if use_dynamo:
+                batch = torch.export.Dim("batch")
+                sequence = torch.export.Dim("sequence")
+                torch.onnx.export(
+                    wrapper,
+                    args,
+                    onnx_path,
+                    input_names=input_names,
+                    output_names=["last_hidden_state"],
+                    dynamic_shapes={
+                        name: {0: batch, 1: sequence} for name in input_names
+                    },
+                    dynamo=True,
+                )
+            else:
+                axes = {
+                    name: {0: "batch", 1: "sequence"}
+                    for name in input_names + ["last_hidden_state"]
+                }
+                torch.onnx.export(
+                    wrapper,
+                    args,
+                    onnx_path,
+                    input_names=input_names,
+                    output_names=["last_hidden_state"],
+                    dynamic_axes=axes,
+                    opset_version=opset_version,
+                    **({"dynamo": False} if has_dynamo else {}),
+                )
+
+            error = onnx_parity_error(model, tokenizer, onnx_path, PARITY_PROBE_TEXTS)
+            if error <= tolerance:
+                logger.info(
+                    f"Exported ONNX model to {onnx_path} (max error {error:.2e})"
+                )
+                return
+            errors.append(f"dynamo={use_dynamo}: max abs error {error:.3g}")
+        except Exception as e:
+            errors.append(f"dynamo={use_dynamo}: {str(e)}")
+
+    if os.path.exists(onnx_path):
+        os.remove(onnx_path)
+    raise RuntimeError(f"ONNX export failed the parity check: {'; '.join(errors)}")
+
+
+def quantize_onnx(onnx_path: str, quantized_path: str):
+    """
+    Applies dynamic int8 weight quantization to an exported model.
+
+    Args:
+        onnx_path (str): Source float32 .onnx file.
+        quantized_path (str): Destination .onnx file.
+    """
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    quantize_dynamic(onnx_path, quantized_path, weight_type=QuantType.QInt8)
@@ -0,0 +1,291 @@
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+
+def _to_numpy(embeddings: Any) -> np.ndarray:
+    if hasattr(embeddings, "cpu"):
+        embeddings = embeddings.cpu().float().numpy()
+    return np.asarray(embeddings)
+
+
+def _normalize(embeddings: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings / np.maximum(norms, 1e-12)
+
+
+class BaseReducer(ABC):
+    """
+    Fit-once dimensionality reduction for embeddings.
+
+    A reducer is fitted on a sample of document embeddings, after which its
+    parameters are fixed: every later batch (documents or queries) is mapped
+    with the same transform, and the parameters can be saved and reloaded.
+    """
+
+    kind: str = ""
+
+    def __init__(self, normalize: bool = True, block_size: int = 65536):
+        """
+        Args:
+            normalize (bool): Whether to L2-normalize reduced vectors, so inner
+                product search keeps working as cosine similarity.
+            block_size (int): Rows transformed at a time, which bounds memory for
+                large (e.g. memory-mapped) inputs.
+        """
+        self.normalize = normalize
+        self.block_size = block_size
+        self.input_dim: Optional[int] = None
+
+    @property
+    def is_fitted(self) -> bool:
+        return self.input_dim is not None
+
+    @property
+    @abstractmethod
+    def output_dim(self) -> int:
+        pass
+
+    @abstractmethod
+    def _fit(self, sample: np.ndarray):
+        pass
+
+    @abstractmethod
+    def _transform_block(self, block: np.ndarray) -> np.ndarray:
+        pass
+
+    @abstractmethod
+    def _get_params(self) -> Dict[str, np.ndarray]:
+        pass
+
+    @abstractmethod
+    def _set_params(self, params: Dict[str, np.ndarray]):
+        pass
+
+    def fit(
+        self, embeddings: Any, sample_size: Optional[int] = 10000, seed: int = 0
+    ) -> "BaseReducer":
+        """
+        Fits the reducer on (a random sample of) the given embeddings.
+
+        Args:
+            embeddings (Any): 2D array-like (numpy, memmap or torch) of embeddings.
+            sample_size (Optional[int]): Maximum number of rows used for fitting.
+                None uses every row.
+            seed (int): Seed for the row sample.
+
+        Returns:
+            BaseReducer: The fitted reducer.
+        """
+        embeddings = _to_numpy(embeddings)
+        if embeddings.ndim != 2 or len(embeddings) == 0:
+            raise ValueError("Reducer must be fitted on a non-empty 2D array")
+
+        if sample_size is not None and len(embeddings) > sample_size:
+            rows = np.random.default_rng(seed).choice(
+                len(embeddings), sample_size, replace=False
+            )
+            embeddings = embeddings[np.sort(rows)]
+
+        self.input_dim = int(embeddings.shape[1])
+        self._fit(np.asarray(embeddings, dtype=np.float32))
+        return self
+
+    def transform(self, embeddings: Any) -> np.ndarray:
+        """
+        Reduces a batch of embeddings with the fitted parameters.
+
+        Args:
+            embeddings (Any): 2D array-like (numpy, memmap or torch) of embeddings.
+
+        Returns:
+            np.ndarray: Reduced float32 embeddings.
+        """
+        if not self.is_fitted:
+            raise ValueError("Reducer must be fitted before calling transform")
+
+        embeddings = _to_numpy(embeddings)
+        if embeddings.ndim != 2 or embeddings.shape[1] != self.input_dim:
+            raise ValueError(
+                f"Expected embeddings of dimension {self.input_dim}, got shape {embeddings.shape}"
+            )
+
+        reduced = np.empty((len(embeddings), self.output_dim), dtype=np.float32)
+        for start in range(0, len(embeddings), self.block_size):
+            block = np.asarray(
+                embeddings[start : start + self.block_size], dtype=np.float32
+            )
+            block = self._transform_block(block)
+            reduced[start : start + len(block)] = (
+                _normalize(block) if self.normalize else block
+            )
+        return reduced
+
+    def fit_transform(self, embeddings: Any, **kwargs) -> np.ndarray:
+        return self.fit(embeddings, **kwargs).transform(embeddings)
+
+    def save(self, path: str):
+        """
+        Saves the fitted parameters to an .npz file.
+
+        Args:
+            path (str): Destination file path.
+        """
+        if not self.is_fitted:
+            raise ValueError("Only fitted reducers can be saved")
+        np.savez(
+            path,
+            kind=np.array(self.kind),
+            input_dim=np.array(self.input_dim),
+            normalize=np.array(self.normalize),
+            **self._get_params(),
+        )
+
+
+class PCAReducer(BaseReducer):
+    """
+    Projects embeddings onto their top principal components.
+    """
+
+    kind = "pca"
+
+    def __init__(self, n_components: int, **kwargs):
+        """
+        Args:
+            n_components (int): Output dimensionality.
+            **kwargs: Additional keyword arguments for BaseReducer.
+        """
+        super().__init__(**kwargs)
+        self.n_components = n_components
+        self.mean: Optional[np.ndarray] = None
+        self.components: Optional[np.ndarray] = None
+        self.explained_variance_ratio: Optional[np.ndarray] = None
+
+    @property
+    def output_dim(self) -> int:
+        return self.n_components
+
+    def _fit(self, sample: np.ndarray):
+        if self.n_components > sample.shape[1]:
+            raise ValueError(
+                f"n_components ({self.n_components}) exceeds embedding dimension ({sample.shape[1]})"
+            )
+        mean = sample.mean(axis=0, dtype=np.float64)
+        centered = sample - mean
+        # Eigen-decompose the (dim x dim) covariance instead of an SVD of the
+        # sample, which is much cheaper when there are more rows than dims
+        covariance = centered.T.astype(np.float64) @ centered / max(len(sample) - 1, 1)
+        eigenvalues, eigenvectors = np.linalg.eigh(covariance)
+        top = np.argsort(eigenvalues)[::-1][: self.n_components]
+
+        self.mean = mean.astype(np.float32)
+        self.components = eigenvectors[:, top].T.astype(np.float32)
+        self.explained_variance_ratio = (
+            eigenvalues[top] / max(eigenvalues.sum(), 1e-12)
+        ).astype(np.float32)
+
+    def _transform_block(self, block: np.ndarray) -> np.ndarray:
+        return (block - self.mean) @ self.components.T
+
+    def _get_params(self) -> Dict[str, np.ndarray]:
+        return {
+            "mean": self.mean,
+            "components": self.components,
+            "explained_variance_ratio": self.explained_variance_ratio,
+        }
+
+    def _set_params(self, params: Dict[str, np.ndarray]):
+        self.mean = params["mean"]
+        self.components = params["components"]
+        self.explained_variance_ratio = params["explained_variance_ratio"]
+        self.n_components = len(self.components)
+
+
+class MatryoshkaReducer(BaseReducer):
+    """
+    Keeps the leading dimensions of each embedding (Matryoshka truncation).
+
+    Only meaningful for models trained with a Matryoshka objective, such as
+    mixedbread-ai/mxbai-embed-large-v1, whose leading dimensions carry most of
+    the information. Fitting only records the input dimensionality.
+    """
+
+    kind = "matryoshka"
+
+    def __init__(self, dim: int, **kwargs):
+        """
+        Args:
+            dim (int): Number of leading dimensions kept.
+            **kwargs: Additional keyword arguments for BaseReducer.
+        """
+        super().__init__(**kwargs)
+        self.dim = dim
+
+    @property
+    def output_dim(self) -> int:
+        return self.dim
+
+    def _fit(self, sample: np.ndarray):
+        if self.dim > sample.shape[1]:
+            raise ValueError(
+                f"dim ({self.dim}) exceeds embedding dimension ({sample.shape[1]})"
+            )
+
+    def _transform_block(self, block: np.ndarray) -> np.ndarray:
+        return block[:, : self.dim]
+
+    def _get_params(self) -> Dict[str, np.ndarray]:
+        return {"dim": np.array(self.dim)}
+
+    def _set_params(self, params: Dict[str, np.ndarray]):
+        self.dim = int(params["dim"])
+
+
+REDUCERS = {PCAReducer.kind: PCAReducer, MatryoshkaReducer.kind: MatryoshkaReducer}
+
+
+def load_reducer(path: str) -> BaseReducer:
+    """
+    Loads a reducer saved with BaseReducer.save.
+
+    Args:
+        path (str): Path to the .npz file.
+
+    Returns:
+        BaseReducer: The fitted reducer.
+    """
+    with np.load(path) as data:
+        params = {key: data[key] for key in data.files}
+
+    kind = str(params.pop("kind"))
+    if kind not in REDUCERS:
+        raise ValueError(f"Unknown reducer type '{kind}' in '{path}'")
+
+    reducer = REDUCERS[kind].__new__(REDUCERS[kind])
+    BaseReducer.__init__(reducer, normalize=bool(params.pop("normalize")))
+    reducer.input_dim = int(params.pop("input_dim"))
+    reducer._set_params(params)
+    return reducer
+
+
+def create_reducer(config: Dict[str, Any]) -> BaseReducer:
+    """
+    Creates an unfitted reducer from a configuration dictionary.
+
+    Args:
+        config (Dict[str, Any]): Must contain 'method' ('pca' or 'matryoshka')
+            and 'dim'; may contain 'normalize'.
+
+    Returns:
+        BaseReducer: The reducer.
+    """
+    method = config["method"]
+    normalize = config.get("normalize", True)
+    if method == PCAReducer.kind:
+        return PCAReducer(n_components=config["dim"], normalize=normalize)
+    if method == MatryoshkaReducer.kind:
+        return MatryoshkaReducer(dim=config["dim"], normalize=normalize)
+    raise ValueError(
+        f"Unsupported reduction method '{method}'. Supported methods are: {list(REDUCERS)}"
+    )
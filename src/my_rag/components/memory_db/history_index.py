@@ -0,0 +1,150 @@
+from typing import Any, Generic, List, Optional, Tuple, TypeVar
+
+import numpy as np
+
+T = TypeVar("T")
+
+
+class QueryHistoryIndex(Generic[T]):
+    """
+    Incremental cosine-similarity index over past queries.
+
+    Embeddings are normalized once when added and kept in a single growing
+    float32 matrix, so a lookup is one matrix-vector product instead of
+    re-embedding the whole history. With `max_size` set, the matrix is used as
+    a ring buffer and the oldest entries are evicted first.
+    """
+
+    def __init__(self, max_size: Optional[int] = None, initial_capacity: int = 64):
+        """
+        Initializes an empty history index.
+
+        Args:
+            max_size (Optional[int]): Maximum number of entries kept. None keeps
+                every entry.
+            initial_capacity (int): Number of rows allocated on first add.
+        """
+        if max_size is not None and max_size < 1:
+            raise ValueError(f"max_size must be at least 1, got {max_size}")
+
+        self.max_size = max_size
+        self.initial_capacity = initial_capacity
+        self._embeddings: Optional[np.ndarray] = None
+        self._items: List[Optional[T]] = []
+        self._start = 0  # Row of the oldest entry once the ring buffer is full
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @staticmethod
+    def _to_matrix(embeddings: Any) -> np.ndarray:
+        if hasattr(embeddings, "cpu"):
+            embeddings = embeddings.cpu().float().numpy()
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        return matrix.reshape(1, -1) if matrix.ndim == 1 else matrix
+
+    def _grow(self, needed: int, dim: int):
+        """Reallocates the matrix to hold at least `needed` rows."""
+        current = 0 if self._embeddings is None else len(self._embeddings)
+        capacity = max(needed, 2 * current, self.initial_capacity)
+        if self.max_size is not None:
+            capacity = min(capacity, self.max_size)
+        if needed <= current or capacity == current:
+            return
+
+        embeddings = np.empty((capacity, dim), dtype=np.float32)
+        if self._embeddings is not None:
+            embeddings[: self._size] = self._embeddings[: self._size]
+        self._embeddings = embeddings
+        self._items.extend([None] * (capacity - len(self._items)))
+
+    def add(self, items: List[T], embeddings: Any):
+        """
+        Appends entries, evicting the oldest ones if the index is full.
+
+        Args:
+            items (List[T]): Objects returned by `search`, one per embedding row.
+            embeddings (Any): 2D array-like (numpy or torch) of embeddings.
+        """
+        matrix = self._to_matrix(embeddings)
+        if len(items) != len(matrix):
+            raise ValueError(f"Got {len(items)} items but {len(matrix)} embeddings")
+        if not items:
+            return
+        if (
+            self._embeddings is not None
+            and matrix.shape[1] != self._embeddings.shape[1]
+        ):
+            raise ValueError(
+                f"Embedding dimension {matrix.shape[1]} does not match index dimension {self._embeddings.shape[1]}"
+            )
+
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix = matrix / np.maximum(norms, 1e-12)
+
+        if self.max_size is not None and len(items) > self.max_size:
+            items, matrix = items[-self.max_size :], matrix[-self.max_size :]
+
+        self._grow(self._size + len(items), matrix.shape[1])
+        capacity = len(self._embeddings)
+        for item, row in zip(items, matrix):
+            if self._size < capacity:
+                position = self._size
+                self._size += 1
+            else:
+                # Full ring buffer: overwrite the oldest entry
+                position = self._start
+                self._start = (self._start + 1) % capacity
+            self._embeddings[position] = row
+            self._items[position] = item
+
+    def search(
+        self,
+        query_embedding: Any,
+        threshold: Optional[float] = None,
+        top_k: Optional[int] = None,
+    ) -> List[Tuple[T, float]]:
+        """
+        Finds past entries similar to a query.
+
+        Args:
+            query_embedding (Any): 1D array-like (numpy or torch) query embedding.
+            threshold (Optional[float]): Only return entries with cosine
+                similarity above this value.
+            top_k (Optional[int]): Return at most this many entries, most
+                similar first. If None, matches are returned oldest first.
+
+        Returns:
+            List[Tuple[T, float]]: Matching items and their cosine similarity.
+        """
+        if self._size == 0:
+            return []
+
+        query = self._to_matrix(query_embedding)[0]
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+
+        # Rows in insertion order (oldest first)
+        rows = (self._start + np.arange(self._size)) % len(self._embeddings)
+        similarities = self._embeddings[: self._size] @ query
+        similarities = similarities[rows]
+
+        candidates = np.arange(self._size)
+        if threshold is not None:
+            candidates = candidates[similarities > threshold]
+        if top_k is not None and len(candidates) > top_k:
+            best = np.argpartition(-similarities[candidates], top_k - 1)[:top_k]
+            candidates = candidates[best]
+        if top_k is not None:
+            candidates = candidates[
+                np.argsort(-similarities[candidates], kind="stable")
+            ]
+
+        return [(self._items[rows[i]], float(similarities[i])) for i in candidates]
+
+    def clear(self):
+        """Removes all entries."""
+        self._embeddings = None
+        self._items = []
+        self._start = 0
+        self._size = 0
@@ -130,10 +130,18 @@ class MemoryCompression:
     def __init__(self, compression_ratio=8):
         self.compression_ratio = compression_ratio
         self.pca = PCA(n_components=compression_ratio)  # Initialize PCA with the desired number of components
+        self.is_fitted = False
+
+    def fit(self, embeddings):
+        # Fit PCA once; later calls to compress_tokens reuse the same projection
+        self.pca.fit(embeddings)
+        self.is_fitted = True
 
     def compress_tokens(self, embeddings):
-        # Fit PCA and transform embeddings
-        compressed_embeddings = self.pca.fit_transform(embeddings)
+        # Fit on the first batch only, so every batch lands in the same space
+        if not self.is_fitted:
+            self.fit(embeddings)
+        compressed_embeddings = self.pca.transform(embeddings)
         return compressed_embeddings
 
 
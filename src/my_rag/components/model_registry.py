@@ -0,0 +1,115 @@
+import json
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Tuple, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class ModelRegistry:
+    """
+    Reference-counted cache of loaded models.
+
+    Models are keyed on their factory and the arguments used to build them, so
+    every caller asking for the same model with the same settings gets the same
+    instance. A model is unloaded with `clean_up()` when its last user releases
+    it.
+    """
+
+    def __init__(self):
+        self._models: Dict[str, Any] = {}
+        self._ref_counts: Dict[str, int] = {}
+        self._keys_by_id: Dict[int, str] = {}
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def _make_key(
+        factory: Callable[..., Any], args: Tuple[Any, ...], kwargs: Dict[str, Any]
+    ) -> str:
+        name = f"{factory.__module__}.{getattr(factory, '__qualname__', repr(factory))}"
+        return json.dumps([name, args, kwargs], sort_keys=True, default=repr)
+
+    def acquire(self, factory: Callable[..., T], *args, **kwargs) -> T:
+        """
+        Returns the shared model built by `factory(*args, **kwargs)`, loading it
+        on first use.
+
+        Args:
+            factory (Callable[..., T]): Model class or function that builds it.
+            *args: Positional arguments for the factory.
+            **kwargs: Keyword arguments for the factory.
+
+        Returns:
+            T: The shared model instance.
+        """
+        key = self._make_key(factory, args, kwargs)
+        with self._lock:
+            if key not in self._models:
+                logger.info(f"Loading model {key}")
+                model = factory(*args, **kwargs)
+                self._models[key] = model
+                self._ref_counts[key] = 0
+                self._keys_by_id[id(model)] = key
+            self._ref_counts[key] += 1
+            return self._models[key]
+
+    def release(self, model: Any):
+        """
+        Drops one reference to a model, unloading it when none are left.
+
+        Args:
+            model (Any): A model returned by `acquire`.
+        """
+        with self._lock:
+            key = self._keys_by_id.get(id(model))
+            if key is None:
+                raise ValueError("Model was not acquired from this registry")
+
+            self._ref_counts[key] -= 1
+            if self._ref_counts[key] > 0:
+                return
+
+            del self._models[key]
+            del self._ref_counts[key]
+            del self._keys_by_id[id(model)]
+        logger.info(f"Unloading model {key}")
+        if hasattr(model, "clean_up"):
+            model.clean_up()
+
+    @contextmanager
+    def use(self, factory: Callable[..., T], *args, **kwargs) -> Iterator[T]:
+        """
+        Context manager that acquires a model and releases it on exit.
+        """
+        model = self.acquire(factory, *args, **kwargs)
+        try:
+            yield model
+        finally:
+            self.release(model)
+
+    def loaded_models(self) -> Dict[str, int]:
+        """
+        Returns the reference count of every loaded model, keyed on its registry key.
+        """
+        with self._lock:
+            return dict(self._ref_counts)
+
+    def clear(self):
+        """
+        Unloads every model regardless of outstanding references.
+        """
+        with self._lock:
+            models = list(self._models.values())
+            self._models.clear()
+            self._ref_counts.clear()
+            self._keys_by_id.clear()
+        for model in models:
+            if hasattr(model, "clean_up"):
+                model.clean_up()
+
+
+# Process-wide registry shared by evaluators and pipelines
+model_registry = ModelRegistry()
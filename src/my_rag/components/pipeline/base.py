@@ -10,6 +10,9 @@ class PipelineData:
     documents: Optional[List[str]] = None
     document_ids: Optional[List[str]] = None
     metadata: Optional[List[Dict[str, Any]]] = None
+    chunk_ids: Optional[List[str]] = None
+    unique_documents: Optional[List[str]] = None
+    duplicate_inverse: Optional[List[int]] = None
     embeddings: Optional[Any] = None
     queries: Optional[List[str]] = None
     query_embeddings: Optional[Any] = None
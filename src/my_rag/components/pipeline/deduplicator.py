@@ -0,0 +1,32 @@
+import logging
+from .base import PipelineStep, PipelineData
+from ..utils import deduplicate_texts
+
+logger = logging.getLogger(__name__)
+
+
+class ChunkDeduplicator(PipelineStep):
+    """Finds identical chunk texts so each one is embedded only once"""
+
+    def __init__(self):
+        self.duplicates_removed = 0
+
+    def run(self, pipeline_data: PipelineData) -> PipelineData:
+        # After IncrementalIndexer, an empty list means nothing changed
+        if pipeline_data.documents is None or (
+            not pipeline_data.documents and pipeline_data.chunk_ids is None
+        ):
+            raise ValueError("Documents must be provided for deduplication")
+
+        unique_documents, inverse = deduplicate_texts(pipeline_data.documents)
+        self.duplicates_removed = len(pipeline_data.documents) - len(unique_documents)
+        logger.info(
+            f"Removed {self.duplicates_removed} duplicate chunks "
+            f"({len(unique_documents)} unique of {len(pipeline_data.documents)})"
+        )
+
+        # Documents and metadata keep one row per chunk; DocumentEmbedder embeds
+        # the unique texts and fans the vectors back out to every row
+        pipeline_data.unique_documents = unique_documents
+        pipeline_data.duplicate_inverse = inverse
+        return pipeline_data
@@ -1,4 +1,6 @@
-from typing import Optional
+from typing import Any, Dict, Optional
+import numpy as np
+import torch
 from .base import PipelineStep, PipelineData
 from ..embeddings.base import BaseEmbedding
 
@@ -11,20 +13,52 @@ class DocumentEmbedder(PipelineStep):
         embedding_model: BaseEmbedding,
         batch_size: int = 32,
         instruction: Optional[str] = None,
+        embed_kwargs: Optional[Dict[str, Any]] = None,
+        output_path: Optional[str] = None,
     ):
         self.model = embedding_model
         self.batch_size = batch_size
         self.instruction = instruction
+        self.embed_kwargs = embed_kwargs or {}
+        # When set, embeddings are streamed into a memory-mapped .npy file
+        self.output_path = output_path
 
     def run(self, pipeline_data: PipelineData) -> PipelineData:
-        if not pipeline_data.documents:
+        if pipeline_data.documents is None or (
+            not pipeline_data.documents and pipeline_data.chunk_ids is None
+        ):
             raise ValueError("Documents must be provided for embedding")
+        if not pipeline_data.documents:
+            # IncrementalIndexer found no new or changed chunks
+            pipeline_data.embeddings = None
+            return pipeline_data
 
-        pipeline_data.embeddings = self.model.embed(
-            pipeline_data.documents,
+        # After ChunkDeduplicator, embed each unique text once
+        inverse = pipeline_data.duplicate_inverse
+        texts = (
+            pipeline_data.unique_documents
+            if inverse is not None
+            else pipeline_data.documents
+        )
+        embed_kwargs = dict(
             batch_size=self.batch_size,
             instruction=self.instruction,
+            **self.embed_kwargs,
         )
+
+        if self.output_path:
+            # Duplicates are fanned out into the on-disk array block by block
+            pipeline_data.embeddings = self.model.embed_to_memmap(
+                texts, self.output_path, inverse=inverse, **embed_kwargs
+            )
+        else:
+            embeddings = self.model.embed(texts, **embed_kwargs)
+            if inverse is not None:
+                if isinstance(embeddings, torch.Tensor):
+                    embeddings = embeddings[torch.as_tensor(inverse)]
+                else:
+                    embeddings = np.asarray(embeddings)[np.asarray(inverse)]
+            pipeline_data.embeddings = embeddings
         return pipeline_data
 
 
@@ -36,10 +70,12 @@ class QueryEmbedder(PipelineStep):
         embedding_model: BaseEmbedding,
         batch_size: int = 32,
         instruction: Optional[str] = None,
+        embed_kwargs: Optional[Dict[str, Any]] = None,
     ):
         self.model = embedding_model
         self.batch_size = batch_size
         self.instruction = instruction
+        self.embed_kwargs = embed_kwargs or {}
 
     def run(self, pipeline_data: PipelineData) -> PipelineData:
         if not pipeline_data.queries:
@@ -49,5 +85,6 @@ class QueryEmbedder(PipelineStep):
             pipeline_data.queries,
             batch_size=self.batch_size,
             instruction=self.instruction,
+            **self.embed_kwargs,
         )
         return pipeline_data
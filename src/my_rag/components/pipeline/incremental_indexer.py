@@ -0,0 +1,126 @@
+import json
+import logging
+import os
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from .base import PipelineStep, PipelineData
+from ..utils import chunk_id
+from ..vectorstores.base import BaseVectorStore
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class IndexDiff:
+    """Chunk IDs added, kept and deleted by an incremental indexing run"""
+
+    added: List[str] = field(default_factory=list)
+    unchanged: List[str] = field(default_factory=list)
+    deleted: List[str] = field(default_factory=list)
+
+    def summary(self) -> str:
+        return (
+            f"{len(self.added)} added, {len(self.unchanged)} unchanged, "
+            f"{len(self.deleted)} deleted"
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "added": len(self.added),
+            "unchanged": len(self.unchanged),
+            "deleted": len(self.deleted),
+            "added_ids": self.added,
+            "deleted_ids": self.deleted,
+        }
+
+
+def diff_chunks(
+    chunk_ids: List[str], existing_ids: Iterable[str]
+) -> Tuple[IndexDiff, List[int]]:
+    """
+    Compares the chunks of a corpus with the IDs already in an index.
+
+    Args:
+        chunk_ids (List[str]): Stable ID of every current chunk (see `chunk_id`).
+            Repeated IDs (identical chunks of one document) are indexed once.
+        existing_ids (Iterable[str]): IDs stored in the index.
+
+    Returns:
+        Tuple[IndexDiff, List[int]]: The diff, where `deleted` lists the
+            stored IDs no longer in the corpus, and the positions of the
+            chunks to add.
+    """
+    existing_ids = set(existing_ids)
+    diff = IndexDiff()
+    rows_to_add = []
+    seen = set()
+    for row, doc_chunk_id in enumerate(chunk_ids):
+        if doc_chunk_id in seen:
+            continue
+        seen.add(doc_chunk_id)
+        if doc_chunk_id in existing_ids:
+            diff.unchanged.append(doc_chunk_id)
+        else:
+            diff.added.append(doc_chunk_id)
+            rows_to_add.append(row)
+    diff.deleted = [doc_id for doc_id in existing_ids if doc_id not in seen]
+    return diff, rows_to_add
+
+
+class IncrementalIndexer(PipelineStep):
+    """
+    Limits indexing to new and changed chunks of a persistent vector store.
+
+    Each chunk gets a stable ID from its document ID and text hash. Chunks
+    whose ID is already stored are dropped from the pipeline data, so only
+    new or edited chunks are embedded and added (under their stable IDs),
+    and stored chunks that are no longer in the corpus are deleted. Place
+    it right after DocumentProcessor, with a store that keeps its contents
+    between runs. Reducers must be loaded from a save_path in incremental
+    runs, since a run may embed few or no chunks to fit them on.
+    """
+
+    def __init__(
+        self,
+        vector_store: BaseVectorStore,
+        delete_missing: bool = True,
+        diff_path: Optional[str] = None,
+    ):
+        """
+        Args:
+            vector_store: Store the Retriever adds to; must implement get_ids
+                and delete.
+            delete_missing: Whether stored chunks absent from the corpus are
+                deleted. Disable when indexing only part of a corpus.
+            diff_path: JSON file the diff of each run is written to
+        """
+        self.vector_store = vector_store
+        self.delete_missing = delete_missing
+        self.diff_path = diff_path
+        self.last_diff: Optional[IndexDiff] = None
+
+    def run(self, pipeline_data: PipelineData) -> PipelineData:
+        if pipeline_data.documents is None or pipeline_data.metadata is None:
+            raise ValueError("Chunks and their metadata must be provided for indexing")
+
+        chunk_ids = [
+            chunk_id(metadata["doc_id"], text)
+            for text, metadata in zip(pipeline_data.documents, pipeline_data.metadata)
+        ]
+        diff, rows = diff_chunks(chunk_ids, self.vector_store.get_ids())
+        if not self.delete_missing:
+            diff.deleted = []
+        elif diff.deleted:
+            self.vector_store.delete(diff.deleted)
+
+        pipeline_data.documents = [pipeline_data.documents[row] for row in rows]
+        pipeline_data.metadata = [pipeline_data.metadata[row] for row in rows]
+        pipeline_data.chunk_ids = diff.added
+        self.last_diff = diff
+        logger.info(f"Incremental index update: {diff.summary()}")
+
+        if self.diff_path:
+            os.makedirs(os.path.dirname(self.diff_path) or ".", exist_ok=True)
+            with open(self.diff_path, "w") as f:
+                json.dump(diff.to_dict(), f, indent=2)
+        return pipeline_data
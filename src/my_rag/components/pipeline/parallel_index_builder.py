@@ -0,0 +1,520 @@
+import hashlib
+import json
+import logging
+import math
+import multiprocessing as mp
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import torch
+
+from .base import PipelineData
+from ..embeddings.base import BaseEmbedding
+from ..utils import chunk_id
+from ..vectorstores.base import BaseVectorStore
+from ..vectorstores.product_quantizer import ProductQuantizer
+from ..vectorstores.segment_file import SegmentFile
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = "manifest.json"
+CHUNKS = "chunks.jsonl"
+VECTORS = "vectors.seg"
+CODES = "codes.seg"
+CODEBOOK = "codebook.npz"
+
+# Splits documents into chunk texts and the document ID of each chunk
+ChunkFn = Callable[[List[str], List[str]], Tuple[List[str], List[str]]]
+
+# Embedding model owned by each worker process, created once by _init_worker
+_worker_model: Optional[BaseEmbedding] = None
+
+
+def _init_worker(embedding_factory: Callable[[], BaseEmbedding], num_threads: int):
+    """Creates the worker's embedding model and pins its intra-op thread count."""
+    global _worker_model
+    torch.set_num_threads(num_threads)
+    _worker_model = embedding_factory()
+
+
+def _chunk(
+    documents: List[str],
+    document_ids: List[str],
+    chunk_fn: Optional[ChunkFn],
+    chunk_size: int,
+    chunk_overlap: int,
+) -> Tuple[List[str], List[Dict[str, Any]]]:
+    if chunk_fn is not None:
+        texts, chunk_doc_ids = chunk_fn(documents, document_ids)
+        return texts, [{"doc_id": doc_id} for doc_id in chunk_doc_ids]
+    # Imported lazily so a chunk_fn works without the text splitter dependencies
+    from .document_processor import DocumentProcessor
+
+    processor = DocumentProcessor(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    pipeline_data = processor.run(
+        PipelineData(documents=documents, document_ids=document_ids)
+    )
+    return pipeline_data.documents, pipeline_data.metadata
+
+
+def _embed(texts: List[str], embed_kwargs: Dict[str, Any]) -> np.ndarray:
+    embeddings = _worker_model.embed(texts, **embed_kwargs)
+    if hasattr(embeddings, "cpu"):
+        embeddings = embeddings.cpu().float().numpy()
+    return np.asarray(embeddings, dtype=np.float32)
+
+
+def _embed_sample(args: Tuple) -> np.ndarray:
+    """Chunks and embeds sample documents, for training the codebook."""
+    documents, document_ids, chunk_settings, embed_kwargs = args
+    texts, _ = _chunk(documents, document_ids, *chunk_settings)
+    return _embed(texts, embed_kwargs)
+
+
+def _build_slice(args: Tuple) -> int:
+    """
+    Chunks, embeds and encodes one slice of the corpus into its directory.
+
+    The slice is written to a temporary directory that is renamed into place
+    once complete, so an interrupted build never leaves a slice that looks
+    finished.
+    """
+    (
+        slice_dir,
+        documents,
+        document_ids,
+        chunk_settings,
+        embed_kwargs,
+        codebook_path,
+        fingerprint,
+    ) = args
+    texts, metadatas = _chunk(documents, document_ids, *chunk_settings)
+
+    # Identical chunks of one document share an ID; keep the first
+    ids, rows, seen = [], [], set()
+    for row, (text, metadata) in enumerate(zip(texts, metadatas)):
+        doc_chunk_id = chunk_id(metadata["doc_id"], text)
+        if doc_chunk_id not in seen:
+            seen.add(doc_chunk_id)
+            ids.append(doc_chunk_id)
+            rows.append(row)
+
+    tmp_dir = f"{slice_dir}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    dim = None
+    if ids:
+        vectors = _embed([texts[row] for row in rows], embed_kwargs)
+        dim = vectors.shape[1]
+        SegmentFile(os.path.join(tmp_dir, VECTORS), dtype="float32").append(
+            ids, vectors
+        )
+        if codebook_path:
+            codes = ProductQuantizer.load(codebook_path).encode(vectors)
+            SegmentFile(os.path.join(tmp_dir, CODES), dtype="uint8").append(ids, codes)
+
+    with open(os.path.join(tmp_dir, CHUNKS), "w") as f:
+        for doc_chunk_id, row in zip(ids, rows):
+            record = {
+                "id": doc_chunk_id,
+                "text": texts[row],
+                "metadata": metadatas[row],
+            }
+            f.write(json.dumps(record) + "\n")
+    with open(os.path.join(tmp_dir, MANIFEST), "w") as f:
+        json.dump({"fingerprint": fingerprint, "count": len(ids), "dim": dim}, f)
+
+    shutil.rmtree(slice_dir, ignore_errors=True)
+    os.replace(tmp_dir, slice_dir)
+    return len(ids)
+
+
+def _read_chunks(index_dir: str) -> Iterator[Dict[str, Any]]:
+    with open(os.path.join(index_dir, CHUNKS)) as f:
+        for line in f:
+            yield json.loads(line)
+
+
+def _file_digest(path: str) -> str:
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ParallelIndexBuilder:
+    """
+    Builds an index over a large corpus with several worker processes.
+
+    The corpus is cut into slices of `slice_size` documents. Worker
+    processes each chunk, embed and (optionally) product-quantize one slice
+    at a time into an independent on-disk segment directory under
+    `output_dir`. Each slice directory holds the float32 vectors and PQ codes
+    as `SegmentFile`s, plus the chunk texts and metadata. `merge` then
+    combines the slices into one index with a single id -> row map. It can
+    be loaded into any vector store with `load_index`, or read in batches
+    with `iter_index_batches`.
+
+    A slice only counts as built once its directory is complete and its
+    fingerprint matches the slice's documents, chunking and codebook.
+    Re-running `build` after a crash or a failed slice therefore redoes only
+    the slices that did not finish. The PQ codebook is trained once, on a
+    sample of the corpus, before the workers start, so the codes of all
+    slices are comparable and can be merged.
+    """
+
+    def __init__(
+        self,
+        output_dir: str,
+        embedding_factory: Callable[[], BaseEmbedding],
+        num_workers: Optional[int] = None,
+        threads_per_worker: Optional[int] = None,
+        slice_size: int = 1000,
+        chunk_size: int = 2000,
+        chunk_overlap: int = 250,
+        chunk_fn: Optional[ChunkFn] = None,
+        embed_kwargs: Optional[Dict[str, Any]] = None,
+        pq_subspaces: Optional[int] = None,
+        codebook_sample_size: int = 200,
+        max_retries: int = 1,
+        start_method: str = "spawn",
+    ):
+        """
+        Args:
+            output_dir (str): Directory of the slice segments and merged index.
+                Use one directory per embedding model: slices built by another
+                model are not detected.
+            embedding_factory (Callable[[], BaseEmbedding]): Picklable callable
+                creating the embedding model in each worker, e.g.
+                functools.partial(HuggingFaceEmbedding, model_name, device="cpu")
+            num_workers (Optional[int]): Number of worker processes. Defaults
+                to the number of CPU cores divided by threads_per_worker.
+            threads_per_worker (Optional[int]): torch intra-op threads per
+                worker. Defaults to 1 when num_workers is not given.
+            slice_size (int): Documents per slice, i.e. the unit of work that
+                is redone after a failure
+            chunk_size (int): Chunk size of the default DocumentProcessor
+            chunk_overlap (int): Chunk overlap of the default DocumentProcessor
+            chunk_fn (Optional[ChunkFn]): Picklable function splitting
+                (documents, document_ids) into (chunk texts, chunk document
+                IDs), used instead of DocumentProcessor
+            embed_kwargs (Optional[Dict[str, Any]]): Keyword arguments for the
+                model's embed method
+            pq_subspaces (Optional[int]): With a value, vectors are also
+                product-quantized to this many bytes
+            codebook_sample_size (int): Documents embedded to train the
+                codebook
+            max_retries (int): Times failed slices are retried in a fresh
+                worker pool before `build` gives up
+            start_method (str): multiprocessing start method
+        """
+        cpu_count = os.cpu_count() or 1
+        if num_workers is None:
+            threads_per_worker = threads_per_worker or 1
+            num_workers = max(1, cpu_count // threads_per_worker)
+        elif threads_per_worker is None:
+            threads_per_worker = max(1, cpu_count // num_workers)
+        if slice_size < 1:
+            raise ValueError(f"slice_size must be at least 1, got {slice_size}")
+
+        self.output_dir = output_dir
+        self.embedding_factory = embedding_factory
+        self.num_workers = num_workers
+        self.threads_per_worker = threads_per_worker
+        self.slice_size = slice_size
+        self.chunk_settings = (chunk_fn, chunk_size, chunk_overlap)
+        self.embed_kwargs = embed_kwargs or {}
+        self.pq_subspaces = pq_subspaces
+        self.codebook_sample_size = codebook_sample_size
+        self.max_retries = max_retries
+        self.start_method = start_method
+
+    @property
+    def codebook_path(self) -> Optional[str]:
+        if not self.pq_subspaces:
+            return None
+        return os.path.join(self.output_dir, CODEBOOK)
+
+    @property
+    def merged_dir(self) -> str:
+        return os.path.join(self.output_dir, "merged")
+
+    def _executor(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=self.num_workers,
+            mp_context=mp.get_context(self.start_method),
+            initializer=_init_worker,
+            initargs=(self.embedding_factory, self.threads_per_worker),
+        )
+
+    def _slice_fingerprint(
+        self, documents: List[str], document_ids: List[str], codebook_digest: str
+    ) -> str:
+        chunk_fn, chunk_size, chunk_overlap = self.chunk_settings
+        digest = hashlib.sha1()
+        digest.update(
+            json.dumps(
+                [
+                    getattr(chunk_fn, "__qualname__", None),
+                    chunk_size,
+                    chunk_overlap,
+                    self.embed_kwargs,
+                    codebook_digest,
+                ],
+                default=repr,
+            ).encode("utf-8")
+        )
+        for doc_id, document in zip(document_ids, documents):
+            digest.update(f"{doc_id}\0{len(document)}\0".encode("utf-8"))
+            digest.update(document.encode("utf-8"))
+        return digest.hexdigest()
+
+    @staticmethod
+    def _is_complete(slice_dir: str, fingerprint: str) -> bool:
+        try:
+            with open(os.path.join(slice_dir, MANIFEST)) as f:
+                return json.load(f)["fingerprint"] == fingerprint
+        except (OSError, ValueError, KeyError):
+            return False
+
+    def _train_codebook(self, documents: List[str], document_ids: List[str]):
+        """Trains the shared PQ codebook on a sample of the corpus in a worker."""
+        rng = np.random.default_rng(0)
+        sample = np.sort(
+            rng.choice(
+                len(documents),
+                min(self.codebook_sample_size, len(documents)),
+                replace=False,
+            )
+        )
+        with self._executor() as executor:
+            vectors = executor.submit(
+                _embed_sample,
+                (
+                    [documents[i] for i in sample],
+                    [document_ids[i] for i in sample],
+                    self.chunk_settings,
+                    self.embed_kwargs,
+                ),
+            ).result()
+        ProductQuantizer(self.pq_subspaces).train(vectors).save(self.codebook_path)
+        logger.info(f"Trained PQ codebook on {len(vectors)} sample chunks")
+
+    def build(self, documents: List[str], document_ids: List[str]) -> List[str]:
+        """
+        Builds every slice that is not already built for these documents.
+
+        Args:
+            documents (List[str]): Document texts
+            document_ids (List[str]): Document IDs, in the same order
+
+        Returns:
+            List[str]: Slice directories, in corpus order
+
+        Raises:
+            RuntimeError: If slices still fail after `max_retries` retries.
+                Completed slices are kept, so calling `build` again resumes.
+        """
+        if len(documents) != len(document_ids):
+            raise ValueError(
+                f"Got {len(documents)} documents but {len(document_ids)} document IDs"
+            )
+        os.makedirs(self.output_dir, exist_ok=True)
+        if self.codebook_path and not os.path.exists(self.codebook_path):
+            self._train_codebook(documents, document_ids)
+        codebook_digest = _file_digest(self.codebook_path) if self.codebook_path else ""
+
+        num_slices = math.ceil(len(documents) / self.slice_size)
+        slice_dirs, pending = [], {}
+        for i in range(num_slices):
+            start = i * self.slice_size
+            slice_documents = documents[start : start + self.slice_size]
+            slice_ids = document_ids[start : start + self.slice_size]
+            slice_dir = os.path.join(self.output_dir, f"slice_{i:05d}")
+            slice_dirs.append(slice_dir)
+            fingerprint = self._slice_fingerprint(
+                slice_documents, slice_ids, codebook_digest
+            )
+            if not self._is_complete(slice_dir, fingerprint):
+                pending[slice_dir] = (
+                    slice_dir,
+                    slice_documents,
+                    slice_ids,
+                    self.chunk_settings,
+                    self.embed_kwargs,
+                    self.codebook_path,
+                    fingerprint,
+                )
+        logger.info(f"{num_slices - len(pending)} of {num_slices} slices already built")
+
+        for attempt in range(self.max_retries + 1):
+            if not pending:
+                break
+            if attempt:
+                logger.info(f"Retrying {len(pending)} failed slices")
+            # A crashed worker breaks the whole pool, so each round gets a new one
+            with self._executor() as executor:
+                futures = {
+                    executor.submit(_build_slice, task): slice_dir
+                    for slice_dir, task in pending.items()
+                }
+                for future in as_completed(futures):
+                    slice_dir = futures[future]
+                    try:
+                        count = future.result()
+                    except Exception as e:
+                        logger.error(f"Failed to build {slice_dir}: {e!r}")
+                        continue
+                    del pending[slice_dir]
+                    logger.info(f"Built {slice_dir} with {count} chunks")
+
+        if pending:
+            raise RuntimeError(
+                f"{len(pending)} slices failed to build: {sorted(pending)}; "
+                "run build again to retry them"
+            )
+        return slice_dirs
+
+    def merge(self, slice_dirs: List[str]) -> str:
+        """
+        Combines built slices into one index under `output_dir/merged`.
+
+        Rows keep the slice order. A chunk ID found in several slices (the
+        same document indexed twice) is kept once, from its first slice.
+
+        Args:
+            slice_dirs (List[str]): Slice directories returned by `build`
+
+        Returns:
+            str: Directory of the merged index
+        """
+        tmp_dir = f"{self.merged_dir}.tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+
+        # Slice segments and the IDs taken from each, in merge order
+        sources: List[Tuple[SegmentFile, Optional[SegmentFile], List[str]]] = []
+        seen, skipped, dim = set(), 0, None
+        with open(os.path.join(tmp_dir, CHUNKS), "w") as chunks_file:
+            for slice_dir in slice_dirs:
+                with open(os.path.join(slice_dir, MANIFEST)) as f:
+                    manifest = json.load(f)
+                if not manifest["count"]:
+                    continue
+                vectors = SegmentFile(os.path.join(slice_dir, VECTORS))
+                codes_path = os.path.join(slice_dir, CODES)
+                codes = SegmentFile(codes_path) if os.path.exists(codes_path) else None
+                if not vectors.verify() or (codes is not None and not codes.verify()):
+                    raise ValueError(
+                        f"Checksum mismatch in {slice_dir}; delete it and rebuild"
+                    )
+                if dim is not None and manifest["dim"] != dim:
+                    raise ValueError(
+                        f"{slice_dir} has dimension {manifest['dim']}, expected {dim}"
+                    )
+                dim = manifest["dim"]
+
+                records = [r for r in _read_chunks(slice_dir) if r["id"] not in seen]
+                skipped += manifest["count"] - len(records)
+                ids = [record["id"] for record in records]
+                seen.update(ids)
+                if not ids:
+                    continue
+                sources.append((vectors, codes, ids))
+                for record in records:
+                    chunks_file.write(json.dumps(record) + "\n")
+
+        # One commit per merged segment: the index and footer are written once
+        SegmentFile(os.path.join(tmp_dir, VECTORS), dtype="float32").append_batches(
+            (ids, vectors.get(ids)) for vectors, _, ids in sources
+        )
+        SegmentFile(os.path.join(tmp_dir, CODES), dtype="uint8").append_batches(
+            (ids, codes.get(ids)) for _, codes, ids in sources if codes is not None
+        )
+
+        if skipped:
+            logger.warning(f"Skipped {skipped} chunks already merged from other slices")
+        with open(os.path.join(tmp_dir, MANIFEST), "w") as f:
+            json.dump(
+                {
+                    "count": len(seen),
+                    "dim": dim,
+                    "slices": [os.path.basename(d) for d in slice_dirs],
+                    "pq_subspaces": self.pq_subspaces,
+                },
+                f,
+            )
+        if self.codebook_path:
+            shutil.copy(self.codebook_path, os.path.join(tmp_dir, CODEBOOK))
+
+        shutil.rmtree(self.merged_dir, ignore_errors=True)
+        os.replace(tmp_dir, self.merged_dir)
+        logger.info(f"Merged {len(slice_dirs)} slices into {self.merged_dir}")
+        return self.merged_dir
+
+    def run(self, documents: List[str], document_ids: List[str]) -> str:
+        """Builds the missing slices and merges them; returns the merged index."""
+        return self.merge(self.build(documents, document_ids))
+
+
+def iter_index_batches(
+    index_dir: str, batch_size: int = 4096
+) -> Iterator[Dict[str, Any]]:
+    """
+    Reads a merged index in row order.
+
+    Args:
+        index_dir (str): Directory returned by `ParallelIndexBuilder.merge`
+        batch_size (int): Chunks per batch
+
+    Yields:
+        Dict[str, Any]: 'ids', 'documents' and 'metadatas' lists, float32
+            'embeddings' and, for PQ builds, uint8 'codes' of the batch
+    """
+    vectors = SegmentFile(os.path.join(index_dir, VECTORS))
+    codes_path = os.path.join(index_dir, CODES)
+    codes = SegmentFile(codes_path) if os.path.exists(codes_path) else None
+
+    records = _read_chunks(index_dir)
+    while True:
+        batch = [record for _, record in zip(range(batch_size), records)]
+        if not batch:
+            return
+        ids = [record["id"] for record in batch]
+        yield {
+            "ids": ids,
+            "documents": [record["text"] for record in batch],
+            "metadatas": [record["metadata"] for record in batch],
+            "embeddings": vectors.get(ids),
+            "codes": None if codes is None else codes.get(ids),
+        }
+
+
+def load_index(
+    index_dir: str, vector_store: BaseVectorStore, batch_size: int = 4096
+) -> int:
+    """
+    Adds a merged index to a vector store, under the chunk IDs of the build.
+
+    Args:
+        index_dir (str): Directory returned by `ParallelIndexBuilder.merge`
+        vector_store (BaseVectorStore): Store to add the chunks to
+        batch_size (int): Chunks added per call
+
+    Returns:
+        int: Number of chunks added
+    """
+    count = 0
+    for batch in iter_index_batches(index_dir, batch_size):
+        vector_store.add_embeddings(
+            embeddings=batch["embeddings"],
+            documents=batch["documents"],
+            metadatas=batch["metadatas"],
+            ids=batch["ids"],
+        )
+        count += len(batch["ids"])
+    return count
@@ -0,0 +1,55 @@
+import logging
+import os
+from typing import Optional
+from .base import PipelineStep, PipelineData
+from ..embeddings.reduction import BaseReducer, load_reducer
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingReducer(PipelineStep):
+    """Reduces document and query embeddings with a fit-once reducer"""
+
+    def __init__(
+        self,
+        reducer: BaseReducer,
+        fit_sample_size: Optional[int] = 10000,
+        save_path: Optional[str] = None,
+    ):
+        """
+        Args:
+            reducer: Reducer to apply. Fitted on the first document embeddings it
+                sees unless already fitted.
+            fit_sample_size: Maximum number of document embeddings used for fitting
+            save_path: .npz file the fitted reducer is saved to. If it already
+                exists, the saved reducer is loaded instead of fitting a new one.
+        """
+        if save_path and os.path.exists(save_path):
+            reducer = load_reducer(save_path)
+            logger.info(f"Loaded fitted reducer from {save_path}")
+        self.reducer = reducer
+        self.fit_sample_size = fit_sample_size
+        self.save_path = save_path
+
+    def run(self, pipeline_data: PipelineData) -> PipelineData:
+        if not self.reducer.is_fitted:
+            if pipeline_data.embeddings is None:
+                raise ValueError(
+                    "Document embeddings must be provided to fit the reducer"
+                )
+            self.reducer.fit(pipeline_data.embeddings, sample_size=self.fit_sample_size)
+            if self.save_path:
+                os.makedirs(os.path.dirname(self.save_path) or ".", exist_ok=True)
+                self.reducer.save(self.save_path)
+
+        if pipeline_data.embeddings is not None:
+            pipeline_data.embeddings = self.reducer.transform(pipeline_data.embeddings)
+        if pipeline_data.query_embeddings is not None:
+            pipeline_data.query_embeddings = self.reducer.transform(
+                pipeline_data.query_embeddings
+            )
+
+        logger.info(
+            f"Reduced embeddings from {self.reducer.input_dim} to {self.reducer.output_dim} dimensions"
+        )
+        return pipeline_data
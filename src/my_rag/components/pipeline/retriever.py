@@ -18,11 +18,13 @@ class Retriever(PipelineStep):
 
     def run(self, pipeline_data: PipelineData) -> PipelineData:
         # Initialize vector store with document embeddings if not already done
-        self.vector_store.add_embeddings(
-            embeddings=pipeline_data.embeddings,
-            documents=pipeline_data.documents,
-            metadatas=pipeline_data.metadata,
-        )
+        if pipeline_data.documents:
+            self.vector_store.add_embeddings(
+                embeddings=pipeline_data.embeddings,
+                documents=pipeline_data.documents,
+                metadatas=pipeline_data.metadata,
+                ids=pipeline_data.chunk_ids,
+            )
 
         # Get results for each query
         results = self.vector_store.search(
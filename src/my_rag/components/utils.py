@@ -1,5 +1,44 @@
+import hashlib
 import re
+from typing import List, Tuple
 
 
 def alphanumeric_string(input_string):
     return re.sub(r"[^a-zA-Z0-9]", "", input_string)
+
+
+def deduplicate_texts(texts: List[str]) -> Tuple[List[str], List[int]]:
+    """
+    Finds exact duplicate texts by content hash.
+
+    Args:
+        texts (List[str]): Texts, possibly with duplicates.
+
+    Returns:
+        Tuple[List[str], List[int]]: Unique texts in first-seen order, and for
+            each input text the index of its unique text.
+    """
+    index_by_hash = {}
+    unique_texts, inverse = [], []
+    for text in texts:
+        key = hashlib.sha1(text.encode("utf-8")).digest()
+        if key not in index_by_hash:
+            index_by_hash[key] = len(unique_texts)
+            unique_texts.append(text)
+        inverse.append(index_by_hash[key])
+    return unique_texts, inverse
+
+
+def chunk_id(doc_id: str, text: str) -> str:
+    """
+    Stable ID of a chunk: its document ID plus a hash of its text, so the same
+    chunk gets the same ID in every indexing run and edited chunks get new ones.
+
+    Args:
+        doc_id (str): ID of the document the chunk belongs to.
+        text (str): Chunk text.
+
+    Returns:
+        str: Chunk ID.
+    """
+    return f"{doc_id}:{hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]}"
@@ -48,6 +48,95 @@ class BaseVectorStore(ABC):
         """
         pass
 
+    def get_ids(self) -> List[str]:
+        """
+        Lists the IDs of all stored embeddings.
+
+        Returns:
+            List[str]: Stored IDs
+
+        Raises:
+            NotImplementedError: If the store cannot list its IDs
+        """
+        raise NotImplementedError(f"{type(self).__name__} does not support get_ids")
+
+    def delete(self, ids: List[str]) -> int:
+        """
+        Deletes embeddings by ID. Unknown IDs are ignored.
+
+        Args:
+            ids (List[str]): IDs of the embeddings to delete.
+
+        Returns:
+            int: Number of embeddings deleted
+
+        Raises:
+            NotImplementedError: If the store does not support deletes
+        """
+        raise NotImplementedError(f"{type(self).__name__} does not support delete")
+
+    def delete_where(self, filter_dict: Dict) -> int:
+        """
+        Deletes the embeddings whose metadata matches a filter.
+
+        Args:
+            filter_dict (Dict): Chroma-style metadata filter; must not be empty.
+
+        Returns:
+            int: Number of embeddings deleted
+
+        Raises:
+            NotImplementedError: If the store does not support deletes
+        """
+        raise NotImplementedError(
+            f"{type(self).__name__} does not support delete_where"
+        )
+
+    def export_snapshot(self, path: str) -> int:
+        """
+        Writes the whole collection to a snapshot directory (see
+        `snapshot.SnapshotWriter`): ids, documents, metadata and vectors.
+
+        Args:
+            path (str): Snapshot directory; replaced if it exists
+
+        Returns:
+            int: Number of exported embeddings
+
+        Raises:
+            NotImplementedError: If the store cannot export snapshots
+        """
+        raise NotImplementedError(
+            f"{type(self).__name__} does not support export_snapshot"
+        )
+
+    def import_snapshot(self, path: str, batch_size: int = 16384) -> int:
+        """
+        Adds the contents of a snapshot to the store.
+
+        This default streams the memory-mapped snapshot through
+        `add_embeddings`; in-process stores override it to serve straight
+        from the mapped arrays.
+
+        Args:
+            path (str): Snapshot directory
+            batch_size (int): Embeddings added per call
+
+        Returns:
+            int: Number of imported embeddings
+        """
+        from .snapshot import Snapshot
+
+        snapshot = Snapshot(path)
+        for batch in snapshot.batches(batch_size):
+            self.add_embeddings(
+                embeddings=batch["embeddings"],
+                documents=batch["documents"],
+                metadatas=batch["metadatas"],
+                ids=batch["ids"],
+            )
+        return snapshot.count
+
     @abstractmethod
     def clean_up(self):
         """
@@ -1,7 +1,31 @@
 from typing import List, Dict, Any, Optional
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 import chromadb
+import numpy as np
 from enum import Enum
 from .base import BaseVectorStore
+from .snapshot import SnapshotWriter
+
+logger = logging.getLogger(__name__)
+
+# Used when the server does not report its maximum batch size
+DEFAULT_MAX_BATCH_SIZE = 5000
+
+# Errors raised by Chroma versions that only accept embeddings as lists: the
+# client-side validation, or JSON encoding of the HTTP request body
+NUMPY_REJECTION_MESSAGES = ("to be a list", "is not JSON serializable")
+
+
+def _is_numpy_rejection(error: Exception) -> bool:
+    """Tells whether an error means the client cannot send numpy embeddings."""
+    return any(message in str(error) for message in NUMPY_REJECTION_MESSAGES)
 
 
 class CollectionMode(Enum):
@@ -12,8 +36,23 @@ class CollectionMode(Enum):
     CREATE_IF_NOT_EXISTS = "create_if_not_exists"
 
 
+class ClientMode(Enum):
+    """Enum defining how the store connects to Chroma"""
+
+    HTTP = "http"  # Remote server; vectors are JSON-encoded
+    PERSISTENT = "persistent"  # Embedded, stored on disk
+    EPHEMERAL = "ephemeral"  # Embedded, in memory
+
+
 class ChromaVectorStore(BaseVectorStore):
-    """Vector store implementation using ChromaDB."""
+    """
+    Vector store implementation using ChromaDB.
+
+    The same store works against a remote server (`ClientMode.HTTP`) or an
+    embedded database (`ClientMode.PERSISTENT` / `ClientMode.EPHEMERAL`). In
+    the embedded modes, vectors are passed to Chroma as float32 numpy arrays
+    instead of being converted to lists of Python floats.
+    """
 
     def __init__(
         self,
@@ -24,6 +63,10 @@ class ChromaVectorStore(BaseVectorStore):
         headers: Optional[Dict[str, str]] = None,
         distance_metric: str = "cosine",
         mode: CollectionMode = CollectionMode.FAIL_IF_EXISTS,
+        batch_size: Optional[int] = None,
+        max_workers: int = 4,
+        client_mode: ClientMode = ClientMode.HTTP,
+        persist_directory: Optional[str] = None,
     ):
         """
         Initialize the ChromaDB vector store.
@@ -34,17 +77,40 @@ class ChromaVectorStore(BaseVectorStore):
             port (int): ChromaDB port
             distance_metric (str): Distance metric for similarity search
             mode (CollectionMode): Mode for handling existing collections
+            batch_size (Optional[int]): Rows per upload request, capped at the
+                server's maximum batch size
+            max_workers (int): Number of concurrent upload requests; embedded
+                clients upload sequentially
+            client_mode (ClientMode): Remote server or embedded database. Also
+                accepts the enum's string value.
+            persist_directory (Optional[str]): Database directory for
+                ClientMode.PERSISTENT
 
         Raises:
             ValueError: If collection exists and mode is FAIL_IF_EXISTS
         """
         self.collection_name = collection_name
-        self.client = chromadb.HttpClient(
-            host=host,
-            port=port,
-            ssl=ssl,
-            headers=headers,
-        )
+        self.client_mode = ClientMode(client_mode)
+        if self.client_mode == ClientMode.HTTP:
+            self.client = chromadb.HttpClient(
+                host=host,
+                port=port,
+                ssl=ssl,
+                headers=headers,
+            )
+            self.max_workers = max_workers
+        elif self.client_mode == ClientMode.PERSISTENT:
+            if not persist_directory:
+                raise ValueError("persist_directory is required in persistent mode")
+            self.client = chromadb.PersistentClient(path=persist_directory)
+            # Embedded writes share one database, so threads would only contend
+            self.max_workers = 1
+        else:
+            self.client = chromadb.EphemeralClient()
+            self.max_workers = 1
+        # Embedded clients accept numpy arrays; older Chroma versions only
+        # accept lists, which is detected on the first call
+        self._numpy_transport = self.client_mode != ClientMode.HTTP
 
         # Check if collection exists
         existing_collections = self.client.list_collections()
@@ -73,6 +139,48 @@ class ChromaVectorStore(BaseVectorStore):
                 name=collection_name, metadata={"hnsw:space": distance_metric}
             )
 
+        max_batch_size = self._server_max_batch_size()
+        self.batch_size = min(batch_size or max_batch_size, max_batch_size)
+
+    def _server_max_batch_size(self) -> int:
+        """Returns the largest number of rows the server accepts per request."""
+        try:
+            if hasattr(self.client, "get_max_batch_size"):
+                return self.client.get_max_batch_size()
+            return self.client.max_batch_size
+        except Exception as e:
+            logger.warning(
+                f"Could not read the server's max batch size ({e}); "
+                f"using {DEFAULT_MAX_BATCH_SIZE}"
+            )
+            return DEFAULT_MAX_BATCH_SIZE
+
+    def _to_transport(self, embeddings: Any) -> Any:
+        """Converts embeddings to what the client sends: arrays or lists."""
+        if hasattr(embeddings, "cpu"):
+            embeddings = embeddings.cpu().float().numpy()
+        if not isinstance(embeddings, np.ndarray):
+            return embeddings
+        if self._numpy_transport:
+            return np.ascontiguousarray(embeddings, dtype=np.float32)
+        return embeddings.tolist()
+
+    def _call_with_embeddings(self, method, embeddings_key: str, embeddings, **kwargs):
+        """
+        Calls a collection method with embeddings, falling back to lists once
+        if this Chroma version rejects numpy arrays.
+        """
+        try:
+            return method(**{embeddings_key: self._to_transport(embeddings)}, **kwargs)
+        except (TypeError, ValueError) as e:
+            if not self._numpy_transport or not _is_numpy_rejection(e):
+                raise
+            logger.warning(
+                f"Chroma rejected numpy embeddings ({e}); sending lists instead"
+            )
+            self._numpy_transport = False
+            return method(**{embeddings_key: self._to_transport(embeddings)}, **kwargs)
+
     def add_embeddings(
         self,
         embeddings: Any,
@@ -87,17 +195,143 @@ class ChromaVectorStore(BaseVectorStore):
             embeddings (Any): Document embeddings
             documents (List[str]): Original text documents
             metadatas (Optional[List[dict]]): Metadata for each document
-            ids (Optional[List[str]]): Optional custom IDs for the embeddings
+            ids (Optional[List[str]]): Optional custom IDs for the embeddings.
+                Unique IDs are generated when omitted.
         """
-        if ids is None:
-            ids = [f"doc_{i}" for i in range(len(documents))]
+        self.bulk_add(embeddings, documents, metadatas=metadatas, ids=ids)
 
+    def bulk_add(
+        self,
+        embeddings: Any,
+        documents: List[str],
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        checkpoint_path: Optional[str] = None,
+    ) -> int:
+        """
+        Uploads embeddings in server-sized batches over a pool of workers.
+
+        Batches are upserted, so re-sending a batch is harmless. With a
+        checkpoint file, every completed batch is recorded, and calling
+        `bulk_add` again with the same inputs and checkpoint skips them,
+        which resumes an interrupted ingest. The checkpoint also pins the
+        generated IDs, so a resumed run produces the same IDs. It is deleted
+        once every batch is done.
+
+        Args:
+            embeddings (Any): Document embeddings
+            documents (List[str]): Original text documents
+            metadatas (Optional[List[dict]]): Metadata for each document
+            ids (Optional[List[str]]): Optional custom IDs for the embeddings.
+                Unique IDs are generated when omitted.
+            checkpoint_path (Optional[str]): JSON file recording progress
+
+        Returns:
+            int: Number of rows uploaded by this call
+        """
+        if hasattr(embeddings, "cpu"):
+            embeddings = embeddings.cpu().float().numpy()
+        num_rows = len(documents)
+        if len(embeddings) != num_rows:
+            raise ValueError(
+                f"Got {len(embeddings)} embeddings but {num_rows} documents"
+            )
+
+        batch_size = self.batch_size
+        # Only a checkpoint needs to recognize a repeated ingest, and hashing
+        # every document is not free
+        fingerprint = None
+        if checkpoint_path:
+            fingerprint = hashlib.sha1(
+                json.dumps([num_rows, ids, documents]).encode("utf-8")
+            ).hexdigest()
+        checkpoint = self._load_checkpoint(checkpoint_path, fingerprint, batch_size)
+        completed = set(checkpoint["completed"])
+
+        if ids is None:
+            # A fresh prefix per ingest, so repeated calls never collide
+            ids = [f"doc_{checkpoint['run_id']}_{i}" for i in range(num_rows)]
         if metadatas is None:
             metadatas = [{"doc_id": doc_id} for doc_id in ids]
 
-        self.collection.add(
-            embeddings=embeddings, documents=documents, metadatas=metadatas, ids=ids
-        )
+        num_batches = (num_rows + batch_size - 1) // batch_size
+        pending = [b for b in range(num_batches) if b not in completed]
+        if completed:
+            logger.info(
+                f"Resuming ingest: {len(completed)} of {num_batches} batches done"
+            )
+
+        lock = threading.Lock()
+        start_time = time.perf_counter()
+        uploaded = [0]
+
+        def upload(batch_index: int):
+            start = batch_index * batch_size
+            end = min(start + batch_size, num_rows)
+            self._call_with_embeddings(
+                self.collection.upsert,
+                "embeddings",
+                embeddings[start:end],
+                documents=documents[start:end],
+                metadatas=metadatas[start:end],
+                ids=ids[start:end],
+            )
+            with lock:
+                completed.add(batch_index)
+                uploaded[0] += end - start
+                checkpoint["completed"] = sorted(completed)
+                self._save_checkpoint(checkpoint_path, checkpoint)
+                elapsed = time.perf_counter() - start_time
+                logger.info(
+                    f"Uploaded {len(completed)}/{num_batches} batches "
+                    f"({uploaded[0] / max(elapsed, 1e-9):.0f} rows/sec)"
+                )
+
+        if len(pending) <= 1 or self.max_workers <= 1:
+            for batch_index in pending:
+                upload(batch_index)
+        else:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                # list() re-raises the first failed upload
+                list(executor.map(upload, pending))
+
+        if checkpoint_path and os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+        return uploaded[0]
+
+    @staticmethod
+    def _load_checkpoint(
+        checkpoint_path: Optional[str], fingerprint: Optional[str], batch_size: int
+    ) -> Dict[str, Any]:
+        """Loads a matching checkpoint, or starts a new one."""
+        if checkpoint_path and os.path.exists(checkpoint_path):
+            with open(checkpoint_path) as f:
+                checkpoint = json.load(f)
+            if (
+                checkpoint.get("fingerprint") == fingerprint
+                and checkpoint.get("batch_size") == batch_size
+            ):
+                return checkpoint
+            logger.warning(
+                f"Ignoring checkpoint {checkpoint_path}: it belongs to a "
+                "different ingest"
+            )
+        return {
+            "run_id": uuid.uuid4().hex[:12],
+            "fingerprint": fingerprint,
+            "batch_size": batch_size,
+            "completed": [],
+        }
+
+    @staticmethod
+    def _save_checkpoint(checkpoint_path: Optional[str], checkpoint: Dict[str, Any]):
+        if not checkpoint_path:
+            return
+        tmp_path = f"{checkpoint_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(checkpoint, f)
+        # Atomic, so an interruption never leaves a half-written checkpoint
+        os.replace(tmp_path, checkpoint_path)
 
     def search(
         self,
@@ -121,14 +355,112 @@ class ChromaVectorStore(BaseVectorStore):
         if include is None:
             include = ["metadatas", "documents", "distances"]
 
-        results = self.collection.query(
-            query_embeddings=query_embeddings,
+        results = self._call_with_embeddings(
+            self.collection.query,
+            "query_embeddings",
+            query_embeddings,
             n_results=k,
             where=filter_dict,
             include=include,
         )
         return results
 
+    def get_ids(self) -> List[str]:
+        """
+        Lists the IDs of all stored embeddings, one page per request.
+
+        Returns:
+            List[str]: Stored IDs
+        """
+        ids = []
+        while True:
+            page = self.collection.get(
+                include=[], limit=self.batch_size, offset=len(ids)
+            )["ids"]
+            ids.extend(page)
+            if len(page) < self.batch_size:
+                return ids
+
+    def delete(self, ids: List[str]) -> int:
+        """
+        Deletes embeddings by ID, in server-sized batches. Unknown IDs are
+        ignored.
+
+        Args:
+            ids (List[str]): IDs of the embeddings to delete
+
+        Returns:
+            int: Number of embeddings deleted
+        """
+        count_before = self.collection.count()
+        for start in range(0, len(ids), self.batch_size):
+            self.collection.delete(ids=list(ids[start : start + self.batch_size]))
+        return count_before - self.collection.count()
+
+    def delete_where(self, filter_dict: Dict) -> int:
+        """
+        Deletes the embeddings whose metadata matches a filter.
+
+        Args:
+            filter_dict (Dict): Chroma-style metadata filter
+
+        Returns:
+            int: Number of embeddings deleted
+        """
+        if not filter_dict:
+            raise ValueError("delete_where needs a non-empty filter")
+        count_before = self.collection.count()
+        self.collection.delete(where=filter_dict)
+        return count_before - self.collection.count()
+
+    def export_snapshot(self, path: str) -> int:
+        """
+        Writes the whole collection to a snapshot, one page per request.
+
+        Chroma keeps the vectors as they were added, so the snapshot is
+        marked as not normalized; cosine stores normalize it on import.
+
+        Args:
+            path (str): Snapshot directory; replaced if it exists
+
+        Returns:
+            int: Number of exported embeddings
+        """
+        writer = SnapshotWriter(path)
+        count = self.collection.count()
+        embeddings = None
+        while writer.count < count:
+            page = self.collection.get(
+                include=["embeddings", "documents", "metadatas"],
+                limit=self.batch_size,
+                offset=writer.count,
+            )
+            if not page["ids"]:
+                break
+            page_embeddings = np.asarray(page["embeddings"], dtype=np.float32)
+            if embeddings is None:
+                embeddings = writer.open_array(
+                    "embeddings", (count, page_embeddings.shape[1]), np.float32
+                )
+            embeddings[writer.count : writer.count + len(page["ids"])] = page_embeddings
+            writer.write_rows(page["ids"], page["documents"], page["metadatas"])
+        if writer.count != count:
+            raise ValueError(
+                f"Collection changed during export: expected {count} rows, "
+                f"read {writer.count}"
+            )
+        metadata = self.collection.metadata or {}
+        writer.close(
+            {
+                "store": type(self).__name__,
+                "collection_name": self.collection_name,
+                "distance_metric": metadata.get("hnsw:space", "l2"),
+                "normalized": False,
+                "dimension": None if embeddings is None else embeddings.shape[1],
+            }
+        )
+        return count
+
     def get_collection_stats(self) -> Dict[str, Any]:
         """
         Get statistics about the collection.
@@ -140,6 +472,7 @@ class ChromaVectorStore(BaseVectorStore):
             "count": self.collection.count(),
             "name": self.collection_name,
             "metadata": self.collection.metadata,
+            "client_mode": self.client_mode.value,
         }
 
     def clean_up(self):
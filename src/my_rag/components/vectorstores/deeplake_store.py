@@ -1,26 +1,65 @@
 from .base import BaseVectorStore
-from typing import Any, List, Optional, Dict
+from .numpy_store import merge_top_k, sort_top_k
+from typing import Any, List, Optional, Dict, Iterator
+from contextlib import contextmanager
 import deeplake
 import numpy as np
+import logging
 import os
+import time
+
+logger = logging.getLogger(__name__)
 
 class DeepLakeVectorStore(BaseVectorStore):
     """
     Vector store implementation using Deep Lake.
+
+    Searches run against a normalized float32 copy of the embeddings, saved as
+    a memory-mapped .npy file next to the dataset. The copy is built on the
+    first search, reused across searches (and processes) and rebuilt after
+    `add_embeddings`, so a query no longer reloads the whole dataset.
+
+    Added rows are buffered in memory and written with a single commit once
+    `commit_every_rows` rows are buffered, `commit_interval` seconds have
+    passed since the last commit (checked when adding), on `flush()`, or
+    before a search. Use `bulk_load()` to defer the commit to the end of a
+    large ingestion.
     """
 
-    def __init__(self, dataset_path: str, overwrite: bool = False):
+    def __init__(
+        self,
+        dataset_path: str,
+        overwrite: bool = False,
+        search_block_size: int = 65536,
+        commit_every_rows: int = 10000,
+        commit_interval: Optional[float] = 60.0,
+    ):
         """
         Initializes the Deep Lake vector store.
 
         Args:
             dataset_path (str): The path to the Deep Lake dataset.
             overwrite (bool): Whether to overwrite the existing dataset.
+            search_block_size (int): Number of stored rows scored at once.
+            commit_every_rows (int): Buffered rows that trigger a commit.
+            commit_interval (Optional[float]): Seconds after the last commit
+                that trigger a commit on the next add. None disables it.
         """
         self.dataset_path = dataset_path
+        self.search_block_size = search_block_size
+        self.commit_every_rows = commit_every_rows
+        self.commit_interval = commit_interval
+        self._buffered_embeddings = []
+        self._buffered_metadata = []
+        self._buffered_rows = 0
+        self._last_commit = time.monotonic()
+        self._bulk_loading = False
+        self.cache_path = dataset_path.rstrip('/\\') + '.search_cache.npy'
+        self._matrix = None
 
         if overwrite and os.path.exists(dataset_path):
             deeplake.delete(dataset_path)
+            self._invalidate_cache()
 
         try:
             self.ds = deeplake.load(dataset_path)
@@ -46,9 +85,160 @@ class DeepLakeVectorStore(BaseVectorStore):
         elif len(metadata) != num_embeddings:
             raise ValueError("Length of metadata does not match number of embeddings.")
 
-        self.ds.embedding.append(embeddings)
-        self.ds.metadata.append(metadata)
-        self.ds.commit("Added new embeddings.")
+        self._buffered_embeddings.append(embeddings)
+        self._buffered_metadata.extend(metadata)
+        self._buffered_rows += num_embeddings
+
+        if self._bulk_loading:
+            return
+        interval_elapsed = (
+            self.commit_interval is not None
+            and time.monotonic() - self._last_commit >= self.commit_interval
+        )
+        if self._buffered_rows >= self.commit_every_rows or interval_elapsed:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes the buffered rows to the dataset with a single commit.
+        """
+        if not self._buffered_rows:
+            return
+        start = time.perf_counter()
+        num_rows = self._buffered_rows
+
+        # One sample per row, so single rows can be read back lazily
+        self.ds.embedding.extend(np.concatenate(self._buffered_embeddings))
+        self.ds.metadata.extend(self._buffered_metadata)
+        self.ds.commit(f"Added {num_rows} embeddings.")
+        self._buffered_embeddings = []
+        self._buffered_metadata = []
+        self._buffered_rows = 0
+        self._last_commit = time.monotonic()
+        self._invalidate_cache()
+
+        elapsed = time.perf_counter() - start
+        logger.info(
+            f"Committed {num_rows} rows in {elapsed:.2f}s "
+            f"({num_rows / max(elapsed, 1e-9):.0f} rows/sec)"
+        )
+
+    @contextmanager
+    def bulk_load(self) -> Iterator[Dict[str, float]]:
+        """
+        Context manager that buffers every add and commits once on exit.
+
+        Yields:
+            Dict[str, float]: Filled on exit with the number of 'rows' added,
+                the wall time in 'seconds' and the resulting 'rows_per_sec'.
+        """
+        stats = {}
+        start = time.perf_counter()
+        start_rows = len(self.ds.embedding) + self._buffered_rows
+        self._bulk_loading = True
+        try:
+            yield stats
+        finally:
+            self._bulk_loading = False
+        self.flush()
+
+        elapsed = time.perf_counter() - start
+        rows = len(self.ds.embedding) - start_rows
+        stats.update(
+            {
+                'rows': rows,
+                'seconds': elapsed,
+                'rows_per_sec': rows / max(elapsed, 1e-9),
+            }
+        )
+        logger.info(
+            f"Bulk loaded {rows} rows in {elapsed:.2f}s "
+            f"({stats['rows_per_sec']:.0f} rows/sec)"
+        )
+
+    def _invalidate_cache(self):
+        """Drops the cached search matrix; it is rebuilt on the next search."""
+        self._matrix = None
+        if os.path.exists(self.cache_path):
+            os.remove(self.cache_path)
+
+    def _search_matrix(self) -> np.ndarray:
+        """
+        Returns the memory-mapped, normalized embedding matrix, building it
+        block by block from the dataset if it is missing or stale.
+        """
+        self.flush()
+        num_rows = len(self.ds.embedding)
+        if self._matrix is not None and len(self._matrix) == num_rows:
+            return self._matrix
+
+        if os.path.exists(self.cache_path):
+            matrix = np.load(self.cache_path, mmap_mode='r')
+            if len(matrix) == num_rows:
+                self._matrix = matrix
+                return matrix
+            del matrix
+
+        dim = self.ds.embedding[0].numpy().shape[-1]
+        matrix = np.lib.format.open_memmap(
+            self.cache_path, mode='w+', dtype=np.float32, shape=(num_rows, dim)
+        )
+        for start in range(0, num_rows, self.search_block_size):
+            end = min(start + self.search_block_size, num_rows)
+            block = self.ds.embedding[start:end].numpy().astype(np.float32)
+            norms = np.linalg.norm(block, axis=1, keepdims=True)
+            matrix[start:end] = block / np.maximum(norms, 1e-12)
+        matrix.flush()
+        del matrix
+
+        self._matrix = np.load(self.cache_path, mmap_mode='r')
+        return self._matrix
+
+    def search_batch(self, query_embeddings: Any, k: int) -> List[List[Dict]]:
+        """
+        Searches for the top k most similar embeddings of each query by cosine
+        similarity.
+
+        Args:
+            query_embeddings (Any): The query embeddings (NumPy array), one per row.
+            k (int): The number of top results to return per query.
+
+        Returns:
+            List[List[Dict]]: For each query, its results with 'embedding',
+                'metadata' and 'score', best first.
+        """
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        if queries.ndim == 1:
+            queries = queries.reshape(1, -1)
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+
+        matrix = self._search_matrix()
+        k = min(k, len(matrix))
+        if k <= 0:
+            return [[] for _ in queries]
+
+        best_scores, best_indices = None, None
+        for start in range(0, len(matrix), self.search_block_size):
+            end = min(start + self.search_block_size, len(matrix))
+            scores = queries @ matrix[start:end].T
+            best_scores, best_indices = merge_top_k(
+                best_scores, best_indices, scores, np.arange(start, end), k
+            )
+        best_scores, best_indices = sort_top_k(best_scores, best_indices)
+
+        # Only the winning rows are read back from the dataset
+        results = []
+        for scores, indices in zip(best_scores, best_indices):
+            query_results = []
+            for score, idx in zip(scores, indices):
+                idx = int(idx)
+                query_results.append({
+                    'embedding': self.ds.embedding[idx].numpy(),
+                    'metadata': self.ds.metadata[idx].data()['value'],
+                    'score': float(score),
+                })
+            results.append(query_results)
+        return results
 
     def search(self, query_embedding: Any, k: int) -> List[Dict]:
         """
@@ -61,21 +251,24 @@ class DeepLakeVectorStore(BaseVectorStore):
         Returns:
             List[Dict]: A list of results with 'embedding' and 'metadata'.
         """
-        if not isinstance(query_embedding, np.ndarray):
-            query_embedding = np.array(query_embedding)
+        query_embedding = np.asarray(query_embedding)
+        if query_embedding.ndim == 2 and len(query_embedding) != 1:
+            raise ValueError("search takes a single query; use search_batch for several.")
+        return self.search_batch(query_embedding, k)[0]
 
-        embeddings = np.array(self.ds.embedding)
-        similarities = embeddings @ query_embedding.T
-        top_k_indices = np.argsort(-similarities.flatten())[:k]
-        results = []
-        for idx in top_k_indices:
-            result = {
-                'embedding': embeddings[0][idx],
-                'metadata': self.ds.metadata[0].data()['value'][idx]
-            }
-            results.append(result)
+    def get_collection_stats(self) -> Dict[str, Any]:
+        """
+        Get statistics about the collection.
 
-        return results
+        Returns:
+            Dict[str, Any]: Collection statistics
+        """
+        self.flush()
+        return {
+            'count': len(self.ds.embedding),
+            'path': self.dataset_path,
+            'search_cache': self.cache_path if self._matrix is not None else None,
+        }
 
     # TODO: def backup(self, path: str):
     #     """
@@ -93,7 +286,10 @@ class DeepLakeVectorStore(BaseVectorStore):
         Args:
             path (str): The file path to load the vector store from.
         """
+        self.flush()
         self.ds = deeplake.load(path)
+        self.cache_path = path.rstrip('/\\') + '.search_cache.npy'
+        self._matrix = None
 
     def clean_up(self):
         """
@@ -102,3 +298,7 @@ class DeepLakeVectorStore(BaseVectorStore):
         # TODO: deep lake clean up
         # self.ds.delete_by_path(self.dataset_path)
         deeplake.delete(self.dataset_path)
+        self._buffered_embeddings = []
+        self._buffered_metadata = []
+        self._buffered_rows = 0
+        self._invalidate_cache()
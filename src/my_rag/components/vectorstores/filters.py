@@ -0,0 +1,78 @@
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+_COMPARISONS: Dict[str, Callable[[Any, Any], bool]] = {
+    "$eq": lambda value, target: value == target,
+    "$ne": lambda value, target: value != target,
+    "$gt": lambda value, target: value > target,
+    "$gte": lambda value, target: value >= target,
+    "$lt": lambda value, target: value < target,
+    "$lte": lambda value, target: value <= target,
+    "$in": lambda value, target: value in target,
+    "$nin": lambda value, target: value not in target,
+}
+
+
+def _matches_condition(metadata: Dict[str, Any], field: str, condition: Any) -> bool:
+    if field not in metadata:
+        return False
+    value = metadata[field]
+    if not isinstance(condition, dict):
+        return value == condition
+
+    for operator, target in condition.items():
+        compare = _COMPARISONS.get(operator)
+        if compare is None:
+            raise ValueError(f"Unsupported filter operator: {operator}")
+        try:
+            if not compare(value, target):
+                return False
+        except TypeError:
+            # Incomparable types, e.g. a string field against a numeric bound
+            return False
+    return True
+
+
+def matches_filter(metadata: Optional[Dict[str, Any]], filter_dict: Dict) -> bool:
+    """
+    Checks a metadata dict against a Chroma-style `where` filter.
+
+    Supports equality (`{"field": value}`), the comparison operators `$eq`,
+    `$ne`, `$gt`, `$gte`, `$lt`, `$lte`, `$in` and `$nin`, and the logical
+    operators `$and` and `$or`. Several fields in one dict must all match.
+    Documents without the filtered field never match.
+
+    Args:
+        metadata (Optional[Dict[str, Any]]): Metadata of one document.
+        filter_dict (Dict): The filter.
+
+    Returns:
+        bool: Whether the metadata matches.
+    """
+    metadata = metadata or {}
+    for key, condition in filter_dict.items():
+        if key == "$and":
+            if not all(matches_filter(metadata, sub) for sub in condition):
+                return False
+        elif key == "$or":
+            if not any(matches_filter(metadata, sub) for sub in condition):
+                return False
+        elif key.startswith("$"):
+            raise ValueError(f"Unsupported filter operator: {key}")
+        elif not _matches_condition(metadata, key, condition):
+            return False
+    return True
+
+
+def filter_mask(
+    metadatas: List[Optional[Dict[str, Any]]], filter_dict: Dict
+) -> np.ndarray:
+    """
+    Returns a boolean mask of the metadatas matching a Chroma-style filter.
+    """
+    return np.fromiter(
+        (matches_filter(metadata, filter_dict) for metadata in metadatas),
+        dtype=bool,
+        count=len(metadatas),
+    )
@@ -0,0 +1,488 @@
+import logging
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+
+from .numpy_store import NumpyVectorStore, merge_top_k
+from .snapshot import Snapshot
+
+logger = logging.getLogger(__name__)
+
+
+def nearest_centroids(
+    data: np.ndarray,
+    centroids: np.ndarray,
+    spherical: bool,
+    block_rows: int = 65536,
+) -> np.ndarray:
+    """
+    Assigns every row of `data` to its nearest centroid.
+
+    Args:
+        data (np.ndarray): Vectors to assign.
+        centroids (np.ndarray): Centroids.
+        spherical (bool): Compare by inner product (unit-length data) instead
+            of euclidean distance.
+        block_rows (int): Rows assigned per matrix multiplication.
+
+    Returns:
+        np.ndarray: Centroid index of each row.
+    """
+    centroid_sq_norms = np.einsum("ij,ij->i", centroids, centroids)
+    assignments = np.empty(len(data), dtype=np.int64)
+    for start in range(0, len(data), block_rows):
+        scores = data[start : start + block_rows] @ centroids.T
+        if not spherical:
+            scores *= 2
+            scores -= centroid_sq_norms
+        assignments[start : start + block_rows] = scores.argmax(axis=1)
+    return assignments
+
+
+def kmeans(
+    data: np.ndarray,
+    n_clusters: int,
+    n_iter: int = 20,
+    spherical: bool = False,
+    seed: int = 0,
+) -> np.ndarray:
+    """
+    Lloyd's k-means, initialized from randomly chosen rows.
+
+    Empty clusters are re-seeded with random rows. With `spherical`, centroids
+    are renormalized after every update, which clusters unit vectors by
+    cosine similarity.
+
+    Args:
+        data (np.ndarray): Training vectors.
+        n_clusters (int): Number of clusters.
+        n_iter (int): Number of iterations.
+        spherical (bool): Whether to cluster by cosine similarity.
+        seed (int): Random seed.
+
+    Returns:
+        np.ndarray: Centroids of shape (n_clusters, dim).
+    """
+    if len(data) < n_clusters:
+        raise ValueError(
+            f"Need at least {n_clusters} vectors to train {n_clusters} clusters, "
+            f"got {len(data)}"
+        )
+    data = np.ascontiguousarray(data, dtype=np.float32)
+    rng = np.random.default_rng(seed)
+    centroids = data[rng.choice(len(data), n_clusters, replace=False)].copy()
+
+    for _ in range(n_iter):
+        assignments = nearest_centroids(data, centroids, spherical)
+        counts = np.bincount(assignments, minlength=n_clusters)
+        order = np.argsort(assignments, kind="stable")
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        non_empty = counts > 0
+        sums = np.add.reduceat(data[order], starts[non_empty], axis=0)
+        centroids[non_empty] = sums / counts[non_empty, None]
+
+        empty = np.flatnonzero(~non_empty)
+        if len(empty):
+            centroids[empty] = data[rng.choice(len(data), len(empty), replace=False)]
+        if spherical:
+            norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+            centroids /= np.maximum(norms, 1e-12)
+
+    return centroids
+
+
+class IVFVectorStore(NumpyVectorStore):
+    """
+    Approximate vector store using an inverted-file (IVF) index.
+
+    Vectors are clustered with k-means into `nlist` lists, and a query only
+    scores the vectors of its `nprobe` closest lists. Raising `nprobe` trades
+    latency for recall; `nprobe == nlist` is exact search.
+
+    The store keeps its rows sorted by list, so each list is a contiguous
+    block of the matrix and is scored without gathering. Vectors added after
+    training are assigned to their list right away but stay in an unsorted
+    tail until it grows past `relayout_fraction` of the sorted rows, at which
+    point all rows are re-sorted. Until the index is trained, searches are
+    exact; training happens automatically once `min_train_size` vectors are
+    stored, or explicitly with `train()`.
+    """
+
+    def __init__(
+        self,
+        collection_name: str = "default",
+        distance_metric: str = "cosine",
+        nlist: int = 1024,
+        nprobe: int = 8,
+        min_train_size: Optional[int] = None,
+        train_sample_size: Optional[int] = None,
+        kmeans_iters: int = 20,
+        relayout_fraction: float = 0.1,
+        seed: int = 0,
+        **kwargs,
+    ):
+        """
+        Args:
+            collection_name (str): Name reported in the collection stats
+            distance_metric (str): 'cosine', 'ip' or 'l2'
+            nlist (int): Number of inverted lists (k-means clusters)
+            nprobe (int): Number of lists scanned per query
+            min_train_size (Optional[int]): Number of stored vectors that
+                triggers training. Defaults to 39 * nlist.
+            train_sample_size (Optional[int]): Maximum number of vectors used
+                for k-means. Defaults to 256 * nlist.
+            kmeans_iters (int): Number of k-means iterations
+            relayout_fraction (float): Size of the unsorted tail, relative to
+                the sorted rows, that triggers re-sorting the matrix
+            seed (int): Random seed for sampling and k-means
+            **kwargs: Passed to NumpyVectorStore
+        """
+        super().__init__(
+            collection_name=collection_name, distance_metric=distance_metric, **kwargs
+        )
+        if nlist < 1:
+            raise ValueError(f"nlist must be at least 1, got {nlist}")
+        if nprobe < 1:
+            raise ValueError(f"nprobe must be at least 1, got {nprobe}")
+
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.min_train_size = min_train_size or 39 * nlist
+        self.train_sample_size = train_sample_size or 256 * nlist
+        self.kmeans_iters = kmeans_iters
+        self.relayout_fraction = relayout_fraction
+        self.seed = seed
+        self._reset_index()
+
+    def _reset_index(self):
+        self.centroids: Optional[np.ndarray] = None
+        self._centroid_sq_norms: Optional[np.ndarray] = None
+        # Rows [0, _sorted_size) are sorted by list; list i spans
+        # [_list_offsets[i], _list_offsets[i + 1])
+        self._list_offsets: Optional[np.ndarray] = None
+        self._sorted_size = 0
+        # List of each row in [_sorted_size, _size)
+        self._tail_assignments = np.empty(0, dtype=np.int64)
+        self._tail_groups: Optional[Tuple[np.ndarray, np.ndarray]] = None
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    @property
+    def _spherical(self) -> bool:
+        return self.distance_metric == "cosine"
+
+    def train(self, sample_size: Optional[int] = None):
+        """
+        Trains the list centroids on a sample of the stored vectors and sorts
+        all rows by list.
+
+        Args:
+            sample_size (Optional[int]): Maximum number of vectors used for
+                k-means. Defaults to train_sample_size.
+        """
+        self.wait_for_compaction()
+        sample_size = sample_size or self.train_sample_size
+        if self._size < self.nlist:
+            raise ValueError(
+                f"Need at least nlist={self.nlist} vectors to train, "
+                f"got {self._size}"
+            )
+
+        rng = np.random.default_rng(self.seed)
+        if self._size > sample_size:
+            rows = np.sort(rng.choice(self._size, sample_size, replace=False))
+            sample = self.embeddings[rows]
+        else:
+            sample = self.embeddings
+
+        logger.info(f"Training {self.nlist} IVF lists on {len(sample)} vectors")
+        self.centroids = kmeans(
+            sample,
+            self.nlist,
+            n_iter=self.kmeans_iters,
+            spherical=self._spherical,
+            seed=self.seed,
+        )
+        self._centroid_sq_norms = np.einsum("ij,ij->i", self.centroids, self.centroids)
+        self._relayout(
+            nearest_centroids(self.embeddings, self.centroids, self._spherical)
+        )
+
+    def _layout_state(self, assignments: np.ndarray) -> Dict[str, Any]:
+        """Index state of rows sorted by their list, `assignments` sorted."""
+        counts = np.bincount(assignments, minlength=self.nlist)
+        return {
+            "_list_offsets": np.concatenate([[0], np.cumsum(counts)]),
+            "_sorted_size": len(assignments),
+            "_tail_assignments": np.empty(0, dtype=np.int64),
+            "_tail_groups": None,
+        }
+
+    def _relayout(self, assignments: np.ndarray):
+        """Sorts all rows by their list."""
+        state = self._reordered_state(
+            np.argsort(assignments, kind="stable"), len(self._embeddings)
+        )
+        state.update(self._layout_state(assignments))
+        self._apply_state(state)
+
+    def add_embeddings(
+        self,
+        embeddings: Any,
+        documents: List[str],
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+    ):
+        """
+        Add embeddings and their metadata to the store.
+
+        Args:
+            embeddings (Any): Document embeddings (array, tensor or list)
+            documents (List[str]): Original text documents
+            metadatas (Optional[List[dict]]): Metadata for each document
+            ids (Optional[List[str]]): Optional custom IDs for the embeddings
+        """
+        start = self._size
+        super().add_embeddings(embeddings, documents, metadatas, ids)
+        if self._size == start:
+            return
+
+        if not self.is_trained:
+            if self._size >= self.min_train_size:
+                self.train()
+            return
+
+        new_assignments = nearest_centroids(
+            self._embeddings[start : self._size], self.centroids, self._spherical
+        )
+        self._tail_assignments = np.concatenate(
+            [self._tail_assignments, new_assignments]
+        )
+        self._tail_groups = None
+        if len(self._tail_assignments) > self.relayout_fraction * self._sorted_size:
+            self._relayout(self._row_assignments())
+
+    def _row_assignments(self) -> np.ndarray:
+        """Returns the list of every stored row."""
+        sorted_assignments = np.repeat(
+            np.arange(self.nlist), np.diff(self._list_offsets)
+        )
+        return np.concatenate([sorted_assignments, self._tail_assignments])
+
+    def _compacted_state(self) -> Dict[str, Any]:
+        """Drops the deleted rows and re-sorts the remaining ones by list."""
+        if not self.is_trained:
+            return super()._compacted_state()
+        live = np.flatnonzero(~self._deleted[: self._size])
+        assignments = self._row_assignments()[live]
+        order = np.argsort(assignments, kind="stable")
+        state = self._reordered_state(live[order], max(len(live), 1))
+        state.update(self._layout_state(assignments))
+        return state
+
+    def _snapshot_manifest(self) -> Dict[str, Any]:
+        manifest = super()._snapshot_manifest()
+        manifest["nlist"] = self.nlist
+        return manifest
+
+    def _snapshot_state(self) -> Dict[str, np.ndarray]:
+        state = super()._snapshot_state()
+        if self.is_trained:
+            state["centroids"] = self.centroids
+            state["list_offsets"] = self._list_offsets
+            state["tail_assignments"] = self._tail_assignments
+        return state
+
+    def _snapshot_compatible(self, snapshot: Snapshot) -> bool:
+        # Untrained snapshots are adopted untrained, like the exporting store
+        return snapshot.manifest.get(
+            "nlist"
+        ) == self.nlist and super()._snapshot_compatible(snapshot)
+
+    def _adopt_snapshot(self, snapshot: Snapshot):
+        super()._adopt_snapshot(snapshot)
+        self._reset_index()
+        if not snapshot.has_array("centroids"):
+            return
+        self.centroids = np.array(snapshot.array("centroids"))
+        self._centroid_sq_norms = np.einsum("ij,ij->i", self.centroids, self.centroids)
+        self._list_offsets = np.array(snapshot.array("list_offsets"))
+        self._tail_assignments = np.array(snapshot.array("tail_assignments"))
+        self._sorted_size = snapshot.count - len(self._tail_assignments)
+
+    def _get_tail_groups(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns the tail rows grouped by list, and each list's offsets."""
+        if self._tail_groups is None:
+            order = np.argsort(self._tail_assignments, kind="stable")
+            offsets = np.searchsorted(
+                self._tail_assignments[order], np.arange(self.nlist + 1)
+            )
+            self._tail_groups = (self._sorted_size + order, offsets)
+        return self._tail_groups
+
+    def _list_blocks(
+        self, list_id: int, mask: Optional[np.ndarray], rows_per_block: int
+    ) -> Iterator[Tuple[Union[slice, np.ndarray], np.ndarray]]:
+        """Yields (row selector, row indices) of each block of one list's rows."""
+        start, end = self._list_offsets[list_id], self._list_offsets[list_id + 1]
+        if mask is None:
+            for block_start in range(start, end, rows_per_block):
+                block_end = min(block_start + rows_per_block, end)
+                yield slice(block_start, block_end), np.arange(block_start, block_end)
+            rows = np.empty(0, dtype=np.int64)
+        else:
+            rows = np.arange(start, end)[mask[start:end]]
+
+        if len(self._tail_assignments):
+            tail_rows, tail_offsets = self._get_tail_groups()
+            tail = tail_rows[tail_offsets[list_id] : tail_offsets[list_id + 1]]
+            if mask is not None:
+                tail = tail[mask[tail]]
+            rows = np.concatenate([rows, tail])
+
+        for block_start in range(0, len(rows), rows_per_block):
+            block = rows[block_start : block_start + rows_per_block]
+            yield block, block
+
+    def _probe(self, queries: np.ndarray, nprobe: int) -> np.ndarray:
+        """Returns the `nprobe` closest lists of each query."""
+        # Lists are ranked by the search metric itself: inner product for
+        # 'ip' and 'cosine', negated squared distance (up to |q|^2) for 'l2'
+        scores = queries @ self.centroids.T
+        if self.distance_metric == "l2":
+            scores *= 2
+            scores -= self._centroid_sq_norms
+        if nprobe >= self.nlist:
+            return np.broadcast_to(np.arange(self.nlist), scores.shape)
+        return np.argpartition(scores, -nprobe, axis=1)[:, -nprobe:]
+
+    def search_indices(
+        self,
+        query_embeddings: Any,
+        k: int = 5,
+        filter_dict: Optional[Dict] = None,
+        nprobe: Optional[int] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Finds the rows nearest to each query among its closest lists.
+
+        Args:
+            query_embeddings (Any): Query embeddings
+            k (int): Number of results per query
+            filter_dict (Optional[Dict]): Chroma-style metadata filter
+            nprobe (Optional[int]): Lists scanned per query. Defaults to
+                self.nprobe.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Distances and row indices, nearest
+                first. Queries whose probed lists hold fewer than k matching
+                rows are padded with infinite distances and index -1.
+        """
+        with self._search_lock.searching():
+            if not self.is_trained:
+                return super().search_indices(query_embeddings, k, filter_dict)
+            return self._search_lists(query_embeddings, k, filter_dict, nprobe)
+
+    def _search_lists(
+        self,
+        query_embeddings: Any,
+        k: int,
+        filter_dict: Optional[Dict],
+        nprobe: Optional[int],
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Scans the probed lists of each query; see `search_indices`."""
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        queries = self._prepare_queries(query_embeddings)
+        candidates = self._candidate_rows(filter_dict)
+        mask = None
+        if candidates is not None:
+            mask = np.zeros(self._size, dtype=bool)
+            mask[candidates] = True
+
+        num_rows = len(self) if candidates is None else len(candidates)
+        k = min(k, num_rows)
+        if k <= 0:
+            empty = np.empty((len(queries), 0))
+            return empty.astype(np.float32), empty.astype(np.int64)
+
+        num_candidates = self._num_candidates(k, num_rows)
+
+        query_block_size = min(self.query_block_size, len(queries))
+        dim = self._embeddings.shape[1]
+        rows_per_block = max(
+            num_candidates, self.max_block_bytes // (4 * max(query_block_size, dim))
+        )
+
+        all_distances = []
+        all_indices = []
+        for q_start in range(0, len(queries), query_block_size):
+            query_block = queries[q_start : q_start + query_block_size]
+            query_state = self._query_state(query_block)
+            shape = (len(query_block), num_candidates)
+            best_scores = np.full(shape, -np.inf, dtype=np.float32)
+            best_indices = np.full(shape, -1, dtype=np.int64)
+
+            # Visit each probed list once, scoring all queries that probe it
+            probed = self._probe(query_block, nprobe).ravel()
+            order = np.argsort(probed, kind="stable")
+            probed = probed[order]
+            query_ids = order // nprobe
+            bounds = np.flatnonzero(np.diff(probed)) + 1
+            for group in np.split(np.arange(len(probed)), bounds):
+                list_id = probed[group[0]]
+                group_queries = query_ids[group]
+                group_state = query_state[group_queries]
+                for selector, rows in self._list_blocks(list_id, mask, rows_per_block):
+                    scores = self._score_rows(group_state, selector)
+                    if mask is None:
+                        self._mask_deleted(scores, selector)
+                    group_scores, group_indices = merge_top_k(
+                        best_scores[group_queries],
+                        best_indices[group_queries],
+                        scores,
+                        rows,
+                        num_candidates,
+                    )
+                    best_scores[group_queries] = group_scores
+                    best_indices[group_queries] = group_indices
+
+            # Deleted rows may fill slots no live row reached; drop them as padding
+            best_indices[np.isneginf(best_scores)] = -1
+            best_scores, best_indices = self._finish_top_k(
+                query_block, best_scores, best_indices, k
+            )
+            all_distances.append(self._to_distances(best_scores, query_block))
+            all_indices.append(best_indices)
+
+        return np.concatenate(all_distances), np.concatenate(all_indices)
+
+    def get_collection_stats(self) -> Dict[str, Any]:
+        """
+        Get statistics about the collection.
+
+        Returns:
+            Dict[str, Any]: Collection statistics
+        """
+        with self._search_lock.searching():
+            stats = super().get_collection_stats()
+            stats.update(
+                {
+                    "nlist": self.nlist,
+                    "nprobe": self.nprobe,
+                    "trained": self.is_trained,
+                }
+            )
+            if self.is_trained:
+                list_sizes = np.diff(self._list_offsets) + np.bincount(
+                    self._tail_assignments, minlength=self.nlist
+                )
+                stats["largest_list"] = int(list_sizes.max())
+                stats["empty_lists"] = int((list_sizes == 0).sum())
+        return stats
+
+    def clean_up(self):
+        """Release the stored vectors, documents and index."""
+        super().clean_up()
+        self._reset_index()
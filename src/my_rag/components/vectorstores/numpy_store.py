@@ -0,0 +1,751 @@
+import json
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+
+from .base import BaseVectorStore
+from .filters import filter_mask
+from .snapshot import Snapshot, SnapshotWriter, snapshot_compatible
+
+logger = logging.getLogger(__name__)
+
+DISTANCE_METRICS = ("cosine", "ip", "l2")
+
+
+def _to_matrix(embeddings: Any) -> np.ndarray:
+    if hasattr(embeddings, "cpu"):
+        embeddings = embeddings.cpu().float().numpy()
+    matrix = np.asarray(embeddings, dtype=np.float32)
+    return matrix.reshape(1, -1) if matrix.ndim == 1 else matrix
+
+
+def merge_top_k(
+    best_scores: Optional[np.ndarray],
+    best_indices: Optional[np.ndarray],
+    scores: np.ndarray,
+    indices: np.ndarray,
+    k: int,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Merges a block of candidate scores into the running top-k of each query.
+
+    Args:
+        best_scores (Optional[np.ndarray]): Running best scores (queries x <=k),
+            or None for the first block.
+        best_indices (Optional[np.ndarray]): Row indices of the running best.
+        scores (np.ndarray): Scores of the block (queries x block rows); higher
+            is better.
+        indices (np.ndarray): Row index of each block column, either shared by
+            all queries (1-D) or per query (2-D).
+        k (int): Number of results to keep.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: Unsorted top-k scores and row indices.
+    """
+    if indices.ndim == 1:
+        indices = np.broadcast_to(indices, scores.shape)
+    if best_scores is not None:
+        scores = np.concatenate([best_scores, scores], axis=1)
+        indices = np.concatenate([best_indices, indices], axis=1)
+    if scores.shape[1] > k:
+        # Partition on the scores themselves; negating would copy the block
+        top = np.argpartition(scores, -k, axis=1)[:, -k:]
+        scores = np.take_along_axis(scores, top, axis=1)
+        indices = np.take_along_axis(indices, top, axis=1)
+    return scores, indices
+
+
+def sort_top_k(
+    scores: np.ndarray, indices: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Sorts each query's top-k results by descending score."""
+    order = np.argsort(-scores, axis=1, kind="stable")
+    return (
+        np.take_along_axis(scores, order, axis=1),
+        np.take_along_axis(indices, order, axis=1),
+    )
+
+
+class _SearchLock:
+    """
+    Lets any number of searches run at once, while a state swap waits for
+    the searches in flight and holds off new ones only while it is applied.
+    A thread may search again inside its own search.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._searches = 0
+        self._swap_pending = False
+        self._local = threading.local()
+
+    @contextmanager
+    def searching(self):
+        depth = getattr(self._local, "depth", 0)
+        with self._condition:
+            if not depth:
+                self._condition.wait_for(lambda: not self._swap_pending)
+            self._searches += 1
+        self._local.depth = depth + 1
+        try:
+            yield
+        finally:
+            self._local.depth = depth
+            with self._condition:
+                self._searches -= 1
+                self._condition.notify_all()
+
+    @contextmanager
+    def swapping(self):
+        with self._condition:
+            self._swap_pending = True
+            try:
+                self._condition.wait_for(lambda: not self._searches)
+                yield
+            finally:
+                self._swap_pending = False
+                self._condition.notify_all()
+
+
+class NumpyVectorStore(BaseVectorStore):
+    """
+    In-process vector store backed by a contiguous float32 matrix.
+
+    Search is exact: each block of queries is scored against the stored
+    vectors with one matrix multiplication per block of rows, and the best
+    `k` per query are kept with `argpartition`. Blocks are sized so the score
+    matrix stays within `max_block_bytes`, which bounds memory when many
+    queries are searched against many vectors. Results use the same layout
+    as `ChromaVectorStore`, so the store can replace it in a `Retriever`.
+
+    Deletes only set a tombstone bit per row, which searches mask out. Once
+    the deleted rows exceed `compaction_threshold` of the stored rows, a
+    background thread compacts the store: it copies the live rows into new
+    arrays while searches keep running on the old ones, then swaps them in
+    between searches. Adds and deletes wait for a running compaction; as
+    before, they must not run concurrently with each other or with searches.
+    """
+
+    def __init__(
+        self,
+        collection_name: str = "default",
+        distance_metric: str = "cosine",
+        query_block_size: int = 256,
+        max_block_bytes: int = 64 * 1024 * 1024,
+        initial_capacity: int = 1024,
+        compaction_threshold: Optional[float] = 0.2,
+    ):
+        """
+        Args:
+            collection_name (str): Name reported in the collection stats
+            distance_metric (str): 'cosine', 'ip' (inner product) or 'l2'
+                (squared euclidean), with the same distances as Chroma
+            query_block_size (int): Maximum number of queries scored at once
+            max_block_bytes (int): Memory budget of one block of scores
+            initial_capacity (int): Number of rows allocated on first add
+            compaction_threshold (Optional[float]): Fraction of deleted rows
+                that starts a background compaction; None disables it
+        """
+        if distance_metric not in DISTANCE_METRICS:
+            raise ValueError(
+                f"Unsupported distance metric: {distance_metric}. "
+                f"Choose from {DISTANCE_METRICS}"
+            )
+        if query_block_size < 1:
+            raise ValueError(
+                f"query_block_size must be at least 1, got {query_block_size}"
+            )
+
+        self.collection_name = collection_name
+        self.distance_metric = distance_metric
+        self.query_block_size = query_block_size
+        self.max_block_bytes = max_block_bytes
+        self.initial_capacity = initial_capacity
+        self.compaction_threshold = compaction_threshold
+
+        self._embeddings: Optional[np.ndarray] = None
+        self._sq_norms: Optional[np.ndarray] = None  # Only used for l2
+        # Tombstones: deleted rows stay in place until compaction
+        self._deleted: Optional[np.ndarray] = None
+        self._num_deleted = 0
+        self._size = 0
+        # Default IDs keep counting past deleted rows, so they are never reused
+        self._next_default_id = 0
+        self.documents: List[str] = []
+        self.metadatas: List[Dict[str, Any]] = []
+        self.ids: List[str] = []
+        self._id_to_row: Dict[str, int] = {}
+        self._mask_cache: Dict[str, np.ndarray] = {}
+        self._search_lock = _SearchLock()
+        self._compaction_thread: Optional[threading.Thread] = None
+
+    def __len__(self) -> int:
+        return self._size - self._num_deleted
+
+    @property
+    def embeddings(self) -> np.ndarray:
+        """The stored vectors (normalized for the cosine metric)."""
+        if self._embeddings is None:
+            return np.empty((0, 0), dtype=np.float32)
+        return self._embeddings[: self._size]
+
+    def _allocate_rows(self, capacity: int, dim: int) -> Dict[str, Any]:
+        """
+        Allocates new per-row arrays, keyed by attribute name. Subclasses
+        add their own arrays or place them elsewhere, e.g. on disk.
+        """
+        return {
+            "_embeddings": np.empty((capacity, dim), dtype=np.float32),
+            "_sq_norms": np.empty(capacity, dtype=np.float32),
+            "_deleted": np.zeros(capacity, dtype=bool),
+        }
+
+    def _gather_rows(self, arrays: Dict[str, Any], order: Optional[np.ndarray]):
+        """
+        Copies the stored rows into newly allocated arrays: all of them in
+        place, or with new row i taken from old row order[i].
+        """
+        count = self._size if order is None else len(order)
+        block = 65536
+        for name, array in arrays.items():
+            source = getattr(self, name) if isinstance(array, np.ndarray) else None
+            if source is None:
+                continue
+            for start in range(0, count, block):
+                end = min(start + block, count)
+                rows = slice(start, end) if order is None else order[start:end]
+                array[start:end] = source[rows]
+
+    def _apply_state(self, state: Dict[str, Any]):
+        """Swaps in new attribute values between searches."""
+        with self._search_lock.swapping():
+            for name, value in state.items():
+                setattr(self, name, value)
+
+    def _grow(self, needed: int, dim: int):
+        """Reallocates the matrix to hold at least `needed` rows."""
+        current = 0 if self._embeddings is None else len(self._embeddings)
+        capacity = max(needed, 2 * current, self.initial_capacity)
+        arrays = self._allocate_rows(capacity, dim)
+        self._gather_rows(arrays, None)
+        self._apply_state(arrays)
+
+    def add_embeddings(
+        self,
+        embeddings: Any,
+        documents: List[str],
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+    ):
+        """
+        Add embeddings and their metadata to the store.
+
+        Args:
+            embeddings (Any): Document embeddings (array, tensor or list)
+            documents (List[str]): Original text documents
+            metadatas (Optional[List[dict]]): Metadata for each document
+            ids (Optional[List[str]]): Optional custom IDs for the embeddings
+        """
+        if len(documents) == 0:
+            return
+        self.wait_for_compaction()
+        matrix = _to_matrix(embeddings)
+        count = len(matrix)
+        if len(documents) != count:
+            raise ValueError(f"Got {count} embeddings but {len(documents)} documents")
+        if ids is None:
+            ids = [f"doc_{self._next_default_id + i}" for i in range(count)]
+        elif len(ids) != count:
+            raise ValueError(f"Got {count} embeddings but {len(ids)} ids")
+        if metadatas is None:
+            metadatas = [{"doc_id": doc_id} for doc_id in ids]
+        elif len(metadatas) != count:
+            raise ValueError(f"Got {count} embeddings but {len(metadatas)} metadatas")
+
+        if len(set(ids)) != count:
+            raise ValueError("Duplicate ids in the added embeddings")
+        existing = [doc_id for doc_id in ids if doc_id in self._id_to_row]
+        if existing:
+            raise ValueError(f"Ids already exist in the store: {existing[:5]}")
+        if (
+            self._embeddings is not None
+            and matrix.shape[1] != self._embeddings.shape[1]
+        ):
+            raise ValueError(
+                f"Embedding dimension {matrix.shape[1]} does not match the "
+                f"store dimension {self._embeddings.shape[1]}"
+            )
+
+        needed = self._size + count
+        if self._embeddings is None or needed > len(self._embeddings):
+            self._grow(needed, matrix.shape[1])
+
+        rows = slice(self._size, needed)
+        self._embeddings[rows] = matrix
+        if self.distance_metric == "cosine":
+            norms = np.linalg.norm(self._embeddings[rows], axis=1, keepdims=True)
+            self._embeddings[rows] /= np.maximum(norms, 1e-12)
+        self._sq_norms[rows] = np.einsum(
+            "ij,ij->i", self._embeddings[rows], self._embeddings[rows]
+        )
+
+        for offset, doc_id in enumerate(ids):
+            self._id_to_row[doc_id] = self._size + offset
+        self.documents.extend(documents)
+        self.metadatas.extend(metadatas)
+        self.ids.extend(ids)
+        self._size = needed
+        self._next_default_id += count
+        self._mask_cache.clear()
+
+    def _candidate_rows(self, filter_dict: Optional[Dict]) -> Optional[np.ndarray]:
+        """Returns the rows matching the filter, or None when unfiltered."""
+        if not filter_dict:
+            return None
+        key = json.dumps(filter_dict, sort_keys=True, default=repr)
+        if key not in self._mask_cache:
+            mask = filter_mask(self.metadatas, filter_dict)
+            if self._num_deleted:
+                mask &= ~self._deleted[: self._size]
+            self._mask_cache[key] = np.flatnonzero(mask)
+        return self._mask_cache[key]
+
+    def _mask_deleted(self, scores: np.ndarray, rows: Union[slice, np.ndarray]):
+        """Gives deleted rows in a block of scores the worst possible score."""
+        if self._num_deleted:
+            deleted = self._deleted[rows]
+            if deleted.any():
+                scores[:, deleted] = -np.inf
+
+    def _reordered_state(self, order: np.ndarray, capacity: int) -> Dict[str, Any]:
+        """
+        Builds new arrays and lists in which new row i is old row order[i],
+        without touching the current ones. Rows missing from `order` are
+        dropped.
+        """
+        arrays = self._allocate_rows(capacity, self._embeddings.shape[1])
+        self._gather_rows(arrays, order)
+        size = len(order)
+        deleted = arrays["_deleted"][:size]
+        ids = [self.ids[i] for i in order]
+        return {
+            **arrays,
+            "documents": [self.documents[i] for i in order],
+            "metadatas": [self.metadatas[i] for i in order],
+            "ids": ids,
+            "_id_to_row": {
+                doc_id: row for row, doc_id in enumerate(ids) if not deleted[row]
+            },
+            "_size": size,
+            "_num_deleted": int(np.count_nonzero(deleted)),
+            "_mask_cache": {},
+        }
+
+    def _reorder_rows(self, order: np.ndarray):
+        """
+        Rearranges the stored rows so that new row i is old row order[i].
+        Rows missing from `order` are dropped.
+        """
+        self._apply_state(self._reordered_state(order, len(self._embeddings)))
+
+    def get_ids(self) -> List[str]:
+        """
+        Lists the IDs of all stored embeddings.
+
+        Returns:
+            List[str]: Stored IDs, in row order
+        """
+        # A background compaction may swap the rows in between otherwise
+        with self._search_lock.searching():
+            if not self._num_deleted:
+                return list(self.ids)
+            live = np.flatnonzero(~self._deleted[: self._size])
+            return [self.ids[row] for row in live]
+
+    def delete(self, ids: List[str]) -> int:
+        """
+        Deletes embeddings by ID. Unknown IDs are ignored.
+
+        Args:
+            ids (List[str]): IDs of the embeddings to delete
+
+        Returns:
+            int: Number of embeddings deleted
+        """
+        self.wait_for_compaction()
+        rows = {self._id_to_row[doc_id] for doc_id in ids if doc_id in self._id_to_row}
+        self._tombstone(np.fromiter(rows, dtype=np.int64, count=len(rows)))
+        return len(rows)
+
+    def delete_where(self, filter_dict: Dict) -> int:
+        """
+        Deletes the embeddings whose metadata matches a filter.
+
+        Args:
+            filter_dict (Dict): Chroma-style metadata filter
+
+        Returns:
+            int: Number of embeddings deleted
+        """
+        if not filter_dict:
+            raise ValueError("delete_where needs a non-empty filter")
+        self.wait_for_compaction()
+        rows = self._candidate_rows(filter_dict)
+        self._tombstone(rows)
+        return len(rows)
+
+    def _tombstone(self, rows: np.ndarray):
+        """Marks rows as deleted and compacts once enough rows are."""
+        if not len(rows):
+            return
+        with self._search_lock.swapping():
+            self._deleted[rows] = True
+            self._num_deleted += len(rows)
+            for row in rows:
+                del self._id_to_row[self.ids[row]]
+            self._mask_cache.clear()
+        if (
+            self.compaction_threshold is not None
+            and self._num_deleted >= self.compaction_threshold * self._size
+        ):
+            self._compaction_thread = threading.Thread(
+                target=self._compact_in_background,
+                name=f"compact-{self.collection_name}",
+                daemon=True,
+            )
+            self._compaction_thread.start()
+
+    def _compacted_state(self) -> Dict[str, Any]:
+        """The store without its deleted rows, built beside the current one."""
+        live = np.flatnonzero(~self._deleted[: self._size])
+        return self._reordered_state(live, max(len(live), 1))
+
+    def compact(self) -> int:
+        """
+        Physically removes deleted rows and frees their memory.
+
+        The compacted arrays are built while searches keep running on the
+        current ones; searches only wait while the new arrays are swapped in.
+
+        Returns:
+            int: Number of rows removed
+        """
+        self.wait_for_compaction()
+        removed = self._num_deleted
+        if removed:
+            self._apply_state(self._compacted_state())
+            logger.info(f"Compacted {self.collection_name}: removed {removed} rows")
+        return removed
+
+    def _compact_in_background(self):
+        try:
+            self.compact()
+        except Exception:
+            logger.exception(f"Compaction of {self.collection_name} failed")
+
+    def wait_for_compaction(self):
+        """Blocks until a running background compaction has finished."""
+        thread = self._compaction_thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+
+    def _snapshot_manifest(self) -> Dict[str, Any]:
+        """Settings recorded in a snapshot and checked before adopting it."""
+        return {
+            "store": type(self).__name__,
+            "collection_name": self.collection_name,
+            "distance_metric": self.distance_metric,
+            "normalized": self.distance_metric == "cosine",
+            "dimension": (
+                None if self._embeddings is None else self._embeddings.shape[1]
+            ),
+            "next_default_id": self._next_default_id,
+        }
+
+    def _snapshot_state(self) -> Dict[str, np.ndarray]:
+        """Arrays besides the embeddings needed to serve from a snapshot."""
+        return {"sq_norms": self._sq_norms[: self._size]}
+
+    def _snapshot_compatible(self, snapshot: Snapshot) -> bool:
+        """Whether this store can serve the snapshot's arrays directly."""
+        return snapshot_compatible(snapshot, self.distance_metric, ["sq_norms"])
+
+    def _adopt_snapshot(self, snapshot: Snapshot):
+        """Serves from the snapshot's memory-mapped arrays, without copying."""
+        self._embeddings = snapshot.array("embeddings")
+        self._sq_norms = snapshot.array("sq_norms")
+        self._deleted = np.zeros(snapshot.count, dtype=bool)
+        self._num_deleted = 0
+        self._size = snapshot.count
+        self.ids = snapshot.ids
+        self.documents = snapshot.documents
+        self.metadatas = snapshot.metadatas
+        self._id_to_row = {doc_id: row for row, doc_id in enumerate(self.ids)}
+        self._next_default_id = max(
+            snapshot.manifest.get("next_default_id") or 0, snapshot.count
+        )
+        self._mask_cache.clear()
+
+    def export_snapshot(self, path: str) -> int:
+        """
+        Writes the stored rows, vectors and index state to a snapshot.
+        Deleted rows are compacted away first.
+
+        Args:
+            path (str): Snapshot directory; replaced if it exists
+
+        Returns:
+            int: Number of exported embeddings
+        """
+        self.compact()
+        writer = SnapshotWriter(path)
+        block = 65536
+        for start in range(0, self._size, block):
+            end = min(start + block, self._size)
+            writer.write_rows(
+                self.ids[start:end],
+                self.documents[start:end],
+                self.metadatas[start:end],
+            )
+        if self._size:
+            writer.write_array("embeddings", self.embeddings)
+            for name, array in self._snapshot_state().items():
+                writer.write_array(name, array)
+        writer.close(self._snapshot_manifest())
+        return self._size
+
+    def import_snapshot(self, path: str, batch_size: int = 16384) -> int:
+        """
+        Loads a snapshot into the store.
+
+        An empty store with the same settings as the exporting store maps the
+        snapshot's arrays read-only and serves from them right away; they are
+        copied into memory only when rows are later added or compacted.
+        Otherwise, e.g. for a different metric or a Chroma export, the rows
+        are added batch by batch.
+
+        Args:
+            path (str): Snapshot directory
+            batch_size (int): Embeddings added per call when not mapped
+
+        Returns:
+            int: Number of imported embeddings
+        """
+        snapshot = Snapshot(path)
+        if self._size or not snapshot.count or not self._snapshot_compatible(snapshot):
+            return super().import_snapshot(path, batch_size)
+        self._adopt_snapshot(snapshot)
+        logger.info(f"Mapped {snapshot.count} embeddings from snapshot {path}")
+        return snapshot.count
+
+    def _row_blocks(
+        self, candidates: Optional[np.ndarray], rows_per_block: int
+    ) -> Iterator[Tuple[Union[slice, np.ndarray], np.ndarray]]:
+        """Yields (row selector, row indices) of each block of rows."""
+        if candidates is None:
+            for start in range(0, self._size, rows_per_block):
+                end = min(start + rows_per_block, self._size)
+                yield slice(start, end), np.arange(start, end)
+        else:
+            for start in range(0, len(candidates), rows_per_block):
+                rows = candidates[start : start + rows_per_block]
+                yield rows, rows
+
+    def _prepare_queries(self, query_embeddings: Any) -> np.ndarray:
+        queries = _to_matrix(query_embeddings)
+        if self.distance_metric == "cosine":
+            norms = np.linalg.norm(queries, axis=1, keepdims=True)
+            queries = queries / np.maximum(norms, 1e-12)
+        return queries
+
+    def _scores(
+        self, queries: np.ndarray, vectors: np.ndarray, sq_norms: np.ndarray
+    ) -> np.ndarray:
+        """Scores where higher is better; converted to distances afterwards."""
+        scores = queries @ vectors.T
+        if self.distance_metric == "l2":
+            # ||q - x||^2 = ||q||^2 - (2 q.x - ||x||^2); ||q||^2 is added back later
+            scores *= 2
+            scores -= sq_norms
+        return scores
+
+    def _to_distances(self, scores: np.ndarray, queries: np.ndarray) -> np.ndarray:
+        if self.distance_metric == "l2":
+            query_sq_norms = np.einsum("ij,ij->i", queries, queries)[:, None]
+            return np.maximum(query_sq_norms - scores, 0.0)
+        return 1.0 - scores
+
+    def _query_state(self, queries: np.ndarray) -> np.ndarray:
+        """
+        Per-query data used to score stored rows, indexed by query along the
+        first axis. Compressed subclasses return e.g. lookup tables.
+        """
+        return queries
+
+    def _score_rows(
+        self, query_state: np.ndarray, rows: Union[slice, np.ndarray]
+    ) -> np.ndarray:
+        """Scores a block of stored rows, selected by a slice or indices."""
+        return self._scores(query_state, self._embeddings[rows], self._sq_norms[rows])
+
+    def _num_candidates(self, k: int, num_rows: int) -> int:
+        """Number of best-scoring rows kept per query while scanning."""
+        return k
+
+    def _finish_top_k(
+        self,
+        queries: np.ndarray,
+        scores: np.ndarray,
+        indices: np.ndarray,
+        k: int,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Turns the scanned candidates into the sorted top-k of each query."""
+        return sort_top_k(scores, indices)
+
+    def search_indices(
+        self,
+        query_embeddings: Any,
+        k: int = 5,
+        filter_dict: Optional[Dict] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Finds the rows nearest to each query.
+
+        Args:
+            query_embeddings (Any): Query embeddings
+            k (int): Number of results per query
+            filter_dict (Optional[Dict]): Chroma-style metadata filter
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Distances and row indices, both of
+                shape (queries, min(k, matching rows)), nearest first.
+        """
+        queries = self._prepare_queries(query_embeddings)
+        with self._search_lock.searching():
+            candidates = self._candidate_rows(filter_dict)
+            return self._search_candidates(queries, candidates, k)
+
+    def _search_candidates(
+        self, queries: np.ndarray, candidates: Optional[np.ndarray], k: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Exact top-k of prepared queries among the candidate rows (all if None)."""
+        num_rows = len(self) if candidates is None else len(candidates)
+        k = min(k, num_rows)
+        if k <= 0:
+            empty = np.empty((len(queries), 0))
+            return empty.astype(np.float32), empty.astype(np.int64)
+
+        num_candidates = self._num_candidates(k, num_rows)
+
+        query_block_size = min(self.query_block_size, len(queries))
+        # Bound both the score block and, for filtered searches, the gathered rows
+        dim = self._embeddings.shape[1]
+        rows_per_block = max(
+            num_candidates, self.max_block_bytes // (4 * max(query_block_size, dim))
+        )
+
+        all_distances = []
+        all_indices = []
+        for q_start in range(0, len(queries), query_block_size):
+            query_block = queries[q_start : q_start + query_block_size]
+            query_state = self._query_state(query_block)
+            best_scores, best_indices = None, None
+            for selector, rows in self._row_blocks(candidates, rows_per_block):
+                scores = self._score_rows(query_state, selector)
+                if candidates is None:
+                    self._mask_deleted(scores, selector)
+                best_scores, best_indices = merge_top_k(
+                    best_scores, best_indices, scores, rows, num_candidates
+                )
+            best_scores, best_indices = self._finish_top_k(
+                query_block, best_scores, best_indices, k
+            )
+            all_distances.append(self._to_distances(best_scores, query_block))
+            all_indices.append(best_indices)
+
+        return np.concatenate(all_distances), np.concatenate(all_indices)
+
+    def search(
+        self,
+        query_embeddings: Any,
+        k: int = 5,
+        filter_dict: Optional[Dict] = None,
+        include: Optional[List[str]] = None,
+    ) -> List[dict]:
+        """
+        Search for similar vectors.
+
+        Args:
+            query_embeddings (Any): Query embeddings
+            k (int): Number of results to return
+            filter_dict (Optional[Dict]): Chroma-style metadata filter
+            include (Optional[List[str]]): What to include in results, out of
+                'documents', 'metadatas', 'distances' and 'embeddings'
+
+        Returns:
+            List[dict]: Search results in Chroma's layout, one list per query
+        """
+        if include is None:
+            include = ["metadatas", "documents", "distances"]
+
+        # Rows are only meaningful until the next compaction swaps the arrays
+        with self._search_lock.searching():
+            distances, indices = self.search_indices(query_embeddings, k, filter_dict)
+            # Approximate subclasses pad queries with fewer than k hits with -1
+            found = indices >= 0
+            indices = [row[mask] for row, mask in zip(indices, found)]
+            results = {"ids": [[self.ids[i] for i in row] for row in indices]}
+            if "documents" in include:
+                results["documents"] = [
+                    [self.documents[i] for i in row] for row in indices
+                ]
+            if "metadatas" in include:
+                results["metadatas"] = [
+                    [self.metadatas[i] for i in row] for row in indices
+                ]
+            if "distances" in include:
+                results["distances"] = [
+                    row[mask].tolist() for row, mask in zip(distances, found)
+                ]
+            if "embeddings" in include:
+                results["embeddings"] = [
+                    self._embeddings[row].tolist() for row in indices
+                ]
+        return results
+
+    def get_collection_stats(self) -> Dict[str, Any]:
+        """
+        Get statistics about the collection.
+
+        Returns:
+            Dict[str, Any]: Collection statistics
+        """
+        with self._search_lock.searching():
+            return {
+                "count": len(self),
+                "deleted": self._num_deleted,
+                "name": self.collection_name,
+                "metadata": {"hnsw:space": self.distance_metric},
+                "dimension": (
+                    None if self._embeddings is None else self._embeddings.shape[1]
+                ),
+                "memory_bytes": self.embeddings.nbytes,
+            }
+
+    def clean_up(self):
+        """Release the stored vectors and documents."""
+        self.wait_for_compaction()
+        self._embeddings = None
+        self._sq_norms = None
+        self._deleted = None
+        self._num_deleted = 0
+        self._size = 0
+        self._next_default_id = 0
+        self.documents = []
+        self.metadatas = []
+        self.ids = []
+        self._id_to_row = {}
+        self._mask_cache = {}
@@ -0,0 +1,355 @@
+import logging
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .ivf_store import kmeans, nearest_centroids
+
+logger = logging.getLogger(__name__)
+
+# Centroids per subspace; codes are one byte each
+DEFAULT_CODEBOOK_SIZE = 256
+# Vectors collected per centroid before a codebook is trained
+TRAINING_VECTORS_PER_CENTROID = 40
+
+
+class ProductQuantizer:
+    """
+    Product quantizer: compresses vectors to `num_subspaces` bytes each.
+
+    The dimensions are split into `num_subspaces` equal sub-vectors, and a
+    k-means codebook of up to 256 centroids is trained for each of them. A
+    vector is stored as the index of its nearest centroid in every subspace.
+
+    Queries are never quantized. Asymmetric distance computation (ADC)
+    precomputes, per query, the inner product of each query sub-vector with
+    every centroid of its subspace; the approximate inner product with a
+    stored vector is then the sum of one table lookup per subspace.
+    """
+
+    def __init__(
+        self,
+        num_subspaces: int,
+        codebook_size: int = DEFAULT_CODEBOOK_SIZE,
+        n_iter: int = 20,
+        seed: int = 0,
+        block_size: int = 65536,
+    ):
+        """
+        Args:
+            num_subspaces (int): Number of sub-vectors, i.e. bytes per code.
+                Must divide the vector dimension.
+            codebook_size (int): Centroids per subspace, at most 256.
+            n_iter (int): k-means iterations per subspace.
+            seed (int): Random seed for sampling and k-means.
+            block_size (int): Rows encoded at a time, which bounds memory for
+                large (e.g. memory-mapped) inputs.
+        """
+        if num_subspaces < 1:
+            raise ValueError(f"num_subspaces must be at least 1, got {num_subspaces}")
+        if not 1 <= codebook_size <= 256:
+            raise ValueError(
+                f"codebook_size must be between 1 and 256, got {codebook_size}"
+            )
+        self.num_subspaces = num_subspaces
+        self.codebook_size = codebook_size
+        self.n_iter = n_iter
+        self.seed = seed
+        self.block_size = block_size
+        # (num_subspaces, codebook_size, subspace dim)
+        self.codebooks: Optional[np.ndarray] = None
+
+    @property
+    def is_trained(self) -> bool:
+        return self.codebooks is not None
+
+    @property
+    def dim(self) -> int:
+        return self.num_subspaces * self.codebooks.shape[2]
+
+    def _check_dim(self, data: np.ndarray):
+        if data.ndim != 2 or data.shape[1] != self.dim:
+            raise ValueError(
+                f"Expected vectors of dimension {self.dim}, got shape {data.shape}"
+            )
+
+    def train(
+        self, data: Any, sample_size: Optional[int] = 16384
+    ) -> "ProductQuantizer":
+        """
+        Trains one codebook per subspace on (a random sample of) the data.
+
+        If there are fewer training vectors than `codebook_size`, the
+        codebooks are shrunk to the number of vectors.
+
+        Args:
+            data (Any): 2D array-like of training vectors.
+            sample_size (Optional[int]): Maximum number of rows used for
+                training; 64 per centroid is plenty and training time grows
+                linearly with it. None uses every row.
+
+        Returns:
+            ProductQuantizer: The trained quantizer.
+        """
+        data = np.asarray(data)
+        if data.ndim != 2 or len(data) == 0:
+            raise ValueError(
+                "Product quantizer must be trained on a non-empty 2D array"
+            )
+        dim = data.shape[1]
+        if dim % self.num_subspaces:
+            raise ValueError(
+                f"num_subspaces ({self.num_subspaces}) must divide the vector "
+                f"dimension ({dim})"
+            )
+        if sample_size is not None and len(data) > sample_size:
+            rows = np.random.default_rng(self.seed).choice(
+                len(data), sample_size, replace=False
+            )
+            data = data[np.sort(rows)]
+        data = np.asarray(data, dtype=np.float32)
+
+        codebook_size = min(self.codebook_size, len(data))
+        if codebook_size < self.codebook_size:
+            logger.warning(
+                f"Only {len(data)} training vectors; using {codebook_size} "
+                f"centroids per subspace instead of {self.codebook_size}"
+            )
+        sub_dim = dim // self.num_subspaces
+        codebooks = np.empty(
+            (self.num_subspaces, codebook_size, sub_dim), dtype=np.float32
+        )
+        for m in range(self.num_subspaces):
+            codebooks[m] = kmeans(
+                data[:, m * sub_dim : (m + 1) * sub_dim],
+                codebook_size,
+                n_iter=self.n_iter,
+                seed=self.seed + m,
+            )
+        self.codebooks = codebooks
+        return self
+
+    def encode(self, data: Any) -> np.ndarray:
+        """
+        Encodes vectors as the nearest centroid of each subspace.
+
+        Args:
+            data (Any): 2D array-like of vectors.
+
+        Returns:
+            np.ndarray: uint8 codes of shape (rows, num_subspaces).
+        """
+        if not self.is_trained:
+            raise ValueError("Product quantizer must be trained before encoding")
+        data = np.asarray(data)
+        self._check_dim(data)
+        sub_dim = self.codebooks.shape[2]
+        codes = np.empty((len(data), self.num_subspaces), dtype=np.uint8)
+        for start in range(0, len(data), self.block_size):
+            block = np.asarray(data[start : start + self.block_size], dtype=np.float32)
+            for m in range(self.num_subspaces):
+                codes[start : start + len(block), m] = nearest_centroids(
+                    block[:, m * sub_dim : (m + 1) * sub_dim],
+                    self.codebooks[m],
+                    spherical=False,
+                )
+        return codes
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        """Reconstructs float32 vectors from their codes."""
+        if not self.is_trained:
+            raise ValueError("Product quantizer must be trained before decoding")
+        parts = self.codebooks[np.arange(self.num_subspaces), codes]
+        return parts.reshape(len(codes), self.dim)
+
+    def lookup_tables(self, queries: np.ndarray) -> np.ndarray:
+        """
+        Precomputes the ADC tables of a block of queries.
+
+        Args:
+            queries (np.ndarray): Float queries of shape (queries, dim).
+
+        Returns:
+            np.ndarray: Inner product of every query sub-vector with every
+                centroid, of shape (queries, num_subspaces, codebook size).
+        """
+        queries = np.asarray(queries, dtype=np.float32)
+        self._check_dim(queries)
+        # One batched matmul per subspace: (m, q, d) @ (m, d, k) -> (m, q, k)
+        sub_queries = queries.reshape(len(queries), self.num_subspaces, -1)
+        tables = sub_queries.transpose(1, 0, 2) @ self.codebooks.transpose(0, 2, 1)
+        return tables.transpose(1, 0, 2)
+
+    def adc_scores(self, tables: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        """
+        Approximate inner products of queries with encoded vectors.
+
+        Args:
+            tables (np.ndarray): Output of `lookup_tables`.
+            codes (np.ndarray): Codes of shape (rows, num_subspaces).
+
+        Returns:
+            np.ndarray: float32 scores of shape (queries, rows).
+        """
+        scores = np.zeros((len(tables), len(codes)), dtype=np.float32)
+        for m in range(self.num_subspaces):
+            scores += np.take(tables[:, m], codes[:, m], axis=1)
+        return scores
+
+    def save(self, path: str):
+        """
+        Saves the codebooks to an .npz file.
+
+        Args:
+            path (str): Destination file path.
+        """
+        if not self.is_trained:
+            raise ValueError("Only trained product quantizers can be saved")
+        np.savez(path, codebooks=self.codebooks)
+
+    @classmethod
+    def load(cls, path: str, **kwargs) -> "ProductQuantizer":
+        """
+        Loads codebooks saved with `save`.
+
+        Args:
+            path (str): Path of the .npz file.
+            **kwargs: Additional keyword arguments for the constructor.
+
+        Returns:
+            ProductQuantizer: The trained quantizer.
+        """
+        with np.load(path) as params:
+            codebooks = params["codebooks"]
+        quantizer = cls(
+            num_subspaces=codebooks.shape[0],
+            codebook_size=codebooks.shape[1],
+            **kwargs,
+        )
+        quantizer.codebooks = codebooks
+        return quantizer
+
+
+class CodebookBuffer:
+    """
+    Holds vectors back until there are enough to train a full codebook,
+    then trains it once and releases their codes.
+
+    Stores that encode vectors as they arrive would otherwise train on their
+    first batch, shrinking the codebook to that batch's size for good. A
+    codebook with fewer centroids than requested is never trained or saved.
+    """
+
+    def __init__(
+        self,
+        num_subspaces: int,
+        codebook_path: Optional[str] = None,
+        codebook_size: int = DEFAULT_CODEBOOK_SIZE,
+        training_size: Optional[int] = None,
+    ):
+        """
+        Args:
+            num_subspaces (int): Bytes per code.
+            codebook_path (Optional[str]): .npz file the trained codebook is
+                saved to. A codebook already there is reused if it has
+                `num_subspaces` subspaces of `codebook_size` centroids.
+            codebook_size (int): Centroids per subspace.
+            training_size (Optional[int]): Vectors collected before training.
+                Defaults to TRAINING_VECTORS_PER_CENTROID per centroid.
+        """
+        self.codebook_path = codebook_path
+        self.quantizer = ProductQuantizer(num_subspaces, codebook_size)
+        self.training_size = max(
+            training_size or TRAINING_VECTORS_PER_CENTROID * codebook_size,
+            codebook_size,
+        )
+        # Held-back vectors by ID
+        self.pending: Dict[str, np.ndarray] = {}
+        # Set when a saved codebook was found but has another shape
+        self.discarded_saved = False
+        if codebook_path and os.path.exists(codebook_path):
+            saved = ProductQuantizer.load(codebook_path)
+            if (saved.num_subspaces, saved.codebook_size) == (
+                num_subspaces,
+                codebook_size,
+            ):
+                self.quantizer = saved
+            else:
+                logger.warning(
+                    f"Ignoring codebook {codebook_path} with {saved.num_subspaces} "
+                    f"subspaces of {saved.codebook_size} centroids; expected "
+                    f"{num_subspaces} of {codebook_size}"
+                )
+                self.discarded_saved = True
+
+    @property
+    def is_trained(self) -> bool:
+        return self.quantizer.is_trained
+
+    def _no_codes(self) -> Tuple[List[str], np.ndarray]:
+        return [], np.empty((0, self.quantizer.num_subspaces), dtype=np.uint8)
+
+    def add(self, ids: List[str], vectors: Any) -> Tuple[List[str], np.ndarray]:
+        """
+        Encodes vectors, or holds them back while the codebook is untrained.
+
+        Args:
+            ids (List[str]): IDs of the vectors.
+            vectors (Any): 2D array-like of vectors.
+
+        Returns:
+            Tuple[List[str], np.ndarray]: IDs and codes ready to store: those
+                of `vectors` once trained, those of every held-back vector
+                when they complete the training set, none otherwise.
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.is_trained:
+            return list(ids), self.quantizer.encode(vectors)
+        self.pending.update(zip(ids, vectors))
+        if len(self.pending) < self.training_size:
+            return self._no_codes()
+        return self.flush()
+
+    def flush(self) -> Tuple[List[str], np.ndarray]:
+        """
+        Trains the codebook on the held-back vectors if needed, e.g. at the
+        end of indexing, and releases their codes. With fewer vectors than
+        centroids nothing is trained and the vectors stay held back.
+
+        Returns:
+            Tuple[List[str], np.ndarray]: IDs and codes of the released vectors.
+        """
+        if not self.pending:
+            return self._no_codes()
+        vectors = np.stack(list(self.pending.values()))
+        if not self.is_trained:
+            if len(vectors) < self.quantizer.codebook_size:
+                logger.warning(
+                    f"Only {len(vectors)} vectors; at least "
+                    f"{self.quantizer.codebook_size} are needed to train the codebook"
+                )
+                return self._no_codes()
+            self.use(self.quantizer.train(vectors))
+        ids = list(self.pending)
+        self.pending.clear()
+        return ids, self.quantizer.encode(vectors)
+
+    def use(self, quantizer: "ProductQuantizer"):
+        """
+        Adopts a trained quantizer, e.g. one from a parallel build, and saves
+        it to `codebook_path`.
+        """
+        if quantizer.codebooks.shape[1] < self.quantizer.codebook_size:
+            raise ValueError(
+                f"Codebook has {quantizer.codebooks.shape[1]} centroids per "
+                f"subspace, expected {self.quantizer.codebook_size}"
+            )
+        self.quantizer = quantizer
+        if self.codebook_path:
+            quantizer.save(self.codebook_path)
+
+    def discard(self, ids: List[str]):
+        """Drops held-back vectors, e.g. of deleted documents."""
+        for doc_id in ids:
+            self.pending.pop(doc_id, None)
@@ -0,0 +1,413 @@
+import logging
+import os
+import shutil
+import tempfile
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from .ivf_store import IVFVectorStore
+from .numpy_store import NumpyVectorStore, _to_matrix, merge_top_k, sort_top_k
+from .product_quantizer import (
+    DEFAULT_CODEBOOK_SIZE,
+    TRAINING_VECTORS_PER_CENTROID,
+    ProductQuantizer,
+)
+from .snapshot import Snapshot
+
+logger = logging.getLogger(__name__)
+
+QUANTIZATIONS = ("int8", "binary", "pq")
+
+
+class QuantizedVectorStore(NumpyVectorStore):
+    """
+    Vector store that searches compact codes and re-ranks with full vectors.
+
+    Only the codes are kept in memory: int8 codes with a per-dimension scale
+    (4x smaller than float32), packed sign bits (32x smaller) or product
+    quantization codes of `pq_subspaces` bytes per vector. The float32
+    vectors live in a memory-mapped .npy file on disk. A search scans the
+    codes for the best `k * rescore_factor` candidates per query, then reads
+    just those rows from disk and re-scores them exactly, so the returned
+    distances are exact and recall stays close to exact search.
+
+    Codes are scanned block by block: each block is cast to float32 and
+    multiplied with the (scaled) float queries through BLAS, which is far
+    faster than numpy's integer matmul and more accurate than also quantizing
+    the queries. Product quantization codes are scored through per-query
+    lookup tables instead (see `ProductQuantizer`).
+
+    The quantizer is fitted once `fit_size` vectors have been added, or when
+    `fit_quantizer` is called, so that it sees a representative sample; a
+    small first batch would otherwise fix a poor quantizer for good. Until
+    then searches are exact over the full vectors.
+    """
+
+    def __init__(
+        self,
+        collection_name: str = "default",
+        distance_metric: str = "cosine",
+        quantization: str = "int8",
+        rescore_factor: int = 4,
+        vectors_path: Optional[str] = None,
+        pq_subspaces: Optional[int] = None,
+        fit_size: Optional[int] = None,
+        **kwargs,
+    ):
+        """
+        Args:
+            collection_name (str): Name reported in the collection stats
+            distance_metric (str): 'cosine', 'ip' or 'l2'
+            quantization (str): 'int8', 'binary' or 'pq'
+            rescore_factor (int): Candidates re-scored per result
+            vectors_path (Optional[str]): .npy file holding the full vectors.
+                Defaults to a temporary file removed on clean_up.
+            pq_subspaces (Optional[int]): Bytes per vector with 'pq'; must
+                divide the dimension. Defaults to dimension / 8.
+            fit_size (Optional[int]): Vectors added before the quantizer is
+                fitted. Defaults to TRAINING_VECTORS_PER_CENTROID per PQ
+                centroid; with 'pq' it must cover one vector per centroid.
+            **kwargs: Passed to NumpyVectorStore
+        """
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(
+                f"Unsupported quantization: {quantization}. "
+                f"Choose from {QUANTIZATIONS}"
+            )
+        if rescore_factor < 1:
+            raise ValueError(f"rescore_factor must be at least 1, got {rescore_factor}")
+        if fit_size is None:
+            fit_size = TRAINING_VECTORS_PER_CENTROID * DEFAULT_CODEBOOK_SIZE
+        if quantization == "pq" and fit_size < DEFAULT_CODEBOOK_SIZE:
+            raise ValueError(
+                f"fit_size must be at least {DEFAULT_CODEBOOK_SIZE} with 'pq', "
+                f"got {fit_size}"
+            )
+        super().__init__(
+            collection_name=collection_name, distance_metric=distance_metric, **kwargs
+        )
+
+        self.quantization = quantization
+        self.rescore_factor = rescore_factor
+        self._temp_dir = None
+        if vectors_path is None:
+            self._temp_dir = tempfile.mkdtemp(prefix="quantized_store_")
+            vectors_path = os.path.join(self._temp_dir, "vectors.npy")
+        self.vectors_path = vectors_path
+        self.pq_subspaces = pq_subspaces
+        self.fit_size = fit_size
+
+        self._codes: Optional[np.ndarray] = None
+        # int8: per-dimension scale; binary: per-dimension center
+        self._scale: Optional[np.ndarray] = None
+        self._center: Optional[np.ndarray] = None
+        self._pq: Optional[ProductQuantizer] = None
+
+    def _allocate_rows(self, capacity: int, dim: int) -> Dict[str, Any]:
+        """Allocates the codes in memory and the full vectors in a new file."""
+        arrays = super()._allocate_rows(capacity, dim)
+        # Written beside the vector file and renamed over it by _apply_state
+        os.makedirs(os.path.dirname(self.vectors_path) or ".", exist_ok=True)
+        tmp_path = f"{self.vectors_path}.tmp.npy"
+        arrays["_embeddings"] = np.lib.format.open_memmap(
+            tmp_path, mode="w+", dtype=np.float32, shape=(capacity, dim)
+        )
+        arrays["_vectors_tmp_path"] = tmp_path
+
+        if self.quantization == "int8":
+            code_width, code_dtype = dim, np.int8
+        elif self.quantization == "binary":
+            code_width, code_dtype = (dim + 7) // 8, np.uint8
+        else:
+            code_width, code_dtype = self.pq_subspaces or dim // 8, np.uint8
+        arrays["_codes"] = np.empty((capacity, code_width), dtype=code_dtype)
+        return arrays
+
+    def _apply_state(self, state: Dict[str, Any]):
+        tmp_path = state.pop("_vectors_tmp_path", None)
+        if tmp_path is not None:
+            # Searches still running on the old file keep their mapping
+            state["_embeddings"].flush()
+            os.replace(tmp_path, self.vectors_path)
+        super()._apply_state(state)
+
+    @property
+    def is_fitted(self) -> bool:
+        return (
+            self._scale is not None or self._center is not None or self._pq is not None
+        )
+
+    def fit_quantizer(self, sample: Any = None):
+        """
+        Fits the quantization parameters now and encodes the stored vectors.
+
+        Args:
+            sample (Any): Vectors representative of the collection. For the
+                cosine metric they are normalized first, like added vectors.
+                Defaults to a sample of the stored vectors.
+        """
+        self.wait_for_compaction()
+        if sample is None:
+            vectors = self._fit_sample()
+        else:
+            vectors = _to_matrix(sample)
+            if self.distance_metric == "cosine":
+                norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+                vectors = vectors / np.maximum(norms, 1e-12)
+        self._fit_quantizer(vectors)
+
+    def _fit_sample(self, max_rows: int = 65536) -> np.ndarray:
+        """A random sample of the live stored vectors."""
+        live = np.flatnonzero(~self._deleted[: self._size])
+        if len(live) > max_rows:
+            rng = np.random.default_rng(0)
+            live = np.sort(rng.choice(live, max_rows, replace=False))
+        return np.asarray(self._embeddings[live])
+
+    def _fit_quantizer(self, vectors: np.ndarray):
+        """
+        Fixes the quantization parameters from (normalized) vectors, and
+        swaps them in with the codes of all stored rows.
+        """
+        if self.quantization == "int8":
+            # A high quantile rather than the max, so outliers don't waste range
+            bound = np.quantile(np.abs(vectors), 0.999, axis=0)
+            state = {"_scale": (np.maximum(bound, 1e-12) / 127).astype(np.float32)}
+        elif self.quantization == "binary":
+            state = {"_center": vectors.mean(axis=0).astype(np.float32)}
+        else:
+            if self._codes is not None:
+                num_subspaces = self._codes.shape[1]
+            else:
+                num_subspaces = self.pq_subspaces or vectors.shape[1] // 8
+            pq = ProductQuantizer(num_subspaces)
+            if len(vectors) < pq.codebook_size:
+                raise ValueError(
+                    f"Need at least {pq.codebook_size} vectors to train the PQ "
+                    f"codebook, got {len(vectors)}"
+                )
+            state = {"_pq": pq.train(vectors)}
+
+        if self._codes is not None:
+            # Encoded aside, so searches keep a consistent quantizer and codes
+            codes = np.empty_like(self._codes)
+            block = 65536
+            for start in range(0, self._size, block):
+                end = min(start + block, self._size)
+                codes[start:end] = self._encode(self._embeddings[start:end], state)
+            state["_codes"] = codes
+        self._apply_state(state)
+
+    def _encode(
+        self, vectors: np.ndarray, quantizer: Optional[Dict[str, Any]] = None
+    ) -> np.ndarray:
+        """Encodes vectors with the fitted quantizer, or the given parameters."""
+        if quantizer is None:
+            quantizer = {
+                "_scale": self._scale,
+                "_center": self._center,
+                "_pq": self._pq,
+            }
+        if self.quantization == "int8":
+            scaled = vectors / quantizer["_scale"]
+            return np.clip(np.rint(scaled), -127, 127).astype(np.int8)
+        if self.quantization == "pq":
+            return quantizer["_pq"].encode(vectors)
+        return np.packbits(vectors > quantizer["_center"], axis=1)
+
+    def _decode_block(self, codes: np.ndarray) -> np.ndarray:
+        """Casts codes to float32 so they can be scanned with BLAS."""
+        if self.quantization == "int8":
+            return codes.astype(np.float32)
+        dim = self._embeddings.shape[1]
+        bits = np.unpackbits(codes, axis=1, count=dim).astype(np.float32)
+        return bits * 2 - 1
+
+    def add_embeddings(
+        self,
+        embeddings: Any,
+        documents: List[str],
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+    ):
+        """
+        Add embeddings and their metadata to the store.
+
+        Args:
+            embeddings (Any): Document embeddings (array, tensor or list)
+            documents (List[str]): Original text documents
+            metadatas (Optional[List[dict]]): Metadata for each document
+            ids (Optional[List[str]]): Optional custom IDs for the embeddings
+        """
+        start = self._size
+        super().add_embeddings(embeddings, documents, metadatas, ids)
+        if self._size == start:
+            return
+        if self.is_fitted:
+            vectors = np.asarray(self._embeddings[start : self._size])
+            self._codes[start : self._size] = self._encode(vectors)
+        elif len(self) >= self.fit_size:
+            self._fit_quantizer(self._fit_sample())
+
+    def _code_query(self, queries: np.ndarray) -> np.ndarray:
+        """Maps queries into the code space, keeping them in float."""
+        if self.quantization == "int8":
+            # q . x ~= (q * scale) . code
+            return queries * self._scale
+        if self.quantization == "pq":
+            return self._pq.lookup_tables(queries)
+        return queries
+
+    def _code_scores(
+        self, code_queries: np.ndarray, codes: np.ndarray, sq_norms: np.ndarray
+    ) -> np.ndarray:
+        if self.quantization == "pq":
+            scores = self._pq.adc_scores(code_queries, codes)
+        else:
+            scores = code_queries @ self._decode_block(codes).T
+        if self.distance_metric == "l2" and self.quantization != "binary":
+            scores *= 2
+            scores -= sq_norms
+        return scores
+
+    def _rescore(
+        self, queries: np.ndarray, candidates: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Scores each query's candidate rows exactly, from the vector file."""
+        valid = candidates >= 0
+        rows = np.where(valid, candidates, 0)
+        vectors = self._embeddings[rows.ravel()].reshape(*rows.shape, -1)
+        scores = np.einsum("qd,qcd->qc", queries, vectors)
+        if self.distance_metric == "l2":
+            scores = 2 * scores - self._sq_norms[rows]
+        scores[~valid] = -np.inf
+        return scores.astype(np.float32), candidates
+
+    # Until the quantizer is fitted, rows are scanned exactly like NumpyVectorStore
+
+    def _query_state(self, queries: np.ndarray) -> np.ndarray:
+        if not self.is_fitted:
+            return super()._query_state(queries)
+        return self._code_query(queries)
+
+    def _score_rows(
+        self, query_state: np.ndarray, rows: Union[slice, np.ndarray]
+    ) -> np.ndarray:
+        if not self.is_fitted:
+            return super()._score_rows(query_state, rows)
+        return self._code_scores(query_state, self._codes[rows], self._sq_norms[rows])
+
+    def _num_candidates(self, k: int, num_rows: int) -> int:
+        if not self.is_fitted:
+            return super()._num_candidates(k, num_rows)
+        return min(k * self.rescore_factor, num_rows)
+
+    def _finish_top_k(
+        self,
+        queries: np.ndarray,
+        scores: np.ndarray,
+        indices: np.ndarray,
+        k: int,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Re-scores the code candidates exactly and keeps the best k."""
+        if not self.is_fitted:
+            return super()._finish_top_k(queries, scores, indices, k)
+        scores, indices = self._rescore(queries, indices)
+        scores, indices = merge_top_k(None, None, scores, indices, k)
+        return sort_top_k(scores, indices)
+
+    def _snapshot_manifest(self) -> Dict[str, Any]:
+        manifest = super()._snapshot_manifest()
+        manifest["quantization"] = self.quantization
+        if self.quantization == "pq" and self._codes is not None:
+            # Fitted or not, the codes are allocated one byte per subspace
+            manifest["pq_subspaces"] = self._codes.shape[1]
+        return manifest
+
+    def _snapshot_state(self) -> Dict[str, np.ndarray]:
+        state = super()._snapshot_state()
+        state["codes"] = self._codes[: self._size]
+        if self._scale is not None:
+            state["quantizer_scale"] = self._scale
+        if self._center is not None:
+            state["quantizer_center"] = self._center
+        if self._pq is not None:
+            state["pq_codebooks"] = self._pq.codebooks
+        return state
+
+    def _snapshot_compatible(self, snapshot: Snapshot) -> bool:
+        manifest = snapshot.manifest
+        if manifest.get("quantization") != self.quantization:
+            return False
+        if self.quantization == "pq" and self.pq_subspaces not in (
+            None,
+            manifest.get("pq_subspaces"),
+        ):
+            return False
+        # Snapshots without quantizer parameters are adopted unfitted
+        return super()._snapshot_compatible(snapshot) and snapshot.has_array("codes")
+
+    def _adopt_snapshot(self, snapshot: Snapshot):
+        super()._adopt_snapshot(snapshot)
+        # Searches scan the codes, so they are mapped too instead of loaded
+        self._codes = snapshot.array("codes")
+        self._scale = self._center = self._pq = None
+        if self.quantization == "int8" and snapshot.has_array("quantizer_scale"):
+            self._scale = np.array(snapshot.array("quantizer_scale"))
+        elif self.quantization == "binary" and snapshot.has_array("quantizer_center"):
+            self._center = np.array(snapshot.array("quantizer_center"))
+        elif snapshot.has_array("pq_codebooks"):
+            codebooks = np.array(snapshot.array("pq_codebooks"))
+            self._pq = ProductQuantizer(
+                num_subspaces=codebooks.shape[0], codebook_size=codebooks.shape[1]
+            )
+            self._pq.codebooks = codebooks
+
+    def get_collection_stats(self) -> Dict[str, Any]:
+        """
+        Get statistics about the collection.
+
+        Returns:
+            Dict[str, Any]: Collection statistics
+        """
+        stats = super().get_collection_stats()
+        resident = 0
+        if self._codes is not None:
+            resident = (
+                self._codes[: self._size].nbytes + self._sq_norms[: self._size].nbytes
+            )
+        stats.update(
+            {
+                "quantization": self.quantization,
+                "fitted": self.is_fitted,
+                "rescore_factor": self.rescore_factor,
+                "memory_bytes": resident,
+                "disk_bytes": self.embeddings.nbytes,
+                "vectors_path": self.vectors_path,
+            }
+        )
+        return stats
+
+    def clean_up(self):
+        """Release the codes and documents, and remove a temporary vector file."""
+        super().clean_up()
+        self._codes = None
+        self._scale = None
+        self._center = None
+        self._pq = None
+        if self._temp_dir is not None:
+            shutil.rmtree(self._temp_dir, ignore_errors=True)
+            self._temp_dir = None
+
+
+class IVFQuantizedVectorStore(IVFVectorStore, QuantizedVectorStore):
+    """
+    IVF index over quantized storage, e.g. IVF-PQ with `quantization='pq'`.
+
+    Lists are chosen by the IVF centroids as in `IVFVectorStore`, but the
+    probed lists are scanned through the in-memory codes of
+    `QuantizedVectorStore`, and the best `k * rescore_factor` candidates are
+    re-scored from the full vectors on disk. Centroids are trained on the
+    full vectors. Takes the arguments of both parent classes.
+    """
@@ -0,0 +1,476 @@
+import itertools
+import json
+import os
+import struct
+import zlib
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+MAGIC = b"RAGSEG02"
+# Magic, dimension, dtype string; padded so the vectors start 64-byte aligned
+HEADER = struct.Struct("<8sI16s")
+HEADER_SIZE = 64
+ALIGNMENT = 64
+# Extent offset, extent rows, total rows, index offset, index length, commit
+# start, end of the latest checkpoint commit, data CRC32, index CRC32, CRC32
+# of the preceding fields, magic
+FOOTER = struct.Struct("<QQQQQQQIII8s")
+
+
+def _align(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+class SegmentFile:
+    """
+    Append-only file of fixed-stride vectors with an id -> row index.
+
+    Layout::
+
+        header (64 bytes) | commit | commit | ...
+
+        commit: vectors (rows x dim, 64-byte aligned) | index record (JSON)
+                | footer (extent, row count, index location, previous
+                  commit, latest checkpoint, CRC32s, magic)
+
+    Every append or delete adds one commit after the previous footer, so
+    committed data is never overwritten: a crash or a full disk mid-write
+    leaves a torn tail that is skipped on open and truncated by the next
+    write. The index record of a commit holds only the ids it adds or
+    deletes; once these deltas outgrow the last full index, a commit
+    checkpoints the whole index instead, so index writes cost amortized
+    O(1) per id. Opening reads back from the last footer to the latest
+    checkpoint and replays the deltas after it.
+
+    Readers map the file with `np.memmap`, so fetching rows is a zero-copy
+    slice of the page cache. The data CRC32 covers all rows in order and is
+    extended incrementally; `verify()` checks the stored rows against it.
+
+    Re-appending an id points it at the new row and `delete` drops ids from
+    the index; the dead rows stay in the file until `compact()` rewrites it
+    as a single commit of live rows.
+    """
+
+    def __init__(self, path: str, dim: Optional[int] = None, dtype: str = "uint8"):
+        """
+        Args:
+            path (str): Segment file. Opened if it exists, created on the
+                first append otherwise.
+            dim (Optional[int]): Vector dimension; taken from the first
+                append if not given.
+            dtype (str): Numpy dtype of the stored vectors. Ignored when the
+                file already exists.
+        """
+        self.path = path
+        self.dim = dim
+        self.dtype = np.dtype(dtype)
+        self._index: Dict[str, int] = {}
+        self._num_rows = 0
+        self._data_crc = 0
+        # (file offset, first row, row count) of each commit's vectors
+        self._extents: List[Tuple[int, int, int]] = []
+        # End of the last valid commit; bytes past it are a torn write
+        self._end = HEADER_SIZE
+        self._checkpoint_end = 0
+        self._checkpoint_bytes = 0
+        self._delta_bytes = 0
+        self._file: Optional[np.memmap] = None
+
+        if os.path.exists(path):
+            self._read_metadata()
+
+    @property
+    def _stride(self) -> int:
+        return self.dim * self.dtype.itemsize
+
+    def _read_metadata(self):
+        with open(self.path, "rb") as f:
+            magic, dim, dtype = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC:
+                raise ValueError(f"{self.path} is not a segment file")
+            self.dim = dim
+            self.dtype = np.dtype(dtype.rstrip(b"\0").decode("ascii"))
+
+            end = self._find_last_commit(f)
+            if end is None:
+                # Not even the first commit completed
+                return
+            # Walk back to the latest checkpoint, then replay forwards
+            commits = []
+            while True:
+                footer = self._read_footer(f, end)
+                if footer is None:
+                    raise ValueError(f"Broken commit chain in {self.path}")
+                commits.append(footer)
+                if end == footer["checkpoint_end"]:
+                    break
+                end = footer["commit_start"]
+            commits.reverse()
+
+            checkpoint = self._read_index_record(f, commits[0])
+            self._index = checkpoint["full"]
+            self._extents = [tuple(extent) for extent in checkpoint["extents"]]
+            self._checkpoint_bytes = commits[0]["index_length"]
+            for footer in commits[1:]:
+                delta = self._read_index_record(f, footer)
+                self._apply_delta(footer, delta)
+                self._delta_bytes += footer["index_length"]
+
+        last = commits[-1]
+        self._end = last["end"]
+        self._checkpoint_end = last["checkpoint_end"]
+        self._num_rows = last["num_rows"]
+        self._data_crc = last["data_crc"]
+
+    def _read_footer(self, f, end: int) -> Optional[Dict[str, int]]:
+        """Reads the footer ending at `end`, or None if it is not valid."""
+        if end - FOOTER.size < HEADER_SIZE:
+            return None
+        f.seek(end - FOOTER.size)
+        raw = f.read(FOOTER.size)
+        if len(raw) != FOOTER.size:
+            return None
+        fields = FOOTER.unpack(raw)
+        if fields[-1] != MAGIC or zlib.crc32(raw[: FOOTER.size - 12]) != fields[-2]:
+            return None
+        keys = (
+            "extent_offset",
+            "extent_rows",
+            "num_rows",
+            "index_offset",
+            "index_length",
+            "commit_start",
+            "checkpoint_end",
+            "data_crc",
+            "index_crc",
+        )
+        footer = dict(zip(keys, fields))
+        footer["end"] = end
+        return footer
+
+    def _find_last_commit(self, f) -> Optional[int]:
+        """
+        Returns the end of the last complete commit. After an interrupted
+        write it is found by scanning back for a footer that checks out.
+        """
+        size = f.seek(0, os.SEEK_END)
+        if self._read_footer(f, size) is not None:
+            return size
+        block = 1 << 20
+        position = size
+        while position > HEADER_SIZE:
+            start = max(HEADER_SIZE, position - block)
+            f.seek(start)
+            # Overlap so a magic split across two blocks is still found
+            data = f.read(min(position + len(MAGIC), size) - start)
+            found = data.rfind(MAGIC)
+            while found != -1:
+                end = start + found + len(MAGIC)
+                footer = self._read_footer(f, end)
+                if footer is not None and self._index_record_valid(f, footer):
+                    return end
+                found = data.rfind(MAGIC, 0, found)
+            position = start
+        return None
+
+    def _index_record_valid(self, f, footer: Dict[str, int]) -> bool:
+        f.seek(footer["index_offset"])
+        data = f.read(footer["index_length"])
+        return zlib.crc32(data) == footer["index_crc"]
+
+    def _read_index_record(self, f, footer: Dict[str, int]) -> Dict:
+        f.seek(footer["index_offset"])
+        data = f.read(footer["index_length"])
+        if zlib.crc32(data) != footer["index_crc"]:
+            raise ValueError(f"Index checksum mismatch in {self.path}")
+        return json.loads(data)
+
+    def _apply_delta(self, footer: Dict[str, int], delta: Dict):
+        if footer["extent_rows"]:
+            self._extents.append(
+                (
+                    footer["extent_offset"],
+                    footer["num_rows"] - footer["extent_rows"],
+                    footer["extent_rows"],
+                )
+            )
+        for doc_id in delta.get("delete", ()):
+            self._index.pop(doc_id, None)
+        self._index.update(delta.get("put", {}))
+
+    @property
+    def _mapped(self) -> np.memmap:
+        if self._file is None:
+            self._file = np.memmap(self.path, dtype=np.uint8, mode="r")
+        return self._file
+
+    def _extent_view(self, extent: Tuple[int, int, int]) -> np.ndarray:
+        offset, _, rows = extent
+        return np.ndarray(
+            (rows, self.dim), dtype=self.dtype, buffer=self._mapped, offset=offset
+        )
+
+    def __len__(self) -> int:
+        """Number of live ids."""
+        return len(self._index)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._index
+
+    @property
+    def ids(self) -> List[str]:
+        return list(self._index)
+
+    @property
+    def dead_fraction(self) -> float:
+        """Fraction of stored rows no longer referenced by the index."""
+        if not self._num_rows:
+            return 0.0
+        return 1 - len(self._index) / self._num_rows
+
+    @property
+    def vectors(self) -> np.ndarray:
+        """
+        All stored rows, live and dead. A zero-copy memory map while the
+        file holds a single commit of rows (e.g. after `compact()`), a copy
+        otherwise.
+        """
+        if not self._num_rows:
+            return np.empty((0, self.dim or 0), dtype=self.dtype)
+        if len(self._extents) == 1:
+            return self._extent_view(self._extents[0])
+        return np.concatenate([self._extent_view(e) for e in self._extents])
+
+    def get(self, ids: Iterable[str]) -> np.ndarray:
+        """
+        Returns the vectors of the given ids, in order.
+
+        Raises:
+            KeyError: If an id is not in the segment
+        """
+        rows = np.array([self._index[doc_id] for doc_id in ids], dtype=np.int64)
+        result = np.empty((len(rows), self.dim or 0), dtype=self.dtype)
+        if not len(rows):
+            return result
+        first_rows = np.array([first for _, first, _ in self._extents])
+        extents = np.searchsorted(first_rows, rows, side="right") - 1
+        order = np.argsort(extents, kind="stable")
+        bounds = np.flatnonzero(np.diff(extents[order])) + 1
+        for group in np.split(order, bounds):
+            extent = self._extents[extents[group[0]]]
+            result[group] = self._extent_view(extent)[rows[group] - extent[1]]
+        return result
+
+    def _check_vectors(self, ids: List[str], vectors: np.ndarray) -> np.ndarray:
+        vectors = np.ascontiguousarray(vectors, dtype=self.dtype)
+        if vectors.ndim != 2 or len(vectors) != len(ids):
+            raise ValueError(
+                f"Expected {len(ids)} vectors of shape (n, dim), got {vectors.shape}"
+            )
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+        elif vectors.shape[1] != self.dim:
+            raise ValueError(
+                f"Vector dimension {vectors.shape[1]} does not match the "
+                f"segment dimension {self.dim}"
+            )
+        return vectors
+
+    def _commit(
+        self,
+        batches: Iterable[Tuple[List[str], np.ndarray]],
+        deleted: Iterable[str] = (),
+    ):
+        """
+        Writes one commit after the last footer: the rows of all batches as
+        one extent, then the index changes and a new footer. The footer is
+        only written once the rows and index are on disk, so until then the
+        previous commit stays the valid end of the file.
+        """
+        batches = (batch for batch in batches if len(batch[0]))
+        first = next(batches, None)
+        deleted = list(deleted)
+        if first is None and not deleted:
+            return
+        if first is not None:
+            first = (list(first[0]), self._check_vectors(list(first[0]), first[1]))
+        if self.dim is None:
+            # Nothing to write before the first vectors fix the dimension
+            return
+
+        # Release the map before the file grows
+        self._file = None
+        put: Dict[str, int] = {}
+        num_rows = self._num_rows
+        data_crc = self._data_crc
+        mode = "r+b" if os.path.exists(self.path) else "w+b"
+        with open(self.path, mode) as f:
+            if self._end == HEADER_SIZE:
+                # New file, or no commit ever completed
+                header = HEADER.pack(MAGIC, self.dim, self.dtype.str.encode("ascii"))
+                f.seek(0)
+                f.write(header.ljust(HEADER_SIZE, b"\0"))
+            # Drop the torn tail of an interrupted write, if any
+            f.truncate(self._end)
+            extent_offset = _align(self._end)
+            f.seek(self._end)
+            f.write(b"\0" * (extent_offset - self._end))
+
+            pending = [first] if first is not None else []
+            for ids, vectors in itertools.chain(pending, batches):
+                ids = list(ids)
+                vectors = self._check_vectors(ids, vectors)
+                if len(set(ids)) != len(ids):
+                    raise ValueError("Duplicate ids in the appended vectors")
+                data = vectors.tobytes()
+                f.write(data)
+                data_crc = zlib.crc32(data, data_crc)
+                for offset, doc_id in enumerate(ids):
+                    put[doc_id] = num_rows + offset
+                num_rows += len(ids)
+            extent_rows = num_rows - self._num_rows
+
+            extents = list(self._extents)
+            if extent_rows:
+                extents.append((extent_offset, self._num_rows, extent_rows))
+            index_bytes = json.dumps({"put": put, "delete": deleted}).encode("utf-8")
+            # Checkpoint once the deltas outgrow the last full index
+            checkpoint = (
+                not self._checkpoint_end
+                or self._delta_bytes + len(index_bytes) > self._checkpoint_bytes
+            )
+            if checkpoint:
+                index = dict(self._index)
+                for doc_id in deleted:
+                    del index[doc_id]
+                index.update(put)
+                index_bytes = json.dumps({"full": index, "extents": extents}).encode(
+                    "utf-8"
+                )
+
+            index_offset = extent_offset + extent_rows * self._stride
+            f.write(index_bytes)
+            f.flush()
+            os.fsync(f.fileno())
+
+            end = index_offset + len(index_bytes) + FOOTER.size
+            fields = (
+                extent_offset,
+                extent_rows,
+                num_rows,
+                index_offset,
+                len(index_bytes),
+                self._end,
+                end if checkpoint else self._checkpoint_end,
+                data_crc,
+                zlib.crc32(index_bytes),
+            )
+            head = FOOTER.pack(*fields, 0, MAGIC)[: FOOTER.size - 12]
+            f.write(FOOTER.pack(*fields, zlib.crc32(head), MAGIC))
+            f.flush()
+            os.fsync(f.fileno())
+
+        for doc_id in deleted:
+            del self._index[doc_id]
+        self._index.update(put)
+        self._extents = extents
+        self._num_rows = num_rows
+        self._data_crc = data_crc
+        self._end = end
+        if checkpoint:
+            self._checkpoint_end = end
+            self._checkpoint_bytes = len(index_bytes)
+            self._delta_bytes = 0
+        else:
+            self._delta_bytes += len(index_bytes)
+
+    def append(self, ids: List[str], vectors: np.ndarray):
+        """
+        Appends vectors as one commit; ids already present are repointed to
+        the new rows.
+
+        Args:
+            ids (List[str]): Ids of the vectors
+            vectors (np.ndarray): Vectors of shape (len(ids), dim)
+        """
+        self._commit([(ids, vectors)])
+
+    def append_batches(self, batches: Iterable[Tuple[List[str], np.ndarray]]):
+        """
+        Appends a stream of batches as a single commit, writing the index
+        and footer once at the end. Use it to bulk-load or merge segments
+        without holding all the vectors in memory.
+
+        Args:
+            batches (Iterable[Tuple[List[str], np.ndarray]]): (ids, vectors)
+                pairs, each as accepted by `append`. Later batches win for
+                ids that repeat across batches.
+        """
+        self._commit(batches)
+
+    def delete(self, ids: Iterable[str]) -> int:
+        """
+        Removes ids from the index; their rows are reclaimed by `compact()`.
+
+        Returns:
+            int: Number of ids removed
+        """
+        ids = [doc_id for doc_id in dict.fromkeys(ids) if doc_id in self._index]
+        if ids:
+            self._commit([], deleted=ids)
+        return len(ids)
+
+    def verify(self) -> bool:
+        """Checks the stored rows against the last footer's data checksum."""
+        crc = 0
+        with open(self.path, "rb") as f:
+            for offset, _, rows in self._extents:
+                f.seek(offset)
+                remaining = rows * self._stride
+                while remaining:
+                    chunk = f.read(min(remaining, 1 << 24))
+                    if not chunk:
+                        return False
+                    crc = zlib.crc32(chunk, crc)
+                    remaining -= len(chunk)
+        return crc == self._data_crc
+
+    def _rewrite(self, ids: List[str], fetch: Callable[[List[str]], np.ndarray]):
+        """
+        Replaces the file with a single commit holding `ids`, whose vectors
+        `fetch` returns in blocks.
+        """
+        tmp_path = f"{self.path}.compact"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        rewritten = SegmentFile(tmp_path, dim=self.dim, dtype=self.dtype.str)
+        block = max(1, (1 << 24) // max(self._stride, 1))
+        rewritten.append_batches(
+            (ids[start : start + block], fetch(ids[start : start + block]))
+            for start in range(0, len(ids), block)
+        )
+
+        self._file = None
+        if rewritten._num_rows:
+            os.replace(tmp_path, self.path)
+        elif os.path.exists(self.path):
+            os.remove(self.path)
+        self.__dict__.update(
+            {key: value for key, value in vars(rewritten).items() if key != "path"}
+        )
+
+    def compact(self) -> int:
+        """
+        Rewrites the file as one commit of only the live rows, in index order.
+
+        Returns:
+            int: Number of dead rows reclaimed
+        """
+        dead_rows = self._num_rows - len(self._index)
+        if not dead_rows:
+            return 0
+        if not self.verify():
+            raise ValueError(f"Data checksum mismatch in {self.path}; not compacting")
+        self._rewrite(list(self._index), self.get)
+        return dead_rows
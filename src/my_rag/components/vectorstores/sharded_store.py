@@ -0,0 +1,646 @@
+import logging
+import math
+import multiprocessing as mp
+import os
+import threading
+import weakref
+from multiprocessing import shared_memory
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .base import BaseVectorStore
+from .numpy_store import (
+    DISTANCE_METRICS,
+    NumpyVectorStore,
+    _SearchLock,
+    _to_matrix,
+    merge_top_k,
+    sort_top_k,
+)
+from .snapshot import SnapshotWriter
+
+logger = logging.getLogger(__name__)
+
+# Thread pools of the BLAS libraries numpy may be linked against
+THREAD_ENV_VARS = (
+    "OMP_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "VECLIB_MAXIMUM_THREADS",
+)
+
+
+def _shard_size(capacity: int, dim: int) -> int:
+    """Bytes of shared memory holding `capacity` rows of a shard."""
+    return capacity * (dim + 1) * 4 + capacity
+
+
+def _shard_arrays(
+    shm: shared_memory.SharedMemory, capacity: int, dim: int
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Views a shard's shared memory as its vectors, their squared norms and
+    the tombstones of deleted rows.
+    """
+    embeddings = np.ndarray((capacity, dim), dtype=np.float32, buffer=shm.buf)
+    sq_norms = np.ndarray(
+        (capacity,), dtype=np.float32, buffer=shm.buf, offset=embeddings.nbytes
+    )
+    deleted = np.ndarray(
+        (capacity,),
+        dtype=bool,
+        buffer=shm.buf,
+        offset=embeddings.nbytes + sq_norms.nbytes,
+    )
+    return embeddings, sq_norms, deleted
+
+
+def _shard_worker(conn, store_kwargs: Dict[str, Any]):
+    """
+    Serves searches of one shard until told to close.
+
+    The worker never copies the shard: it maps the shared memory the parent
+    writes rows and tombstones into, and the parent sends the current row
+    and tombstone counts with every search.
+    """
+    shard = NumpyVectorStore(**store_kwargs)
+    shm = None
+    while True:
+        command, payload = conn.recv()
+        if command == "close":
+            break
+        try:
+            if command == "attach":
+                name, capacity, dim = payload
+                # Drop the views before closing the previous mapping
+                shard._embeddings = shard._sq_norms = shard._deleted = None
+                if shm is not None:
+                    shm.close()
+                shm = shared_memory.SharedMemory(name=name)
+                shard._embeddings, shard._sq_norms, shard._deleted = _shard_arrays(
+                    shm, capacity, dim
+                )
+                result = None
+            elif command == "search":
+                queries, k, size, num_deleted, candidates = payload
+                shard._size = size
+                shard._num_deleted = num_deleted
+                result = shard._search_candidates(
+                    shard._prepare_queries(queries), candidates, k
+                )
+            else:
+                raise ValueError(f"Unknown shard command: {command}")
+        except Exception as e:
+            conn.send(("error", e))
+        else:
+            conn.send(("ok", result))
+
+    shard._embeddings = shard._sq_norms = shard._deleted = None
+    if shm is not None:
+        shm.close()
+    conn.close()
+
+
+class _Shard(NumpyVectorStore):
+    """
+    One partition of a ShardedVectorStore, as seen from the parent process.
+
+    The parent keeps the documents, metadata and IDs and writes the vectors;
+    the matrix lives in shared memory, which a dedicated worker process maps
+    to run the searches.
+    """
+
+    def __init__(self, context, threads: int, **store_kwargs):
+        super().__init__(**store_kwargs)
+        self._shm: Optional[shared_memory.SharedMemory] = None
+        self._conn, worker_conn = context.Pipe()
+
+        # Spawned workers read the BLAS thread counts from the environment
+        saved_env = {name: os.environ.get(name) for name in THREAD_ENV_VARS}
+        os.environ.update({name: str(threads) for name in THREAD_ENV_VARS})
+        try:
+            self._process = context.Process(
+                target=_shard_worker, args=(worker_conn, store_kwargs), daemon=True
+            )
+            self._process.start()
+        finally:
+            for name, value in saved_env.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
+        worker_conn.close()
+
+    def send(self, command: str, payload: Any = None):
+        self._conn.send((command, payload))
+
+    def receive(self) -> Any:
+        status, result = self._conn.recv()
+        if status == "error":
+            raise result
+        return result
+
+    def _allocate_rows(self, capacity: int, dim: int) -> Dict[str, Any]:
+        """Allocates the rows in a new shared memory block."""
+        shm = shared_memory.SharedMemory(create=True, size=_shard_size(capacity, dim))
+        embeddings, sq_norms, deleted = _shard_arrays(shm, capacity, dim)
+        deleted[:] = False
+        return {
+            "_embeddings": embeddings,
+            "_sq_norms": sq_norms,
+            "_deleted": deleted,
+            "_shm": shm,
+        }
+
+    def _apply_state(self, state: Dict[str, Any]):
+        """Moves the worker to a new shared memory block, if there is one."""
+        shm = state.pop("_shm", None)
+        if shm is None:
+            super()._apply_state(state)
+            return
+        capacity, dim = state["_embeddings"].shape
+        self.send("attach", (shm.name, capacity, dim))
+        self.receive()
+        super()._apply_state(state)
+        self._release_shm()
+        self._shm = shm
+
+    def _release_shm(self):
+        if self._shm is not None:
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+
+    def close(self):
+        """Stops the worker and frees the shared memory."""
+        if self._process.is_alive():
+            self.send("close")
+            self._process.join()
+        self._conn.close()
+        self._embeddings = self._sq_norms = self._deleted = None
+        self._release_shm()
+
+
+def _close_shards(shards: List[_Shard]):
+    for shard in shards:
+        shard.close()
+
+
+class ShardedVectorStore(BaseVectorStore):
+    """
+    Exact vector store partitioned across worker processes.
+
+    Rows are spread evenly over `num_shards` shards. Each shard's vectors
+    live in a shared memory block owned by one worker process. A search
+    sends the query batch to every shard at once. Each worker finds the
+    top `k` of its shard with the same blocked matrix multiplication as
+    `NumpyVectorStore`, and the per-shard results are merged into the global
+    top `k`. Only queries and k results per shard cross process boundaries,
+    so the scan runs on `num_shards` cores in parallel.
+
+    Documents, metadata and filters stay in the parent process, and results
+    use Chroma's layout, so the store can back a `Retriever` unchanged.
+    `clean_up` stops the workers and frees the shared memory, after which
+    the store cannot be used; this also happens when the store is garbage
+    collected.
+
+    Deletes set tombstones in the shards' shared memory, which the workers
+    mask out. Past `compaction_threshold` deleted rows, a background thread
+    compacts the shards one at a time, as in `NumpyVectorStore`.
+    """
+
+    def __init__(
+        self,
+        collection_name: str = "default",
+        distance_metric: str = "cosine",
+        num_shards: Optional[int] = None,
+        threads_per_shard: int = 1,
+        query_block_size: int = 256,
+        max_block_bytes: int = 64 * 1024 * 1024,
+        initial_capacity: int = 1024,
+        start_method: str = "spawn",
+        compaction_threshold: Optional[float] = 0.2,
+    ):
+        """
+        Starts one worker process per shard.
+
+        Args:
+            collection_name (str): Name reported in the collection stats
+            distance_metric (str): 'cosine', 'ip' (inner product) or 'l2'
+                (squared euclidean), with the same distances as Chroma
+            num_shards (Optional[int]): Number of shards and worker processes.
+                Defaults to the number of CPU cores divided by
+                threads_per_shard.
+            threads_per_shard (int): BLAS threads of each worker
+            query_block_size (int): Maximum number of queries scored at once
+                per shard
+            max_block_bytes (int): Memory budget of one block of scores per
+                shard
+            initial_capacity (int): Number of rows allocated per shard on its
+                first add
+            start_method (str): multiprocessing start method
+            compaction_threshold (Optional[float]): Fraction of deleted rows
+                that starts a background compaction; None disables it
+        """
+        if distance_metric not in DISTANCE_METRICS:
+            raise ValueError(
+                f"Unsupported distance metric: {distance_metric}. "
+                f"Choose from {DISTANCE_METRICS}"
+            )
+        if threads_per_shard < 1:
+            raise ValueError(
+                f"threads_per_shard must be at least 1, got {threads_per_shard}"
+            )
+        if num_shards is None:
+            num_shards = max(1, (os.cpu_count() or 1) // threads_per_shard)
+        if num_shards < 1:
+            raise ValueError(f"num_shards must be at least 1, got {num_shards}")
+
+        self.collection_name = collection_name
+        self.distance_metric = distance_metric
+        self.num_shards = num_shards
+        self.threads_per_shard = threads_per_shard
+        self.compaction_threshold = compaction_threshold
+
+        self._dim: Optional[int] = None
+        self._next_default_id = 0
+        self._id_to_shard: Dict[str, int] = {}
+        context = mp.get_context(start_method)
+        self._shards = [
+            _Shard(
+                context,
+                threads_per_shard,
+                distance_metric=distance_metric,
+                query_block_size=query_block_size,
+                max_block_bytes=max_block_bytes,
+                initial_capacity=initial_capacity,
+                # Compacted by this store, so searches are held off store-wide
+                compaction_threshold=None,
+            )
+            for _ in range(num_shards)
+        ]
+        self._search_lock = _SearchLock()
+        self._pipe_lock = threading.Lock()
+        self._compaction_thread: Optional[threading.Thread] = None
+        self._finalizer = weakref.finalize(self, _close_shards, self._shards)
+
+    def __len__(self) -> int:
+        return len(self._id_to_shard)
+
+    def _split_counts(self, count: int) -> List[int]:
+        """Rows of a new batch per shard, filling the smallest shards first."""
+        sizes = [len(shard) for shard in self._shards]
+        target = math.ceil((sum(sizes) + count) / self.num_shards)
+        counts = [0] * self.num_shards
+        remaining = count
+        for i in np.argsort(sizes, kind="stable"):
+            counts[i] = min(max(target - sizes[i], 0), remaining)
+            remaining -= counts[i]
+        return counts
+
+    def add_embeddings(
+        self,
+        embeddings: Any,
+        documents: List[str],
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+    ):
+        """
+        Add embeddings and their metadata, spread evenly over the shards.
+
+        Args:
+            embeddings (Any): Document embeddings (array, tensor or list)
+            documents (List[str]): Original text documents
+            metadatas (Optional[List[dict]]): Metadata for each document
+            ids (Optional[List[str]]): Optional custom IDs for the embeddings
+        """
+        if len(documents) == 0:
+            return
+        self.wait_for_compaction()
+        matrix = _to_matrix(embeddings)
+        count = len(matrix)
+        if len(documents) != count:
+            raise ValueError(f"Got {count} embeddings but {len(documents)} documents")
+        if ids is None:
+            ids = [f"doc_{self._next_default_id + i}" for i in range(count)]
+        elif len(ids) != count:
+            raise ValueError(f"Got {count} embeddings but {len(ids)} ids")
+        if metadatas is None:
+            metadatas = [{"doc_id": doc_id} for doc_id in ids]
+        elif len(metadatas) != count:
+            raise ValueError(f"Got {count} embeddings but {len(metadatas)} metadatas")
+
+        # Validate across shards up front, so a bad batch adds nothing
+        if len(set(ids)) != count:
+            raise ValueError("Duplicate ids in the added embeddings")
+        existing = [doc_id for doc_id in ids if doc_id in self._id_to_shard]
+        if existing:
+            raise ValueError(f"Ids already exist in the store: {existing[:5]}")
+        if self._dim is not None and matrix.shape[1] != self._dim:
+            raise ValueError(
+                f"Embedding dimension {matrix.shape[1]} does not match the "
+                f"store dimension {self._dim}"
+            )
+
+        start = 0
+        for shard_index, shard_count in enumerate(self._split_counts(count)):
+            if not shard_count:
+                continue
+            rows = slice(start, start + shard_count)
+            self._shards[shard_index].add_embeddings(
+                matrix[rows], documents[rows], metadatas[rows], ids[rows]
+            )
+            for doc_id in ids[rows]:
+                self._id_to_shard[doc_id] = shard_index
+            start += shard_count
+        self._dim = matrix.shape[1]
+        self._next_default_id += count
+
+    def search_shards(
+        self,
+        query_embeddings: Any,
+        k: int = 5,
+        filter_dict: Optional[Dict] = None,
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Finds the rows nearest to each query across all shards.
+
+        Args:
+            query_embeddings (Any): Query embeddings
+            k (int): Number of results per query
+            filter_dict (Optional[Dict]): Chroma-style metadata filter
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray, np.ndarray]: Distances, shard
+                indices and rows within the shard, each of shape
+                (queries, min(k, matching rows)), nearest first.
+        """
+        queries = _to_matrix(query_embeddings)
+        # Replies come back in order on each pipe, so one search at a time
+        with self._search_lock.searching(), self._pipe_lock:
+            return self._search_shards(queries, k, filter_dict)
+
+    def _search_shards(
+        self, queries: np.ndarray, k: int, filter_dict: Optional[Dict]
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        searched = []
+        for shard_index, shard in enumerate(self._shards):
+            candidates = shard._candidate_rows(filter_dict)
+            num_rows = len(shard) if candidates is None else len(candidates)
+            if num_rows and k > 0:
+                shard.send(
+                    "search",
+                    (queries, k, shard._size, shard._num_deleted, candidates),
+                )
+                searched.append(shard_index)
+
+        # Gather every reply before raising, so no pipe is left with a stale one
+        replies = []
+        for shard_index in searched:
+            try:
+                replies.append(self._shards[shard_index].receive())
+            except Exception as e:
+                replies.append(e)
+        for reply in replies:
+            if isinstance(reply, Exception):
+                raise reply
+
+        if not replies:
+            empty = np.empty((len(queries), 0))
+            return (
+                empty.astype(np.float32),
+                empty.astype(np.int64),
+                empty.astype(np.int64),
+            )
+
+        # Merge as scores where higher is better; the key packs row and shard
+        scores = -np.concatenate([distances for distances, _ in replies], axis=1)
+        keys = np.concatenate(
+            [
+                rows * self.num_shards + shard_index
+                for shard_index, (_, rows) in zip(searched, replies)
+            ],
+            axis=1,
+        )
+        scores, keys = sort_top_k(*merge_top_k(None, None, scores, keys, k))
+        return -scores, keys % self.num_shards, keys // self.num_shards
+
+    def search(
+        self,
+        query_embeddings: Any,
+        k: int = 5,
+        filter_dict: Optional[Dict] = None,
+        include: Optional[List[str]] = None,
+    ) -> List[dict]:
+        """
+        Search for similar vectors.
+
+        Args:
+            query_embeddings (Any): Query embeddings
+            k (int): Number of results to return
+            filter_dict (Optional[Dict]): Chroma-style metadata filter
+            include (Optional[List[str]]): What to include in results, out of
+                'documents', 'metadatas', 'distances' and 'embeddings'
+
+        Returns:
+            List[dict]: Search results in Chroma's layout, one list per query
+        """
+        if include is None:
+            include = ["metadatas", "documents", "distances"]
+
+        # Rows are only meaningful until the next compaction swaps the shards
+        with self._search_lock.searching():
+            distances, shard_indices, rows = self.search_shards(
+                query_embeddings, k, filter_dict
+            )
+            hits = [
+                [(self._shards[s], r) for s, r in zip(query_shards, query_rows)]
+                for query_shards, query_rows in zip(shard_indices, rows)
+            ]
+            results = {"ids": [[shard.ids[r] for shard, r in row] for row in hits]}
+            if "documents" in include:
+                results["documents"] = [
+                    [shard.documents[r] for shard, r in row] for row in hits
+                ]
+            if "metadatas" in include:
+                results["metadatas"] = [
+                    [shard.metadatas[r] for shard, r in row] for row in hits
+                ]
+            if "distances" in include:
+                results["distances"] = distances.tolist()
+            if "embeddings" in include:
+                results["embeddings"] = [
+                    [shard.embeddings[r].tolist() for shard, r in row] for row in hits
+                ]
+        return results
+
+    def get_ids(self) -> List[str]:
+        """
+        Lists the IDs of all stored embeddings.
+
+        Returns:
+            List[str]: Stored IDs, shard by shard
+        """
+        with self._search_lock.searching():
+            return [doc_id for shard in self._shards for doc_id in shard.get_ids()]
+
+    def delete(self, ids: List[str]) -> int:
+        """
+        Deletes embeddings by ID. Unknown IDs are ignored.
+
+        Args:
+            ids (List[str]): IDs of the embeddings to delete
+
+        Returns:
+            int: Number of embeddings deleted
+        """
+        self.wait_for_compaction()
+        ids_by_shard: Dict[int, List[str]] = {}
+        for doc_id in set(ids):
+            shard_index = self._id_to_shard.pop(doc_id, None)
+            if shard_index is not None:
+                ids_by_shard.setdefault(shard_index, []).append(doc_id)
+        # Workers read the tombstones, so no search may be in flight
+        with self._search_lock.swapping():
+            deleted = sum(
+                self._shards[shard_index].delete(shard_ids)
+                for shard_index, shard_ids in ids_by_shard.items()
+            )
+
+        num_deleted = sum(shard._num_deleted for shard in self._shards)
+        num_rows = sum(shard._size for shard in self._shards)
+        if (
+            self.compaction_threshold is not None
+            and num_deleted
+            and num_deleted >= self.compaction_threshold * num_rows
+        ):
+            self._compaction_thread = threading.Thread(
+                target=self._compact_in_background,
+                name=f"compact-{self.collection_name}",
+                daemon=True,
+            )
+            self._compaction_thread.start()
+        return deleted
+
+    def delete_where(self, filter_dict: Dict) -> int:
+        """
+        Deletes the embeddings whose metadata matches a filter.
+
+        Args:
+            filter_dict (Dict): Chroma-style metadata filter
+
+        Returns:
+            int: Number of embeddings deleted
+        """
+        if not filter_dict:
+            raise ValueError("delete_where needs a non-empty filter")
+        self.wait_for_compaction()
+        ids = [
+            shard.ids[row]
+            for shard in self._shards
+            for row in shard._candidate_rows(filter_dict)
+        ]
+        return self.delete(ids)
+
+    def compact(self) -> int:
+        """
+        Physically removes deleted rows, one shard at a time.
+
+        Each shard is copied into a new shared memory block while searches
+        keep running; searches only wait while a worker switches blocks.
+
+        Returns:
+            int: Number of rows removed
+        """
+        self.wait_for_compaction()
+        removed = 0
+        for shard in self._shards:
+            if not shard._num_deleted:
+                continue
+            removed += shard._num_deleted
+            state = shard._compacted_state()
+            with self._search_lock.swapping():
+                shard._apply_state(state)
+        if removed:
+            logger.info(f"Compacted {self.collection_name}: removed {removed} rows")
+        return removed
+
+    def _compact_in_background(self):
+        try:
+            self.compact()
+        except Exception:
+            logger.exception(f"Compaction of {self.collection_name} failed")
+
+    def wait_for_compaction(self):
+        """Blocks until a running background compaction has finished."""
+        thread = self._compaction_thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+
+    def export_snapshot(self, path: str) -> int:
+        """
+        Writes the shards, one after another, to a single snapshot that any
+        local store can import. Deleted rows are compacted away first. Importing into a sharded store adds the rows
+        through `add_embeddings`, since the workers serve from shared memory.
+
+        Args:
+            path (str): Snapshot directory; replaced if it exists
+
+        Returns:
+            int: Number of exported embeddings
+        """
+        self.compact()
+        writer = SnapshotWriter(path)
+        count = len(self)
+        if count:
+            embeddings = writer.open_array("embeddings", (count, self._dim), np.float32)
+            sq_norms = writer.open_array("sq_norms", (count,), np.float32)
+        start = 0
+        for shard in self._shards:
+            end = start + len(shard)
+            if end > start:
+                writer.write_rows(shard.ids, shard.documents, shard.metadatas)
+                embeddings[start:end] = shard.embeddings
+                sq_norms[start:end] = shard._sq_norms[: len(shard)]
+            start = end
+        writer.close(
+            {
+                "store": type(self).__name__,
+                "collection_name": self.collection_name,
+                "distance_metric": self.distance_metric,
+                "normalized": self.distance_metric == "cosine",
+                "dimension": self._dim,
+                "next_default_id": self._next_default_id,
+            }
+        )
+        return count
+
+    def get_collection_stats(self) -> Dict[str, Any]:
+        """
+        Get statistics about the collection.
+
+        Returns:
+            Dict[str, Any]: Collection statistics
+        """
+        # Shard counts change when a compaction swaps shards in
+        with self._search_lock.searching():
+            return {
+                "count": len(self),
+                "deleted": sum(shard._num_deleted for shard in self._shards),
+                "name": self.collection_name,
+                "metadata": {"hnsw:space": self.distance_metric},
+                "dimension": self._dim,
+                "num_shards": self.num_shards,
+                "shard_sizes": [len(shard) for shard in self._shards],
+                "memory_bytes": sum(shard.embeddings.nbytes for shard in self._shards),
+            }
+
+    def clean_up(self):
+        """Stop the worker processes and free the shared memory."""
+        self.wait_for_compaction()
+        self._finalizer()
+        self._shards = []
+        self._id_to_shard = {}
+        self._dim = None
+        self._next_default_id = 0
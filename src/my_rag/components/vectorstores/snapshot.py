@@ -0,0 +1,215 @@
+import json
+import os
+import shutil
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+FORMAT_VERSION = 1
+MANIFEST = "manifest.json"
+ROWS = "rows.parquet"
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError(
+            "Snapshots require pyarrow. Install it with 'pip install pyarrow'."
+        ) from e
+    return pa, pq
+
+
+class SnapshotWriter:
+    """
+    Writes a vector store snapshot directory.
+
+    Layout::
+
+        manifest.json   store settings, row count and dimension
+        rows.parquet    id, document and JSON-encoded metadata per row
+        <name>.npy      per-row arrays (embeddings, codes) and store state
+
+    Arrays are plain .npy files so `Snapshot` can memory-map them without
+    copying; the text columns go to Parquet, which compresses well and
+    reads back quickly. Everything is written to `<path>.tmp` and renamed
+    into place by `close`, so an interrupted export never replaces a good
+    snapshot.
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path (str): Snapshot directory; replaced if it exists
+        """
+        pa, _ = _require_pyarrow()
+        self.path = path
+        self._tmp_path = f"{path}.tmp"
+        shutil.rmtree(self._tmp_path, ignore_errors=True)
+        os.makedirs(self._tmp_path)
+        self._schema = pa.schema(
+            [
+                ("id", pa.string()),
+                ("document", pa.string()),
+                ("metadata", pa.string()),
+            ]
+        )
+        self._rows_writer = None
+        self._arrays: Dict[str, np.ndarray] = {}
+        self.count = 0
+
+    def write_rows(
+        self, ids: List[str], documents: List[str], metadatas: List[Dict[str, Any]]
+    ):
+        """Appends the ids, documents and metadata of a batch of rows."""
+        pa, pq = _require_pyarrow()
+        if self._rows_writer is None:
+            self._rows_writer = pq.ParquetWriter(
+                os.path.join(self._tmp_path, ROWS), self._schema
+            )
+        batch = pa.record_batch(
+            [
+                pa.array(ids, pa.string()),
+                pa.array(documents, pa.string()),
+                pa.array(
+                    [json.dumps(metadata, default=repr) for metadata in metadatas],
+                    pa.string(),
+                ),
+            ],
+            schema=self._schema,
+        )
+        self._rows_writer.write_batch(batch)
+        self.count += len(ids)
+
+    def write_array(self, name: str, array: np.ndarray):
+        """Saves a whole array, e.g. the stored embeddings or store state."""
+        np.save(os.path.join(self._tmp_path, f"{name}.npy"), array)
+
+    def open_array(self, name: str, shape: Tuple[int, ...], dtype: Any) -> np.ndarray:
+        """Creates a memory-mapped array to be filled batch by batch."""
+        array = np.lib.format.open_memmap(
+            os.path.join(self._tmp_path, f"{name}.npy"),
+            mode="w+",
+            dtype=dtype,
+            shape=shape,
+        )
+        self._arrays[name] = array
+        return array
+
+    def close(self, manifest: Dict[str, Any]):
+        """
+        Finishes the snapshot.
+
+        Args:
+            manifest (Dict[str, Any]): Store settings to record, e.g. the
+                distance metric and dimension
+        """
+        if self._rows_writer is None:
+            # Keep the schema even for empty stores
+            self.write_rows([], [], [])
+        self._rows_writer.close()
+        for array in self._arrays.values():
+            array.flush()
+        self._arrays.clear()
+
+        with open(os.path.join(self._tmp_path, MANIFEST), "w") as f:
+            json.dump(
+                {"format_version": FORMAT_VERSION, "count": self.count, **manifest},
+                f,
+                indent=2,
+            )
+        shutil.rmtree(self.path, ignore_errors=True)
+        os.replace(self._tmp_path, self.path)
+
+
+class Snapshot:
+    """
+    Read access to a snapshot written by `SnapshotWriter`.
+
+    Arrays are memory-mapped read-only: opening a snapshot reads no vectors,
+    and pages are loaded by the OS as searches touch them.
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path (str): Snapshot directory
+        """
+        with open(os.path.join(path, MANIFEST)) as f:
+            self.manifest: Dict[str, Any] = json.load(f)
+        if self.manifest.get("format_version") != FORMAT_VERSION:
+            raise ValueError(
+                f"Unsupported snapshot format version "
+                f"{self.manifest.get('format_version')} in {path}"
+            )
+        self.path = path
+        self._rows = None
+
+    @property
+    def count(self) -> int:
+        return self.manifest["count"]
+
+    def has_array(self, name: str) -> bool:
+        return os.path.exists(os.path.join(self.path, f"{name}.npy"))
+
+    def array(self, name: str) -> np.ndarray:
+        """Memory-maps an array of the snapshot."""
+        return np.load(os.path.join(self.path, f"{name}.npy"), mmap_mode="r")
+
+    def _read_rows(self):
+        if self._rows is None:
+            _, pq = _require_pyarrow()
+            self._rows = pq.read_table(os.path.join(self.path, ROWS), memory_map=True)
+        return self._rows
+
+    @property
+    def ids(self) -> List[str]:
+        return self._read_rows().column("id").to_pylist()
+
+    @property
+    def documents(self) -> List[str]:
+        return self._read_rows().column("document").to_pylist()
+
+    @property
+    def metadatas(self) -> List[Dict[str, Any]]:
+        return [json.loads(m) for m in self._read_rows().column("metadata").to_pylist()]
+
+    def batches(self, batch_size: int = 16384) -> Iterator[Dict[str, Any]]:
+        """
+        Reads the rows in order.
+
+        Yields:
+            Dict[str, Any]: 'ids', 'documents', 'metadatas' and 'embeddings'
+                of a batch of rows
+        """
+        embeddings = self.array("embeddings") if self.count else None
+        rows = self._read_rows()
+        for start in range(0, self.count, batch_size):
+            batch = rows.slice(start, batch_size)
+            yield {
+                "ids": batch.column("id").to_pylist(),
+                "documents": batch.column("document").to_pylist(),
+                "metadatas": [
+                    json.loads(m) for m in batch.column("metadata").to_pylist()
+                ],
+                "embeddings": embeddings[start : start + batch_size],
+            }
+
+
+def snapshot_compatible(
+    snapshot: Snapshot, distance_metric: str, arrays: Optional[List[str]] = None
+) -> bool:
+    """
+    Whether a local store can adopt the snapshot's arrays as they are.
+
+    The stored vectors must have been written for the same distance metric
+    (cosine stores keep them normalized) and the snapshot must contain the
+    given arrays.
+    """
+    manifest = snapshot.manifest
+    if manifest.get("distance_metric") != distance_metric:
+        return False
+    if distance_metric == "cosine" and not manifest.get("normalized"):
+        return False
+    return all(snapshot.has_array(name) for name in ["embeddings", *(arrays or [])])
@@ -0,0 +1,93 @@
+import argparse
+import logging
+import tempfile
+import time
+
+import numpy as np
+
+from my_rag.components.vectorstores.chroma_store import (
+    ChromaVectorStore,
+    ClientMode,
+    CollectionMode,
+)
+from my_rag.components.vectorstores.numpy_store import NumpyVectorStore
+
+logger = logging.getLogger(__name__)
+
+
+def create_store(mode: str, args, persist_directory: str):
+    if mode == "numpy":
+        return NumpyVectorStore(collection_name="benchmark")
+    return ChromaVectorStore(
+        collection_name="benchmark_client_modes",
+        host=args.host,
+        port=args.port,
+        mode=CollectionMode.DROP_IF_EXISTS,
+        client_mode=ClientMode(mode),
+        persist_directory=persist_directory,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare add and query throughput of Chroma client modes"
+    )
+    parser.add_argument(
+        "--modes",
+        nargs="+",
+        default=["ephemeral", "persistent", "http", "numpy"],
+        help="Client modes to compare ('numpy' is the in-process reference)",
+    )
+    parser.add_argument(
+        "--doc-embeddings",
+        help="Document embeddings (.npy); random vectors are used if omitted",
+    )
+    parser.add_argument("--num-docs", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--num-queries", type=int, default=1000)
+    parser.add_argument("--query-batch-size", type=int, default=32)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.WARNING,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+
+    rng = np.random.default_rng(0)
+    if args.doc_embeddings:
+        docs = np.load(args.doc_embeddings).astype(np.float32)
+    else:
+        docs = rng.standard_normal((args.num_docs, args.dim), dtype=np.float32)
+    queries = docs[rng.choice(len(docs), args.num_queries)]
+    documents = [f"document {i}" for i in range(len(docs))]
+    ids = [str(i) for i in range(len(docs))]
+
+    print(f"{'mode':<12} {'add rows/sec':>14} {'query qps':>12}")
+    for mode in args.modes:
+        with tempfile.TemporaryDirectory() as persist_directory:
+            try:
+                store = create_store(mode, args, persist_directory)
+            except Exception as e:
+                print(f"{mode:<12} unavailable: {e}")
+                continue
+
+            start = time.perf_counter()
+            store.add_embeddings(docs, documents, ids=ids)
+            add_rate = len(docs) / (time.perf_counter() - start)
+
+            start = time.perf_counter()
+            for q_start in range(0, len(queries), args.query_batch_size):
+                store.search(
+                    queries[q_start : q_start + args.query_batch_size], k=args.k
+                )
+            qps = len(queries) / (time.perf_counter() - start)
+
+            print(f"{mode:<12} {add_rate:>14.0f} {qps:>12.1f}")
+            store.clean_up()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+import argparse
+import logging
+import statistics
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+import torch
+
+from my_rag.components.embeddings.huggingface_embedding import HuggingFaceEmbedding
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_TEXTS = [
+    "Is Hirschsprung disease a mendelian or a multifactorial disorder?",
+    "List signaling molecules (ligands) that interact with the receptor EGFR?",
+    "Is the protein Papilin secreted?",
+    "Are long non coding RNAs as conserved in sequence as protein coding genes?",
+    "Which miRNAs could be used as potential biomarkers for epithelial ovarian cancer?",
+    "What is the function of the protein encoded by the gene STING?",
+    "Mutations in which gene determine response to both erlotinib and gefitinib?",
+    "Does metformin interfere with thyroxine absorption?",
+]
+
+# Minimum cosine similarity to the PyTorch embeddings for a backend to pass
+PARITY_THRESHOLDS = {"onnx": 0.9999, "onnx-int8": 0.98}
+
+
+def load_texts(texts_file: str, num_texts: int) -> List[str]:
+    """
+    Loads benchmark texts from a file (one per line) or repeats the samples.
+    """
+    if texts_file:
+        with open(texts_file) as f:
+            texts = [line.strip() for line in f if line.strip()]
+    else:
+        texts = SAMPLE_TEXTS
+    return [texts[i % len(texts)] for i in range(num_texts)]
+
+
+def to_numpy(embeddings) -> np.ndarray:
+    if hasattr(embeddings, "cpu"):
+        embeddings = embeddings.cpu().float().numpy()
+    return np.asarray(embeddings, dtype=np.float32)
+
+
+def benchmark_backend(
+    embedding_model: HuggingFaceEmbedding,
+    texts: List[str],
+    batch_size: int,
+    num_queries: int,
+) -> Dict[str, Any]:
+    """
+    Measures bulk throughput and single-query latency for one backend.
+
+    Returns:
+        Dict[str, Any]: Timing results and the bulk embeddings.
+    """
+    # Warm up so one-off graph optimization is not timed
+    embedding_model.embed(texts[:batch_size], batch_size=batch_size)
+
+    start = time.perf_counter()
+    embeddings = to_numpy(
+        embedding_model.embed(texts, batch_size=batch_size, sort_by_length=True)
+    )
+    elapsed = time.perf_counter() - start
+
+    latencies = []
+    for text in texts[:num_queries]:
+        start = time.perf_counter()
+        embedding_model.embed([text], batch_size=1)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    return {
+        "embeddings": embeddings,
+        "throughput_texts_per_s": len(texts) / elapsed,
+        "latency_p50_ms": statistics.median(latencies),
+        "latency_p95_ms": float(np.percentile(latencies, 95)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare PyTorch and ONNX Runtime embedding backends on CPU"
+    )
+    parser.add_argument("--model", required=True, help="Hugging Face model name")
+    parser.add_argument("--texts-file", help="Text file with one passage per line")
+    parser.add_argument("--num-texts", type=int, default=512)
+    parser.add_argument("--num-queries", type=int, default=50)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--onnx-dir", help="Directory for exported ONNX files")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+
+    texts = load_texts(args.texts_file, args.num_texts)
+    backends = {
+        "torch": {"backend": "torch"},
+        "onnx": {"backend": "onnx", "onnx_dir": args.onnx_dir},
+        "onnx-int8": {
+            "backend": "onnx",
+            "onnx_quantize": True,
+            "onnx_dir": args.onnx_dir,
+        },
+    }
+
+    reference = None
+    all_passed = True
+    print(
+        f"{'backend':<10} {'texts/s':>10} {'p50 ms':>8} {'p95 ms':>8} "
+        f"{'min cos':>9} {'max abs':>9}  parity"
+    )
+    for name, backend_kwargs in backends.items():
+        embedding_model = HuggingFaceEmbedding(
+            args.model, device="cpu", **backend_kwargs
+        )
+        with torch.no_grad():
+            results = benchmark_backend(
+                embedding_model, texts, args.batch_size, args.num_queries
+            )
+        embedding_model.clean_up()
+
+        embeddings = results["embeddings"]
+        if reference is None:
+            reference = embeddings
+        cosine = (embeddings * reference).sum(axis=1)
+        max_abs = float(np.abs(embeddings - reference).max())
+
+        threshold = PARITY_THRESHOLDS.get(name)
+        passed = threshold is None or float(cosine.min()) >= threshold
+        all_passed = all_passed and passed
+        print(
+            f"{name:<10} {results['throughput_texts_per_s']:>10.1f} "
+            f"{results['latency_p50_ms']:>8.2f} {results['latency_p95_ms']:>8.2f} "
+            f"{float(cosine.min()):>9.5f} {max_abs:>9.2e}  "
+            f"{'reference' if threshold is None else ('ok' if passed else 'FAIL')}"
+        )
+
+    if not all_passed:
+        raise SystemExit("ONNX embeddings diverge from the PyTorch reference")
+
+
+if __name__ == "__main__":
+    main()
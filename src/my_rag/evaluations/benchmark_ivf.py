@@ -0,0 +1,104 @@
+import argparse
+import logging
+import time
+
+import numpy as np
+
+from my_rag.components.vectorstores.ivf_store import IVFVectorStore
+from my_rag.components.vectorstores.numpy_store import NumpyVectorStore
+
+logger = logging.getLogger(__name__)
+
+
+def timed_search(store, queries: np.ndarray, k: int, repeats: int = 3, **kwargs):
+    """Returns the row indices and best-of-n wall time of a batched search."""
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        _, indices = store.search_indices(queries, k, **kwargs)
+        best = min(best, time.perf_counter() - start)
+    return indices, best
+
+
+def single_query_latency(store, queries: np.ndarray, k: int, **kwargs) -> float:
+    """Returns the median latency of one-query searches in milliseconds."""
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        store.search_indices(query, k, **kwargs)
+        latencies.append(time.perf_counter() - start)
+    return float(np.median(latencies) * 1000)
+
+
+def recall_at_k(approx: np.ndarray, exact: np.ndarray, approx_ids, exact_ids) -> float:
+    """Fraction of the exact top-k that the approximate search also returned."""
+    hits = 0
+    for approx_row, exact_row in zip(approx, exact):
+        found = {approx_ids[i] for i in approx_row if i >= 0}
+        hits += sum(exact_ids[i] in found for i in exact_row)
+    return hits / exact.size
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure recall@k and latency of IVF search against exact search"
+    )
+    parser.add_argument(
+        "--doc-embeddings", required=True, help="Document embeddings (.npy)"
+    )
+    parser.add_argument(
+        "--query-embeddings", required=True, help="Query embeddings (.npy)"
+    )
+    parser.add_argument("--metric", default="cosine", choices=["cosine", "ip", "l2"])
+    parser.add_argument("--nlist", type=int, default=1024)
+    parser.add_argument("--nprobes", nargs="+", type=int, default=[1, 4, 8, 16, 32, 64])
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument(
+        "--latency-queries",
+        type=int,
+        default=100,
+        help="Queries used for the single-query latency",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+
+    docs = np.load(args.doc_embeddings, mmap_mode="r")
+    queries = np.load(args.query_embeddings).astype(np.float32)
+    ids = [str(i) for i in range(len(docs))]
+    documents = [""] * len(docs)
+
+    exact = NumpyVectorStore(distance_metric=args.metric)
+    exact.add_embeddings(docs, documents, ids=ids)
+
+    start = time.perf_counter()
+    ivf = IVFVectorStore(
+        distance_metric=args.metric, nlist=args.nlist, min_train_size=len(docs)
+    )
+    ivf.add_embeddings(docs, documents, ids=ids)
+    logger.info(f"Built IVF index in {time.perf_counter() - start:.1f}s")
+
+    exact_indices, exact_time = timed_search(exact, queries, args.k)
+    latency_queries = queries[: args.latency_queries]
+    exact_latency = single_query_latency(exact, latency_queries, args.k)
+
+    print(f"{'search':<12} {'recall@' + str(args.k):>10} {'qps':>10} {'p50 ms':>8}")
+    print(
+        f"{'exact':<12} {1.0:>10.4f} {len(queries) / exact_time:>10.1f} "
+        f"{exact_latency:>8.2f}"
+    )
+    for nprobe in args.nprobes:
+        indices, elapsed = timed_search(ivf, queries, args.k, nprobe=nprobe)
+        recall = recall_at_k(indices, exact_indices, ivf.ids, exact.ids)
+        latency = single_query_latency(ivf, latency_queries, args.k, nprobe=nprobe)
+        print(
+            f"{'nprobe=' + str(nprobe):<12} {recall:>10.4f} "
+            f"{len(queries) / elapsed:>10.1f} {latency:>8.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+import argparse
+import logging
+import time
+
+import numpy as np
+
+from my_rag.components.vectorstores.numpy_store import NumpyVectorStore
+from my_rag.components.vectorstores.quantized_store import (
+    IVFQuantizedVectorStore,
+    QuantizedVectorStore,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def synthetic_embeddings(
+    num_docs: int, num_queries: int, dim: int, seed: int = 0
+) -> tuple:
+    """
+    Clustered vectors with a decaying spectrum, a rough stand-in for sentence
+    embeddings when no real ones are given.
+    """
+    rng = np.random.default_rng(seed)
+    scales = (1.0 / np.sqrt(np.arange(1, dim + 1))).astype(np.float32)
+    centers = rng.standard_normal((max(num_docs // 100, 1), dim), dtype=np.float32)
+    labels = rng.integers(len(centers), size=num_docs + num_queries)
+    data = centers[labels] + 0.5 * rng.standard_normal(
+        (len(labels), dim), dtype=np.float32
+    )
+    data *= scales[rng.permutation(dim)]
+    return data[:num_docs], data[num_docs:]
+
+
+def recall_at_k(store, queries: np.ndarray, expected_ids: list, k: int) -> tuple:
+    """Returns recall@k against the exact ids, and queries per second."""
+    start = time.perf_counter()
+    _, indices = store.search_indices(queries, k)
+    qps = len(queries) / (time.perf_counter() - start)
+    recall = np.mean(
+        [
+            len({store.ids[i] for i in found if i >= 0} & expected) / k
+            for found, expected in zip(indices, expected_ids)
+        ]
+    )
+    return recall, qps
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure memory per vector and recall@k of product quantization"
+    )
+    parser.add_argument(
+        "--doc-embeddings",
+        nargs="*",
+        default=[],
+        help="Document embeddings (.npy), one file per embedding model",
+    )
+    parser.add_argument(
+        "--query-embeddings",
+        nargs="*",
+        default=[],
+        help="Query embeddings (.npy), in the same order as --doc-embeddings",
+    )
+    parser.add_argument(
+        "--dims",
+        nargs="+",
+        type=int,
+        default=[384, 1024, 1536],
+        help="Dimensions of the synthetic data used without --doc-embeddings",
+    )
+    parser.add_argument("--num-docs", type=int, default=50000)
+    parser.add_argument("--num-queries", type=int, default=200)
+    parser.add_argument(
+        "--subspace-dims",
+        nargs="+",
+        type=int,
+        default=[4, 8, 16],
+        help="Dimensions per PQ subspace; each gives dim / value bytes per vector",
+    )
+    parser.add_argument("--rescore-factors", nargs="+", type=int, default=[1, 4, 10])
+    parser.add_argument("--nlist", type=int, default=256)
+    parser.add_argument("--nprobe", type=int, default=16)
+    parser.add_argument("--metric", default="cosine", choices=["cosine", "ip", "l2"])
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.WARNING,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+    if len(args.doc_embeddings) != len(args.query_embeddings):
+        parser.error("Give one --query-embeddings file per --doc-embeddings file")
+
+    if args.doc_embeddings:
+        datasets = [
+            (path, np.load(path, mmap_mode="r"), np.load(queries).astype(np.float32))
+            for path, queries in zip(args.doc_embeddings, args.query_embeddings)
+        ]
+    else:
+        datasets = [
+            (
+                f"synthetic-{dim}",
+                *synthetic_embeddings(args.num_docs, args.num_queries, dim),
+            )
+            for dim in args.dims
+        ]
+
+    print(
+        f"{'dataset':<24} {'store':<22} {'bytes/vec':>10} {'ratio':>7} "
+        f"{'recall@' + str(args.k):>10} {'qps':>9}"
+    )
+    for name, docs, queries in datasets:
+        dim = docs.shape[1]
+        documents = [""] * len(docs)
+        exact = NumpyVectorStore(distance_metric=args.metric)
+        exact.add_embeddings(docs, documents)
+        _, exact_indices = exact.search_indices(queries, args.k)
+        expected_ids = [{exact.ids[i] for i in row} for row in exact_indices]
+        float_bytes = 4 * dim
+        exact.clean_up()
+
+        for subspace_dim in args.subspace_dims:
+            if dim % subspace_dim:
+                continue
+            pq_subspaces = dim // subspace_dim
+            stores = [
+                (
+                    f"pq{pq_subspaces}",
+                    QuantizedVectorStore(
+                        distance_metric=args.metric,
+                        quantization="pq",
+                        pq_subspaces=pq_subspaces,
+                    ),
+                ),
+                (
+                    f"ivf{args.nlist}-pq{pq_subspaces}",
+                    IVFQuantizedVectorStore(
+                        distance_metric=args.metric,
+                        quantization="pq",
+                        pq_subspaces=pq_subspaces,
+                        nlist=args.nlist,
+                        nprobe=args.nprobe,
+                    ),
+                ),
+            ]
+            for store_name, store in stores:
+                # Fit the codebooks on a sample first, so the first batch needn't be
+                sample = np.random.default_rng(0).choice(
+                    len(docs), min(len(docs), 65536), replace=False
+                )
+                store.fit_quantizer(docs[np.sort(sample)])
+                store.add_embeddings(docs, documents)
+                # Resident memory per vector: codes plus the squared norm
+                bytes_per_vector = store.get_collection_stats()["memory_bytes"] / len(
+                    docs
+                )
+                for rescore_factor in args.rescore_factors:
+                    store.rescore_factor = rescore_factor
+                    recall, qps = recall_at_k(store, queries, expected_ids, args.k)
+                    label = f"{store_name} r={rescore_factor}"
+                    print(
+                        f"{name:<24} {label:<22} {bytes_per_vector:>10.1f} "
+                        f"{float_bytes / bytes_per_vector:>6.1f}x {recall:>10.4f} "
+                        f"{qps:>9.1f}"
+                    )
+                store.clean_up()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+import argparse
+import logging
+import time
+
+import numpy as np
+
+from my_rag.components.vectorstores.numpy_store import NumpyVectorStore
+from my_rag.components.vectorstores.quantized_store import QuantizedVectorStore
+
+logger = logging.getLogger(__name__)
+
+
+def timed_search(store, queries: np.ndarray, k: int, repeats: int = 3):
+    """Returns the row indices and best-of-n wall time of a batched search."""
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        _, indices = store.search_indices(queries, k)
+        best = min(best, time.perf_counter() - start)
+    return indices, best
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure memory, recall@k and speed of quantized search"
+    )
+    parser.add_argument(
+        "--doc-embeddings", required=True, help="Document embeddings (.npy)"
+    )
+    parser.add_argument(
+        "--query-embeddings", required=True, help="Query embeddings (.npy)"
+    )
+    parser.add_argument("--metric", default="cosine", choices=["cosine", "ip", "l2"])
+    parser.add_argument(
+        "--quantizations", nargs="+", default=["int8", "binary"], help="Code types"
+    )
+    parser.add_argument("--rescore-factors", nargs="+", type=int, default=[1, 2, 4, 10])
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+
+    docs = np.load(args.doc_embeddings, mmap_mode="r")
+    queries = np.load(args.query_embeddings).astype(np.float32)
+    documents = [""] * len(docs)
+
+    exact = NumpyVectorStore(distance_metric=args.metric)
+    exact.add_embeddings(docs, documents)
+    exact_indices, exact_time = timed_search(exact, queries, args.k)
+    exact_memory = exact.get_collection_stats()["memory_bytes"]
+    print(f"{'search':<16} {'memory':>8} {'recall@' + str(args.k):>10} {'qps':>10}")
+    print(f"{'exact':<16} {1.0:>7.1f}x {1.0:>10.4f} {len(queries) / exact_time:>10.1f}")
+
+    for quantization in args.quantizations:
+        store = QuantizedVectorStore(
+            distance_metric=args.metric, quantization=quantization
+        )
+        store.add_embeddings(docs, documents)
+        memory = exact_memory / store.get_collection_stats()["memory_bytes"]
+        for rescore_factor in args.rescore_factors:
+            store.rescore_factor = rescore_factor
+            indices, elapsed = timed_search(store, queries, args.k)
+            recall = np.mean(
+                [
+                    len(np.intersect1d(found, expected)) / args.k
+                    for found, expected in zip(indices, exact_indices)
+                ]
+            )
+            name = f"{quantization} r={rescore_factor}"
+            print(
+                f"{name:<16} {memory:>7.1f}x {recall:>10.4f} "
+                f"{len(queries) / elapsed:>10.1f}"
+            )
+        store.clean_up()
+
+
+if __name__ == "__main__":
+    main()
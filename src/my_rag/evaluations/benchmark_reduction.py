@@ -0,0 +1,80 @@
+import argparse
+import logging
+import time
+
+import numpy as np
+
+from my_rag.components.embeddings.reduction import create_reducer
+from my_rag.evaluations.metrics import MetricsCalculator
+
+logger = logging.getLogger(__name__)
+
+
+def search_time(
+    queries: np.ndarray, docs: np.ndarray, k: int, repeats: int = 3
+) -> float:
+    """Returns the best-of-n wall time of an exact top-k search in seconds."""
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        scores = queries @ docs.T
+        np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure memory, search time and recall of reduced embeddings"
+    )
+    parser.add_argument(
+        "--doc-embeddings", required=True, help="Document embeddings (.npy)"
+    )
+    parser.add_argument(
+        "--query-embeddings", required=True, help="Query embeddings (.npy)"
+    )
+    parser.add_argument(
+        "--methods", nargs="+", default=["pca", "matryoshka"], help="Reduction methods"
+    )
+    parser.add_argument(
+        "--dims", nargs="+", type=int, default=[512, 256, 128], help="Output dims"
+    )
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--fit-sample-size", type=int, default=10000)
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+
+    docs = np.load(args.doc_embeddings, mmap_mode="r")
+    docs = np.ascontiguousarray(docs, dtype=np.float32)
+    queries = np.load(args.query_embeddings).astype(np.float32)
+    full_time = search_time(queries, docs, args.k)
+
+    print(
+        f"{'method':<11} {'dim':>5} {'memory':>8} {'search':>8} {'recall@' + str(args.k):>10}"
+    )
+    print(f"{'full':<11} {docs.shape[1]:>5} {1.0:>7.1f}x {1.0:>7.2f}x {1.0:>10.4f}")
+    for method in args.methods:
+        for dim in args.dims:
+            if dim >= docs.shape[1]:
+                continue
+            reducer = create_reducer({"method": method, "dim": dim})
+            reducer.fit(docs, sample_size=args.fit_sample_size)
+            reduced_docs = reducer.transform(docs)
+            reduced_queries = reducer.transform(queries)
+
+            recall = MetricsCalculator.calculate_neighbor_recall(
+                docs, queries, reduced_docs, reduced_queries, k=args.k
+            )
+            speedup = full_time / search_time(reduced_queries, reduced_docs, args.k)
+            print(
+                f"{method:<11} {dim:>5} {docs.nbytes / reduced_docs.nbytes:>7.1f}x "
+                f"{speedup:>7.2f}x {recall:>10.4f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+import argparse
+import logging
+import os
+import time
+
+import numpy as np
+
+from my_rag.components.vectorstores.numpy_store import NumpyVectorStore
+from my_rag.components.vectorstores.sharded_store import ShardedVectorStore
+
+logger = logging.getLogger(__name__)
+
+
+def timed_search(store, queries: np.ndarray, k: int, repeats: int = 3):
+    """Returns the result ids and best-of-n wall time of a batched search."""
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        results = store.search(queries, k, include=[])
+        best = min(best, time.perf_counter() - start)
+    return results["ids"], best
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure how sharded search throughput scales with shard count"
+    )
+    parser.add_argument(
+        "--doc-embeddings",
+        help="Document embeddings (.npy); random vectors are used if omitted",
+    )
+    parser.add_argument(
+        "--query-embeddings", help="Query embeddings (.npy), with --doc-embeddings"
+    )
+    parser.add_argument("--num-docs", type=int, default=1_000_000)
+    parser.add_argument("--num-queries", type=int, default=256)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument(
+        "--shards",
+        nargs="+",
+        type=int,
+        default=None,
+        help="Shard counts to try (default: powers of two up to the core count)",
+    )
+    parser.add_argument("--threads-per-shard", type=int, default=1)
+    parser.add_argument("--metric", default="cosine", choices=["cosine", "ip", "l2"])
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+    if bool(args.doc_embeddings) != bool(args.query_embeddings):
+        parser.error("Give both --doc-embeddings and --query-embeddings, or neither")
+
+    if args.doc_embeddings:
+        docs = np.load(args.doc_embeddings, mmap_mode="r")
+        queries = np.load(args.query_embeddings).astype(np.float32)
+    else:
+        rng = np.random.default_rng(0)
+        docs = rng.standard_normal((args.num_docs, args.dim), dtype=np.float32)
+        queries = rng.standard_normal((args.num_queries, args.dim), dtype=np.float32)
+    ids = [str(i) for i in range(len(docs))]
+    documents = [""] * len(docs)
+
+    shard_counts = args.shards
+    if shard_counts is None:
+        max_shards = max(1, (os.cpu_count() or 1) // args.threads_per_shard)
+        shard_counts = [2**i for i in range(max_shards.bit_length())]
+        if shard_counts[-1] != max_shards:
+            shard_counts.append(max_shards)
+
+    # Single-process baseline; its matmuls use however many BLAS threads numpy has
+    exact = NumpyVectorStore(distance_metric=args.metric)
+    exact.add_embeddings(docs, documents, ids=ids)
+    exact_ids, exact_time = timed_search(exact, queries, args.k)
+    exact.clean_up()
+
+    print(
+        f"{'store':<14} {'qps':>10} {'speedup':>8} {'efficiency':>10} "
+        f"{'recall@' + str(args.k):>10}"
+    )
+    print(f"{'single':<14} {len(queries) / exact_time:>10.1f} {1.0:>7.2f}x")
+    for num_shards in shard_counts:
+        start = time.perf_counter()
+        store = ShardedVectorStore(
+            distance_metric=args.metric,
+            num_shards=num_shards,
+            threads_per_shard=args.threads_per_shard,
+        )
+        store.add_embeddings(docs, documents, ids=ids)
+        logger.info(f"Built {num_shards} shards in {time.perf_counter() - start:.1f}s")
+        # The first search pays for worker start-up and page faults
+        store.search(queries[:1], args.k, include=[])
+        found_ids, elapsed = timed_search(store, queries, args.k)
+        store.clean_up()
+
+        # Sharded search is exact, so anything below 1.0 is a bug
+        recall = np.mean(
+            [len(set(a) & set(b)) / len(b) for a, b in zip(found_ids, exact_ids)]
+        )
+        speedup = exact_time / elapsed
+        print(
+            f"{str(num_shards) + ' shards':<14} {len(queries) / elapsed:>10.1f} "
+            f"{speedup:>7.2f}x {speedup / num_shards:>10.2f} {recall:>10.4f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
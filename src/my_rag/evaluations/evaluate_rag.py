@@ -2,23 +2,28 @@ import yaml
 import logging
 import argparse
 from pathlib import Path
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 import pandas as pd
 from dataclasses import dataclass
 
-from my_rag.evaluations.evaluator import get_dataset_loader
+from my_rag.evaluations.evaluator import (
+    get_dataset_loader,
+    acquire_embedding_model,
+    create_reduction_steps,
+    create_indexing_steps,
+    create_vector_store,
+    evaluation_collection_name,
+)
+from my_rag.components.model_registry import model_registry
+from my_rag.components.embeddings.base import BaseEmbedding
+from my_rag.components.llms.base import BaseLLM
 from my_rag.components.pipeline.document_processor import DocumentProcessor
+from my_rag.components.pipeline.deduplicator import ChunkDeduplicator
 from my_rag.components.pipeline.embedder import DocumentEmbedder, QueryEmbedder
 from my_rag.components.pipeline.retriever import Retriever
 from my_rag.components.pipeline.generator import Generator
 from my_rag.components.pipeline.rag_pipeline import RAGPipeline
-from my_rag.components.utils import alphanumeric_string
-from my_rag.components.embeddings.huggingface_embedding import HuggingFaceEmbedding
 from my_rag.components.llms.huggingface_llm import HuggingFaceLLM
-from my_rag.components.vectorstores.chroma_store import (
-    ChromaVectorStore,
-    CollectionMode,
-)
 
 logger = logging.getLogger(__name__)
 
@@ -35,6 +40,10 @@ class RAGEvaluationConfig:
     chunk_size: int = 2000
     chunk_overlap: int = 250
     output_dir: str = "results"
+    embedding_cache_dir: Optional[str] = None
+    vector_store_config: Optional[Dict[str, Any]] = None
+    # Keep one collection per model and dataset, and only embed changed chunks
+    incremental_index: bool = False
 
 
 class RAGEvaluator:
@@ -44,25 +53,22 @@ class RAGEvaluator:
         self.config = config
 
     def _create_pipeline(
-        self, embedding_config: Dict[str, Any], llm_config: Dict[str, Any]
+        self,
+        embedding_config: Dict[str, Any],
+        embedding_model: BaseEmbedding,
+        llm_model: BaseLLM,
+        dataset_name: Optional[str] = None,
     ):
         """Creates RAG pipeline with both retrieval and generation components"""
 
-        # Initialize embedding model
-        embedding_model = HuggingFaceEmbedding(
-            model_name=embedding_config["name"],
-            **embedding_config.get("model_kwargs", {}),
-        )
-
-        # Initialize LLM
-        llm_model = HuggingFaceLLM(
-            model_name=llm_config["name"], **llm_config.get("model_kwargs", {})
-        )
-
         # Initialize vector store
-        vector_store = ChromaVectorStore(
-            collection_name=alphanumeric_string(f"eval_{embedding_config['name']}"),
-            mode=CollectionMode.DROP_IF_EXISTS,
+        incremental = self.config.incremental_index
+        vector_store = create_vector_store(
+            collection_name=evaluation_collection_name(
+                embedding_config["name"], dataset_name, incremental
+            ),
+            vector_store_config=self.config.vector_store_config,
+            incremental=incremental,
         )
         return RAGPipeline(
             [
@@ -70,16 +76,21 @@ class RAGEvaluator:
                     chunk_size=self.config.chunk_size,
                     chunk_overlap=self.config.chunk_overlap,
                 ),
+                *create_indexing_steps(vector_store, incremental),
+                ChunkDeduplicator(),
                 DocumentEmbedder(
                     embedding_model=embedding_model,
                     batch_size=embedding_config.get("batch_size", 32),
                     instruction=embedding_config.get("instruction"),
+                    embed_kwargs=embedding_config.get("embed_kwargs"),
                 ),
                 QueryEmbedder(
                     embedding_model=embedding_model,
                     batch_size=embedding_config.get("batch_size", 32),
                     instruction=embedding_config.get("query_instruction"),
+                    embed_kwargs=embedding_config.get("embed_kwargs"),
                 ),
+                *create_reduction_steps(embedding_config),
                 Retriever(vector_store=vector_store, k=self.config.max_k),
                 Generator.from_config(
                     llm=llm_model, config=self.config.generator_config
@@ -92,6 +103,8 @@ class RAGEvaluator:
         embedding_config: Dict[str, Any],
         llm_config: Dict[str, Any],
         dataset: Dict[str, Any],
+        embedding_model: BaseEmbedding,
+        llm_model: BaseLLM,
     ) -> pd.DataFrame:
         """Evaluates a specific combination of embedding model and LLM"""
 
@@ -99,7 +112,9 @@ class RAGEvaluator:
             f"Evaluating embedding model: {embedding_config['name']} with LLM: {llm_config['name']}"
         )
 
-        pipeline = self._create_pipeline(embedding_config, llm_config)
+        pipeline = self._create_pipeline(
+            embedding_config, embedding_model, llm_model, dataset_name=dataset["name"]
+        )
 
         # Run pipeline
         pipeline_data = pipeline.run(
@@ -130,27 +145,67 @@ class RAGEvaluator:
     def evaluate_all(self):
         """Evaluates all model combinations across all datasets"""
 
-        for dataset_config in self.config.dataset_configs:
-            # Load dataset
-            dataset = get_dataset_loader(dataset_config["type"]).load(dataset_config)
-
-            for embedding_config in self.config.embedding_model_configs:
+        # Only one embedding model and one LLM are resident at a time, so GPU
+        # memory is bounded by the largest pair rather than by the whole sweep.
+        # Datasets are loaded as they are needed for the same reason.
+        for embedding_config in self.config.embedding_model_configs:
+            embedding_model = acquire_embedding_model(
+                embedding_config, self.config.embedding_cache_dir
+            )
+            try:
                 for llm_config in self.config.llm_model_configs:
-                    # Evaluate model combination
-                    results_df = self.evaluate_models(
-                        embedding_config=embedding_config,
-                        llm_config=llm_config,
-                        dataset=dataset,
+                    llm_model = model_registry.acquire(
+                        HuggingFaceLLM,
+                        model_name=llm_config["name"],
+                        **llm_config.get("model_kwargs", {}),
                     )
+                    try:
+                        for dataset in self._iter_datasets():
+                            self._evaluate_and_save(
+                                embedding_config,
+                                llm_config,
+                                dataset,
+                                embedding_model,
+                                llm_model,
+                            )
+                    finally:
+                        model_registry.release(llm_model)
+            finally:
+                model_registry.release(embedding_model)
+
+    def _iter_datasets(self):
+        """Loads the configured datasets one at a time"""
+        for dataset_config in self.config.dataset_configs:
+            yield dict(
+                get_dataset_loader(dataset_config["type"]).load(dataset_config),
+                name=dataset_config["name"],
+            )
 
-                    # Save results
-                    output_path = (
-                        Path(self.config.output_dir)
-                        / f'rag_evaluations_{embedding_config["name"].replace("/", "_")}_{llm_config["name"].replace("/", "_")}.xlsx'
-                    )
-                    output_path.parent.mkdir(parents=True, exist_ok=True)
-                    results_df.to_excel(output_path, index=False)
-                    logger.info(f"Results saved to {output_path}")
+    def _evaluate_and_save(
+        self,
+        embedding_config: Dict[str, Any],
+        llm_config: Dict[str, Any],
+        dataset: Dict[str, Any],
+        embedding_model: BaseEmbedding,
+        llm_model: BaseLLM,
+    ):
+        """Evaluates one model combination on one dataset and saves the results"""
+        results_df = self.evaluate_models(
+            embedding_config=embedding_config,
+            llm_config=llm_config,
+            dataset=dataset,
+            embedding_model=embedding_model,
+            llm_model=llm_model,
+        )
+
+        # Save results
+        output_path = (
+            Path(self.config.output_dir)
+            / f'rag_evaluations_{embedding_config["name"].replace("/", "_")}_{llm_config["name"].replace("/", "_")}.xlsx'
+        )
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        results_df.to_excel(output_path, index=False)
+        logger.info(f"Results saved to {output_path}")
 
 
 def main():
@@ -178,6 +233,9 @@ def main():
         chunk_size=config.get("chunk_size", 2000),
         chunk_overlap=config.get("chunk_overlap", 250),
         output_dir=config.get("output_dir", "results"),
+        embedding_cache_dir=config.get("embedding_cache_dir"),
+        vector_store_config=config.get("vector_store"),
+        incremental_index=config.get("incremental_index", False),
     )
 
     # Run evaluation
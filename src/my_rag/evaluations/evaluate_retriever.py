@@ -27,6 +27,9 @@ def main():
         chunk_size=config.get("chunk_size", 2000),
         chunk_overlap=config.get("chunk_overlap", 250),
         output_path=config.get("output_path", "retriever_evaluation_results.xlsx"),
+        embedding_cache_dir=config.get("embedding_cache_dir"),
+        vector_store_config=config.get("vector_store"),
+        incremental_index=config.get("incremental_index", False),
     )
 
     # Run evaluation
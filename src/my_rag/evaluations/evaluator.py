@@ -1,19 +1,32 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from dataclasses import dataclass
 import pandas as pd
 import logging
 from my_rag.components.pipeline.document_processor import DocumentProcessor
+from my_rag.components.pipeline.deduplicator import ChunkDeduplicator
 from my_rag.components.pipeline.embedder import DocumentEmbedder, QueryEmbedder
 from my_rag.components.pipeline.retriever import Retriever
+from my_rag.components.pipeline.reducer import EmbeddingReducer
+from my_rag.components.pipeline.incremental_indexer import IncrementalIndexer
+from my_rag.components.pipeline.base import PipelineStep
+from my_rag.components.embeddings.reduction import create_reducer
 from my_rag.components.pipeline.rag_pipeline import RAGPipeline
 from my_rag.components.utils import alphanumeric_string
+from my_rag.components.model_registry import model_registry
 from .metrics import MetricsCalculator
 import os
 from my_rag.components.embeddings.huggingface_embedding import HuggingFaceEmbedding
-from my_rag.components.vectorstores.chroma_store import (
-    ChromaVectorStore,
-    CollectionMode,
+from my_rag.components.embeddings.cached_embedding import CachedEmbedding
+from my_rag.components.embeddings.multiprocess_embedding import MultiProcessEmbedding
+from my_rag.components.embeddings.base import BaseEmbedding
+from my_rag.components.vectorstores.base import BaseVectorStore
+from my_rag.components.vectorstores.numpy_store import NumpyVectorStore
+from my_rag.components.vectorstores.ivf_store import IVFVectorStore
+from my_rag.components.vectorstores.quantized_store import (
+    IVFQuantizedVectorStore,
+    QuantizedVectorStore,
 )
+from my_rag.components.vectorstores.sharded_store import ShardedVectorStore
 import pandas as pd
 from my_rag.components.pdf_loader import PDFLoader
 from typing import Dict, Any
@@ -68,6 +81,141 @@ def get_dataset_loader(dataset_type: str):
     return loaders[dataset_type]
 
 
+def create_embedding_model(
+    model_config: Dict[str, Any], embedding_cache_dir: Optional[str] = None
+) -> BaseEmbedding:
+    """Creates the embedding model described by a model configuration"""
+    if model_config.get("num_workers"):
+        # Shard embedding across CPU worker processes
+        embedding_model = MultiProcessEmbedding(
+            model_name=model_config["name"],
+            num_workers=model_config["num_workers"],
+            threads_per_worker=model_config.get("threads_per_worker"),
+            model_kwargs=model_config.get("model_kwargs", {}),
+        )
+    else:
+        embedding_model = HuggingFaceEmbedding(
+            model_name=model_config["name"], **model_config.get("model_kwargs", {})
+        )
+
+    if embedding_cache_dir:
+        embedding_model = CachedEmbedding(
+            embedding_model,
+            cache_dir=embedding_cache_dir,
+            load_config=model_config.get("model_kwargs", {}),
+        )
+    return embedding_model
+
+
+# Model config entries that change how an embedding model is loaded; the rest
+# (batch size, instructions, ...) only affect how it is called
+EMBEDDING_LOAD_KEYS = ("name", "num_workers", "threads_per_worker", "model_kwargs")
+
+
+def acquire_embedding_model(
+    model_config: Dict[str, Any], embedding_cache_dir: Optional[str] = None
+) -> BaseEmbedding:
+    """
+    Gets a shared embedding model from the process-wide registry. Release it
+    with `model_registry.release` when done.
+    """
+    load_config = {
+        key: model_config[key] for key in EMBEDDING_LOAD_KEYS if key in model_config
+    }
+    return model_registry.acquire(
+        create_embedding_model, load_config, embedding_cache_dir
+    )
+
+
+def create_reduction_steps(model_config: Dict[str, Any]) -> List[EmbeddingReducer]:
+    """
+    Creates the optional dimensionality-reduction step for a model configuration.
+
+    The 'reduction' entry holds 'method' ('pca' or 'matryoshka'), 'dim' and
+    optionally 'fit_sample_size' and 'path' (where the fitted reducer is saved
+    and reloaded from).
+    """
+    reduction_config = model_config.get("reduction")
+    if not reduction_config:
+        return []
+    return [
+        EmbeddingReducer(
+            reducer=create_reducer(reduction_config),
+            fit_sample_size=reduction_config.get("fit_sample_size", 10000),
+            save_path=reduction_config.get("path"),
+        )
+    ]
+
+
+def create_vector_store(
+    collection_name: str,
+    vector_store_config: Optional[Dict[str, Any]] = None,
+    incremental: bool = False,
+) -> BaseVectorStore:
+    """
+    Creates the vector store described by a 'vector_store' configuration.
+
+    The 'type' entry selects 'chroma' (default, needs a running Chroma server),
+    'numpy' (in-process, exact search), 'ivf' (in-process, approximate
+    search), 'quantized' (in-process, int8/binary/product-quantized codes with
+    exact re-ranking), 'ivf_quantized' (both) or 'sharded' (exact search
+    spread over worker processes); the remaining entries are
+    passed to the store's constructor. Chroma collections are rebuilt unless
+    `incremental` is set, in which case an existing collection is reused.
+    """
+    vector_store_config = dict(vector_store_config or {})
+    store_type = vector_store_config.pop("type", "chroma")
+    if store_type == "numpy":
+        return NumpyVectorStore(collection_name=collection_name, **vector_store_config)
+    if store_type == "ivf":
+        return IVFVectorStore(collection_name=collection_name, **vector_store_config)
+    if store_type == "quantized":
+        return QuantizedVectorStore(
+            collection_name=collection_name, **vector_store_config
+        )
+    if store_type == "ivf_quantized":
+        return IVFQuantizedVectorStore(
+            collection_name=collection_name, **vector_store_config
+        )
+    if store_type == "sharded":
+        return ShardedVectorStore(
+            collection_name=collection_name, **vector_store_config
+        )
+    if store_type == "chroma":
+        # Imported lazily so in-process stores work without chromadb installed
+        from my_rag.components.vectorstores.chroma_store import (
+            ChromaVectorStore,
+            CollectionMode,
+        )
+
+        return ChromaVectorStore(
+            collection_name=collection_name,
+            mode=(
+                CollectionMode.CREATE_IF_NOT_EXISTS
+                if incremental
+                else CollectionMode.DROP_IF_EXISTS
+            ),
+            **vector_store_config,
+        )
+    raise ValueError(f"Unknown vector store type: {store_type}")
+
+
+def create_indexing_steps(
+    vector_store: BaseVectorStore, incremental: bool
+) -> List[PipelineStep]:
+    """Returns the IncrementalIndexer step for incremental runs, else nothing"""
+    return [IncrementalIndexer(vector_store)] if incremental else []
+
+
+def evaluation_collection_name(
+    model_name: str, dataset_name: Optional[str], incremental: bool
+) -> str:
+    """Collection name of an evaluation run; per dataset when incremental"""
+    if incremental and dataset_name:
+        return alphanumeric_string(f"eval_{model_name}_{dataset_name}")
+    return alphanumeric_string(f"eval_{model_name}")
+
+
 @dataclass
 class EvaluationConfig:
     """Configuration for evaluation"""
@@ -78,6 +226,10 @@ class EvaluationConfig:
     chunk_size: int = 2000
     chunk_overlap: int = 250
     output_path: str = "retriever_evaluation_results.xlsx"
+    embedding_cache_dir: Optional[str] = None
+    vector_store_config: Optional[Dict[str, Any]] = None
+    # Keep one collection per model and dataset, and only embed changed chunks
+    incremental_index: bool = False
 
 
 class RetrieverEvaluator:
@@ -90,15 +242,20 @@ class RetrieverEvaluator:
         self.config = config
         self.metrics_calculator = MetricsCalculator()
 
-    def _create_pipeline(self, model_config: Dict[str, Any]):
+    def _create_pipeline(
+        self,
+        model_config: Dict[str, Any],
+        embedding_model: BaseEmbedding,
+        dataset_name: Optional[str] = None,
+    ):
         """Creates pipeline for a specific model configuration"""
-        embedding_model = HuggingFaceEmbedding(
-            model_name=model_config["name"], **model_config.get("model_kwargs", {})
-        )
-
-        vector_store = ChromaVectorStore(
-            collection_name=alphanumeric_string(f"eval_{model_config['name']}"),
-            mode=CollectionMode.DROP_IF_EXISTS,
+        incremental = self.config.incremental_index
+        vector_store = create_vector_store(
+            collection_name=evaluation_collection_name(
+                model_config["name"], dataset_name, incremental
+            ),
+            vector_store_config=self.config.vector_store_config,
+            incremental=incremental,
         )
         return RAGPipeline(
             [
@@ -106,16 +263,21 @@ class RetrieverEvaluator:
                     chunk_size=self.config.chunk_size,
                     chunk_overlap=self.config.chunk_overlap,
                 ),
+                *create_indexing_steps(vector_store, incremental),
+                ChunkDeduplicator(),
                 DocumentEmbedder(
                     embedding_model=embedding_model,
                     batch_size=model_config["batch_size"],
                     instruction=model_config.get("instruction"),
+                    embed_kwargs=model_config.get("embed_kwargs"),
                 ),
                 QueryEmbedder(
                     embedding_model=embedding_model,
                     batch_size=model_config["batch_size"],
                     instruction=model_config.get("query_instruction"),
+                    embed_kwargs=model_config.get("embed_kwargs"),
                 ),
+                *create_reduction_steps(model_config),
                 Retriever(vector_store=vector_store, k=self.config.max_k),
             ]
         )
@@ -123,6 +285,7 @@ class RetrieverEvaluator:
     def evaluate_model(
         self,
         model_config: Dict[str, Any],
+        embedding_model: BaseEmbedding,
         dataset_config: Dict[str, Any],
         documents: List[str],
         document_ids: List[str],
@@ -132,7 +295,9 @@ class RetrieverEvaluator:
         """Evaluates a single model"""
         logger.info(f"Evaluating model: {model_config['name']}")
 
-        pipeline = self._create_pipeline(model_config)
+        pipeline = self._create_pipeline(
+            model_config, embedding_model, dataset_name=dataset_config["name"]
+        )
 
         # Run pipeline
         pipeline_data = pipeline.run(
@@ -165,27 +330,34 @@ class RetrieverEvaluator:
 
     def evaluate_all(self) -> pd.DataFrame:
         """Evaluates all models and returns results DataFrame"""
-        results = []
-        for dataset_config in self.config.dataset_configs:
-            # Load dataset
-            dataset = get_dataset_loader(dataset_config["type"]).load(dataset_config)
-            documents = dataset["documents"]
-            document_ids = dataset["document_ids"]
-            queries = dataset["queries"]
-            actual_doc_ids = dataset["actual_doc_ids"]
-
-            for model_config in self.config.model_configs:
-                result = self.evaluate_model(
-                    model_config=model_config,
-                    dataset_config=dataset_config,
-                    documents=documents,
-                    document_ids=document_ids,
-                    queries=queries,
-                    actual_doc_ids=actual_doc_ids,
-                )
-                results.append(result)
-
-        results_df = pd.DataFrame(results)
+        results = {}
+        for model_index, model_config in enumerate(self.config.model_configs):
+            embedding_model = acquire_embedding_model(
+                model_config, self.config.embedding_cache_dir
+            )
+            try:
+                # Datasets are loaded one at a time so only one is held in
+                # memory alongside the embedding model
+                for dataset_index, dataset_config in enumerate(
+                    self.config.dataset_configs
+                ):
+                    dataset = get_dataset_loader(dataset_config["type"]).load(
+                        dataset_config
+                    )
+                    results[(dataset_index, model_index)] = self.evaluate_model(
+                        model_config=model_config,
+                        embedding_model=embedding_model,
+                        dataset_config=dataset_config,
+                        documents=dataset["documents"],
+                        document_ids=dataset["document_ids"],
+                        queries=dataset["queries"],
+                        actual_doc_ids=dataset["actual_doc_ids"],
+                    )
+            finally:
+                model_registry.release(embedding_model)
+
+        # Keep the dataset-major row order
+        results_df = pd.DataFrame([results[key] for key in sorted(results)])
         self._save_results(results_df)
 
         return results_df
@@ -55,3 +55,42 @@ class MetricsCalculator:
         mrr = np.mean(reciprocal_ranks)
 
         return RetrievalMetrics(accuracy_at_k=accuracy_at_k, mrr=mrr)
+
+    @staticmethod
+    def calculate_neighbor_recall(
+        reference_doc_embeddings: np.ndarray,
+        reference_query_embeddings: np.ndarray,
+        doc_embeddings: np.ndarray,
+        query_embeddings: np.ndarray,
+        k: int = 10,
+    ) -> float:
+        """
+        Measures how well an approximate embedding space (e.g. after
+        dimensionality reduction) preserves exact nearest neighbors.
+
+        Args:
+            reference_doc_embeddings: Full document embeddings
+            reference_query_embeddings: Full query embeddings
+            doc_embeddings: Approximate document embeddings
+            query_embeddings: Approximate query embeddings
+            k: Number of neighbors compared per query
+
+        Returns:
+            Mean fraction of the reference top-k found in the approximate top-k
+        """
+        k = min(k, len(doc_embeddings))
+
+        def top_k(queries: np.ndarray, docs: np.ndarray) -> np.ndarray:
+            scores = (
+                np.asarray(queries, dtype=np.float32)
+                @ np.asarray(docs, dtype=np.float32).T
+            )
+            return np.argpartition(-scores, k - 1, axis=1)[:, :k]
+
+        reference = top_k(reference_query_embeddings, reference_doc_embeddings)
+        approximate = top_k(query_embeddings, doc_embeddings)
+        overlaps = [
+            len(np.intersect1d(ref, approx)) / k
+            for ref, approx in zip(reference, approximate)
+        ]
+        return float(np.mean(overlaps))
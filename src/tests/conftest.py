@@ -0,0 +1,14 @@
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def corpus():
+    """Small synthetic corpus: vectors, queries, ids, documents and metadata."""
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((2000, 32)).astype(np.float32)
+    queries = rng.standard_normal((20, 32)).astype(np.float32)
+    ids = [f"id{i}" for i in range(len(vectors))]
+    documents = [f"document {i}" for i in range(len(vectors))]
+    metadatas = [{"doc_id": doc_id, "group": i % 3} for i, doc_id in enumerate(ids)]
+    return vectors, queries, ids, documents, metadatas
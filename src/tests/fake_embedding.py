@@ -0,0 +1,34 @@
+import hashlib
+from typing import List, Optional
+import numpy as np
+from my_rag.components.embeddings.base import BaseEmbedding
+
+
+class HashEmbedding(BaseEmbedding):
+    """
+    Deterministic embedding model for tests: each text maps to a fixed
+    pseudo-random unit vector derived from its hash. Counts embedded texts.
+    """
+
+    model_name = "test/hash-embedding"
+
+    def __init__(self, dim: int = 16):
+        self.dim = dim
+        self.texts_embedded = 0
+        self.calls = 0
+        self.cleaned_up = False
+
+    def embed(
+        self, texts: List[str], instruction: Optional[str] = None, **kwargs
+    ) -> np.ndarray:
+        self.calls += 1
+        self.texts_embedded += len(texts)
+        vectors = np.empty((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            seed = hashlib.sha1(f"{instruction}\0{text}".encode("utf-8")).digest()
+            rng = np.random.default_rng(int.from_bytes(seed[:8], "little"))
+            vectors[row] = rng.standard_normal(self.dim)
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    def clean_up(self):
+        self.cleaned_up = True
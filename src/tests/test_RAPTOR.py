@@ -1,4 +1,11 @@
 from my_rag.components.embeddings.huggingface_embedding import HuggingFaceEmbedding
+from my_rag.components.utils import deduplicate_texts, chunk_id
+from my_rag.components.pipeline.incremental_indexer import IndexDiff, diff_chunks
+from my_rag.components.pipeline.parallel_index_builder import CODEBOOK, ParallelIndexBuilder, iter_index_batches
+from my_rag.components.memory_db.history_index import QueryHistoryIndex
+from my_rag.components.batching import BatchPolicy, batched_apply
+from my_rag.components.vectorstores.segment_file import SegmentFile
+from my_rag.components.vectorstores.product_quantizer import CodebookBuffer, ProductQuantizer
 from langchain_community.document_loaders import PyPDFDirectoryLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from my_rag.components.llms.huggingface_llm import HuggingFaceLLM
@@ -11,6 +18,7 @@ from sentence_transformers import CrossEncoder
 from dataclasses import dataclass, field
 from abc import ABC, abstractmethod
 from rank_bm25 import BM25Okapi
+from functools import partial
 from pathlib import Path
 from tqdm import tqdm
 import pandas as pd
@@ -31,6 +39,8 @@ os.environ['PYTORCH_CUDA_ALLOC_CONF'] = 'expandable_segments:True'
 
 # Configuration
 DEFAULT_DATA_PATH = "data_test"
+# Worker processes for building the index in parallel; None indexes serially
+PARALLEL_BUILD_WORKERS = None
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -113,12 +123,25 @@ class VectorStore(ABC):
 class RelevanceScorer:
     """Refined multi-level relevance scoring system."""
 
-    def __init__(self, model_name: str = "cross-encoder/ms-marco-MiniLM-L-6-v2"):
+    def __init__(self, model_name: str = "cross-encoder/ms-marco-MiniLM-L-6-v2",
+                 batch_size: int = 32, max_tokens: Optional[int] = None, adaptive_batching: bool = True):
         self.model = CrossEncoder(model_name)
+        # Kept across calls so a batch size reduced after an OOM is remembered
+        self.batch_policy = BatchPolicy(batch_size, max_tokens, adaptive_batching)
 
     def score_relevance(self, query: str, passages: List[str]) -> List[float]:
         """Score relevance of passages at multiple levels, prioritize deeper context if relevant."""
-        scores = self.model.predict([[query, passage] for passage in passages])
+        pairs = [[query, passage] for passage in passages]
+        lengths = None
+        if self.batch_policy.max_tokens is not None:
+            encoded = self.model.tokenizer([query] * len(passages), passages, truncation=True)
+            lengths = [len(ids) for ids in encoded["input_ids"]]
+        scores = batched_apply(
+            pairs,
+            lambda batch: list(self.model.predict(batch, batch_size=len(batch), show_progress_bar=False)),
+            self.batch_policy,
+            lengths,
+        )
 
         # Apply weighting to prioritize relevant multi-level context
         depth_weighted_scores = [score * (0.9 ** depth) for depth, score in enumerate(scores)]
@@ -314,19 +337,44 @@ class ChromaDBStore(VectorStore):
         """Return the current document count."""
         return self.document_count
 
-
-def decompress_embedding(compressed_data: bytes) -> np.ndarray:
-    """Decompress a single embedding vector."""
-    return pickle.loads(zlib.decompress(compressed_data)).astype(np.float32)
+    def get_ids(self) -> List[str]:
+        """Return the ids of all documents in the collection."""
+        return self.collection.get(include=[])["ids"]
+
+    def delete_documents(self, ids: List[str]) -> None:
+        """Delete documents by id and update the document count."""
+        if not ids:
+            return
+        self.collection.delete(ids=ids)
+        self.document_count = max(self.document_count - len(ids), 0)
+        logger.info(f"Deleted {len(ids)} documents from the ChromaDB collection '{self.collection_name}'.")
+
+    def add_built_index(self, index_dir: str, batch_size: int = 1000) -> None:
+        """Add the chunks of a merged parallel build (see ParallelIndexBuilder)."""
+        for batch in iter_index_batches(index_dir, batch_size):
+            self.add_documents(
+                documents=batch["documents"],
+                embeddings=batch["embeddings"].tolist(),
+                metadatas=[{"source": meta["doc_id"]} for meta in batch["metadatas"]],
+                ids=batch["ids"]
+            )
 
 
 class StorageOptimizer:
     """Handles embedding compression and storage optimization."""
 
-    def __init__(self, dimension_threshold: int = 64, compression_level: int = 9):
+    def __init__(self, dimension_threshold: int = 64, compression_level: int = 9,
+                 pq_subspaces: Optional[int] = None, codebook_path: Optional[str] = None):
         self.scaler = StandardScaler()
         self.dimension_threshold = dimension_threshold
         self.compression_level = compression_level
+        # With pq_subspaces, embeddings are product-quantized to that many bytes instead, once
+        # enough of them arrived to train the codebook
+        self.codebook_buffer = CodebookBuffer(pq_subspaces, codebook_path) if pq_subspaces else None
+
+    @property
+    def product_quantizer(self) -> Optional[ProductQuantizer]:
+        return self.codebook_buffer.quantizer if self.codebook_buffer is not None else None
 
     def compress_embedding(self, embedding: np.ndarray) -> bytes:
         """Compress a single embedding vector."""
@@ -340,6 +388,11 @@ class StorageOptimizer:
         # Ensure that NaN values are replaced with 0
         embedding = np.nan_to_num(embedding, nan=0.0)  # Explicitly set NaNs to 0.0
 
+        if self.product_quantizer is not None:
+            if not self.product_quantizer.is_trained:
+                raise ValueError("The PQ codebook must be trained before quantizing embeddings")
+            codes = self.product_quantizer.encode(np.atleast_2d(embedding))
+            return codes if embedding.ndim == 2 else codes[0]
         if bits == 8:
             # Normalize to [-1, 1] range before scaling to [0, 255]
             normalized = np.clip(embedding, -1, 1)
@@ -351,6 +404,9 @@ class StorageOptimizer:
 
     def dequantize_embedding(self, quantized: np.ndarray, bits: int = 8) -> np.ndarray:
         """Dequantize embedding back to original scale."""
+        if self.product_quantizer is not None:
+            vectors = self.product_quantizer.decode(np.atleast_2d(quantized))
+            return vectors if quantized.ndim == 2 else vectors[0]
         if bits == 8:
             return (quantized.astype(np.float32) - 128) / 128
         elif bits == 4:
@@ -361,16 +417,34 @@ class StorageOptimizer:
 class OptimizedChromaDBStore(ChromaDBStore):
     """Storage-optimized version of ChromaDBStore."""
 
-    def __init__(self, collection_name: str, storage_path: str, max_documents: Optional[int] = None):
+    def __init__(self, collection_name: str, storage_path: str, max_documents: Optional[int] = None,
+                 pq_subspaces: Optional[int] = None):
         super().__init__(collection_name)
         self.storage_path = storage_path
-        self.storage_optimizer = StorageOptimizer()
+        codebook_path = os.path.join(storage_path, f"{collection_name}.pq.npz")
+        self.storage_optimizer = StorageOptimizer(pq_subspaces=pq_subspaces, codebook_path=codebook_path)
         self.max_documents = max_documents
         self.embedding_cache = {}
 
         # Create storage directory if it doesn't exist
         os.makedirs(storage_path, exist_ok=True)
 
+        # Quantized embeddings of all chunks share one memory-mapped segment file
+        self.segment = SegmentFile(os.path.join(storage_path, f"{collection_name}.seg"), dtype="uint8")
+        buffer = self.storage_optimizer.codebook_buffer
+        if buffer is None:
+            stale = os.path.exists(codebook_path)
+        else:
+            stale = buffer.discarded_saved or (not buffer.is_trained and len(self.segment) > 0)
+        if stale:
+            # The stored codes were quantized with other settings and can't be decoded with these
+            logger.warning(f"Dropping quantized embeddings in '{self.segment.path}' stored with other PQ settings")
+            if os.path.exists(self.segment.path):
+                os.remove(self.segment.path)
+            self.segment = SegmentFile(self.segment.path, dtype="uint8")
+            if os.path.exists(codebook_path):
+                os.remove(codebook_path)
+
         # Initialize disk-based client instead of in-memory
         self.client = chromadb.PersistentClient(path=storage_path)
 
@@ -390,25 +464,14 @@ class OptimizedChromaDBStore(ChromaDBStore):
                 f"Inconsistent lengths detected: {lengths}. All inputs must have the same length."
             )
 
-        # Ensure the storage path exists
-        os.makedirs(self.storage_path, exist_ok=True)
-        data_path = self.storage_path
-        os.makedirs(data_path, exist_ok=True)
-
         try:
-            # Compress embeddings before storage
-            compressed_embeddings = []
-            for emb in embeddings:
-                emb_array = np.array(emb)
-                quantized = self.storage_optimizer.quantize_embedding(emb_array)
-                compressed = self.storage_optimizer.compress_embedding(quantized)
-                compressed_embeddings.append(compressed)
-
-            # Store compressed embeddings
-            for idx, (doc_id, compressed_emb) in enumerate(zip(ids, compressed_embeddings)):
-                embedding_path = os.path.join(data_path, f"{doc_id}.emb")
-                with open(embedding_path, 'wb') as f:
-                    f.write(compressed_emb)
+            # Quantize all embeddings at once and append them to the segment file
+            embeddings_array = np.asarray(embeddings, dtype=np.float32)
+            buffer = self.storage_optimizer.codebook_buffer
+            if buffer is not None:
+                self.segment.append(*buffer.add(ids, np.nan_to_num(embeddings_array, nan=0.0)))
+            else:
+                self.segment.append(list(ids), self.storage_optimizer.quantize_embedding(embeddings_array))
 
             # Store in ChromaDB with validation
             cleaned_documents = [str(doc) for doc in documents]  # Ensure all documents are strings
@@ -430,24 +493,66 @@ class OptimizedChromaDBStore(ChromaDBStore):
         """Query with optimized embedding loading."""
         results = super().query(query_embeddings, n_results, include)
 
-        # Load and decompress embeddings only when needed
+        # Load and dequantize embeddings only when needed, straight from the memory-mapped segment
         if results.get('ids'):
+            buffer = self.storage_optimizer.codebook_buffer
             for doc_id in results['ids'][0]:
-                if doc_id not in self.embedding_cache:
-                    embedding_path = os.path.join(self.storage_path, f"{doc_id}.emb")
-                    if os.path.exists(embedding_path):
-                        with open(embedding_path, 'rb') as f:
-                            compressed_data = f.read()
-                        quantized = decompress_embedding(compressed_data)
-                        embedding = self.storage_optimizer.dequantize_embedding(quantized)
-                        self.embedding_cache[doc_id] = embedding
+                if buffer is not None and doc_id in buffer.pending:
+                    self.embedding_cache[doc_id] = buffer.pending[doc_id]
+            missing = [doc_id for doc_id in results['ids'][0]
+                       if doc_id not in self.embedding_cache and doc_id in self.segment]
+            if missing:
+                embeddings = self.storage_optimizer.dequantize_embedding(self.segment.get(missing))
+                for doc_id, embedding in zip(missing, embeddings):
+                    self.embedding_cache[doc_id] = embedding
 
         return results
 
+    def delete_documents(self, ids: List[str]) -> None:
+        """Delete documents and drop their quantized embeddings."""
+        super().delete_documents(ids)
+        self.segment.delete(ids)
+        for doc_id in ids:
+            self.embedding_cache.pop(doc_id, None)
+        if self.storage_optimizer.codebook_buffer is not None:
+            self.storage_optimizer.codebook_buffer.discard(ids)
+
+    def flush_pending(self) -> None:
+        """Store the codes of embeddings held back to train the PQ codebook, if it can be trained."""
+        if self.storage_optimizer.codebook_buffer is not None:
+            self.segment.append(*self.storage_optimizer.codebook_buffer.flush())
+
+    def add_built_index(self, index_dir: str, batch_size: int = 1000) -> None:
+        """Add a merged parallel build, storing the PQ codes its workers computed as they are."""
+        codebook_path = os.path.join(index_dir, CODEBOOK)
+        buffer = self.storage_optimizer.codebook_buffer
+        if buffer is None or not os.path.exists(codebook_path) or len(self.segment):
+            # Codes from another codebook can't share the segment file; re-quantize instead
+            super().add_built_index(index_dir, batch_size)
+            return
+
+        buffer.use(ProductQuantizer.load(codebook_path))
+        self.flush_pending()
+        for batch in iter_index_batches(index_dir, batch_size):
+            self.segment.append(batch["ids"], batch["codes"])
+            ChromaDBStore.add_documents(
+                self,
+                documents=batch["documents"],
+                embeddings=batch["embeddings"].tolist(),
+                metadatas=[{"source": meta["doc_id"], "compressed": True} for meta in batch["metadatas"]],
+                ids=batch["ids"]
+            )
+
     def clear_cache(self):
         """Clear the embedding cache to free memory."""
         self.embedding_cache.clear()
 
+    def compact_storage(self) -> int:
+        """Rewrite the segment file without embeddings that were overwritten."""
+        reclaimed = self.segment.compact()
+        logger.info(f"Compacted segment file '{self.segment.path}', reclaimed {reclaimed} rows")
+        return reclaimed
+
 
 class RAPTORSystem:
     """Main RAG system orchestrating components."""
@@ -457,10 +562,14 @@ class RAPTORSystem:
             vector_store: ChromaDBStore,
             llm: HuggingFaceLLM,
             embedding_model_sentece: SentenceTransformer,
-            logger: Optional[logging.Logger] = None
+            logger: Optional[logging.Logger] = None,
+            history_max_size: Optional[int] = None
     ):
         self.raptor_tree = RAPTORTree()
         self.prompt_transformer = PromptTransformer(llm)
+        # Pre-normalized embeddings of past queries, filled incrementally
+        self.history_index = QueryHistoryIndex(max_size=history_max_size)
+        self._indexed_history = 0
         self.relevance_scorer = RelevanceScorer()
         self.embedding_model = embedding_model
         self.vector_store = vector_store
@@ -528,12 +637,23 @@ class RAPTORSystem:
         )
 
     def _get_relevant_history(self, query: str) -> List[QueryResult]:
-        if not self.prompt_transformer.history:
+        history = self.prompt_transformer.history
+        if not history:
             return []
-        query_embedding = self.embedding_model.embed([query])[0]
-        history_embeddings = self.embedding_model.embed([h.query for h in self.prompt_transformer.history])
-        similarities = cosine_similarity([query_embedding], history_embeddings)[0]
-        return [self.prompt_transformer.history[i] for i in np.where(similarities > 0.8)[0]]
+        if len(history) < self._indexed_history:
+            # History was reset externally; rebuild the index from scratch
+            self.history_index.clear()
+            self._indexed_history = 0
+
+        # Embed only queries added since the last lookup, together with the new query
+        new_entries = history[self._indexed_history:]
+        embeddings = self.embedding_model.embed([h.query for h in new_entries] + [query])
+        if new_entries:
+            self.history_index.add(new_entries, embeddings[:-1])
+            self._indexed_history = len(history)
+
+        matches = self.history_index.search(embeddings[-1], threshold=0.8)
+        return [entry for entry, _ in matches]
 
     def index_documents(self, documents: List[Document], batch_size: int = 50) -> None:
         """Optimized indexing method with proper validation and error handling."""
@@ -1151,6 +1271,22 @@ def calculate_storage_requirements(num_documents: int, embedding_dim: int,
     return total_embedding_storage + document_storage + index_overhead
 
 
+def split_into_chunks(contexts: List[str], document_ids: List[str], chunk_size: int = 1000,
+                      chunk_overlap: int = 115) -> Tuple[List[str], List[str]]:
+    """Split documents into chunks, returning the chunk texts and the document id of each chunk."""
+    chunked_texts, chunked_doc_ids = [], []
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+
+    for context, doc_id in zip(contexts, document_ids):
+        chunks = text_splitter.split_text(context)
+        if chunks:
+            chunked_texts.extend(chunks)
+            chunked_doc_ids.extend([doc_id] * len(chunks))
+        else:
+            logger.warning(f"No chunks created for document ID {doc_id}.")
+    return chunked_texts, chunked_doc_ids
+
+
 def create_document_embeddings(
         embedding_model,
         dataframe,
@@ -1162,38 +1298,54 @@ def create_document_embeddings(
         embed_document_method="embed_documents",
         instruction="",
         max_length=None,
+        output_path=None,
+        max_tokens=None,
+        adaptive_batching=True,
 ):
     contexts = dataframe[context_field].tolist()
     document_ids = dataframe[doc_id_field].tolist()
 
-    chunked_texts, chunked_doc_ids = [], []
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
-
-    for context, doc_id in zip(contexts, document_ids):
-        chunks = text_splitter.split_text(context)
-        if chunks:
-            chunked_texts.extend(chunks)
-            chunked_doc_ids.extend([doc_id] * len(chunks))
-        else:
-            logger.warning(f"No chunks created for document ID {doc_id}.")
+    chunked_texts, chunked_doc_ids = split_into_chunks(contexts, document_ids, chunk_size, chunk_overlap)
 
     if not chunked_texts:
         raise ValueError("No text chunks found to create embeddings. Check document loading and splitting.")
 
     log_cuda_memory_usage("Before creating context embeddings")
 
-    if hasattr(embedding_model, embed_document_method):
+    # Embed each distinct chunk once; vectors are fanned back out below
+    all_chunked_texts = chunked_texts
+    chunked_texts, duplicate_inverse = deduplicate_texts(all_chunked_texts)
+    if len(chunked_texts) < len(all_chunked_texts):
+        logger.info(f"Removed {len(all_chunked_texts) - len(chunked_texts)} duplicate chunks before embedding")
+
+    # Cap padded tokens per batch and halve batches on OOM instead of failing
+    batching_kwargs = {"max_tokens": max_tokens, "adaptive_batching": adaptive_batching}
+
+    if output_path is not None and hasattr(embedding_model, "embed_to_memmap"):
+        # Stream batches into an on-disk array so RAM stays bounded for large corpora; duplicates
+        # are fanned out into it block by block
+        embeddings = embedding_model.embed_to_memmap(
+            chunked_texts, output_path, inverse=duplicate_inverse, batch_size=batch_size,
+            instruction=instruction, max_length=max_length, **batching_kwargs
+        )
+        chunked_texts = all_chunked_texts
+    elif hasattr(embedding_model, embed_document_method):
         embed_func = getattr(embedding_model, embed_document_method)
         embeddings = embed_func([f"{instruction}{text}" for text in chunked_texts] if instruction else chunked_texts)
     else:
         embeddings = embedding_model.embed(
-            chunked_texts, batch_size=batch_size, instruction=instruction, max_length=max_length
+            chunked_texts, batch_size=batch_size, instruction=instruction, max_length=max_length,
+            **batching_kwargs
         )
 
     if embeddings is None or len(embeddings) == 0:
         raise RuntimeError("Embedding function returned an empty result.")
 
-    embeddings = embeddings.cpu().numpy()
+    if hasattr(embeddings, "cpu"):
+        embeddings = embeddings.cpu().numpy()
+    if len(chunked_texts) < len(all_chunked_texts):
+        embeddings = np.asarray(embeddings)[duplicate_inverse]
+        chunked_texts = all_chunked_texts
     torch.cuda.empty_cache()
     gc.collect()
     log_cuda_memory_usage("After processing context embeddings")
@@ -1215,6 +1367,7 @@ class UnifiedRAPTORSystem:
             similarity_threshold: float = 0.65,
             use_hybrid_search: bool = True,
             logger: Optional[logging.Logger] = None,
+            history_max_size: Optional[int] = None,
     ):
         # Core components
         self.embedding_model = embedding_model
@@ -1223,6 +1376,9 @@ class UnifiedRAPTORSystem:
         self.semantic_analyzer = SemanticAnalyzer(embedding_model_sentece)
         self.relevance_scorer = RelevanceScorer(cross_encoder_name)
         self.prompt_transformer = PromptTransformer(llm)
+        # Pre-normalized embeddings of past queries, filled incrementally
+        self.history_index = QueryHistoryIndex(max_size=history_max_size)
+        self._indexed_history = 0
 
         # RAPTOR-specific components
         self.raptor_tree = RAPTORTree()
@@ -1264,11 +1420,30 @@ class UnifiedRAPTORSystem:
         logger.addHandler(handler)
         return logger
 
-    def index_documents(self, documents: List[Document], batch_size: int = 50) -> None:
-        """Index documents into the vector store."""
+    def index_documents(self, documents: List[Document], batch_size: int = 50,
+                        incremental: bool = False, num_workers: Optional[int] = None,
+                        build_dir: str = "./index_build") -> Optional[IndexDiff]:
+        """Index documents into the vector store.
+
+        With incremental=True, chunks get stable ids from their document id and text hash, and only
+        new or changed chunks are embedded and added; chunks no longer in the corpus are deleted.
+        Returns the diff of the update in that case.
+
+        With num_workers, slices of the corpus are chunked, embedded and quantized by that many
+        worker processes into segments under build_dir, which are merged and then added. Rerunning
+        after a crash rebuilds only the slices that did not finish.
+        """
         try:
             documents = remove_duplicate_documents(documents)
             enable_mixed_precision(self.embedding_model.model)
+            if incremental:
+                diff = self._index_changed_chunks(documents, batch_size)
+                self._flush_vector_store()
+                return diff
+            if num_workers:
+                self._index_in_parallel(documents, num_workers, build_dir)
+                self._flush_vector_store()
+                return None
 
             for i in range(0, len(documents), batch_size):
                 batch_documents = documents[i:i + batch_size]
@@ -1292,10 +1467,58 @@ class UnifiedRAPTORSystem:
                 )
                 self.logger.info(f"Successfully indexed batch {i // batch_size + 1}")
                 clear_gpu_memory()
+            self._flush_vector_store()
         except Exception as e:
             self.logger.error(f"Failed to index documents: {str(e)}")
             raise
 
+    def _flush_vector_store(self) -> None:
+        """Store embeddings the vector store held back, e.g. to train its PQ codebook on enough of them."""
+        flush_pending = getattr(self.vector_store, "flush_pending", None)
+        if flush_pending is not None:
+            flush_pending()
+
+    def _index_in_parallel(self, documents: List[Document], num_workers: int, build_dir: str) -> None:
+        """Build the index with ParallelIndexBuilder and add the merged result."""
+        optimizer = getattr(self.vector_store, "storage_optimizer", None)
+        quantizer = optimizer.product_quantizer if optimizer is not None else None
+        builder = ParallelIndexBuilder(
+            build_dir,
+            embedding_factory=partial(
+                HuggingFaceEmbedding, self.embedding_model.model_name, device=self.embedding_model.device),
+            num_workers=num_workers,
+            chunk_fn=split_into_chunks,
+            pq_subspaces=quantizer.num_subspaces if quantizer is not None else None
+        )
+        index_dir = builder.run([doc.content for doc in documents], [doc.id for doc in documents])
+        self.vector_store.add_built_index(index_dir)
+        self.logger.info(f"Added parallel build from {index_dir}")
+
+    def _index_changed_chunks(self, documents: List[Document], batch_size: int) -> IndexDiff:
+        """Embed and add only the chunks missing from the vector store, and delete vanished ones."""
+        chunked_texts, chunked_doc_ids = split_into_chunks(
+            [doc.content for doc in documents], [doc.id for doc in documents])
+        chunk_ids = [chunk_id(doc_id, text) for doc_id, text in zip(chunked_doc_ids, chunked_texts)]
+        diff, rows = diff_chunks(chunk_ids, self.vector_store.get_ids())
+        self.vector_store.delete_documents(diff.deleted)
+
+        # batch_size counts documents elsewhere; here it bounds the chunks embedded per batch
+        for start in range(0, len(rows), batch_size):
+            batch_rows = rows[start:start + batch_size]
+            embeddings = self.embedding_model.embed([chunked_texts[row] for row in batch_rows])
+            if hasattr(embeddings, "cpu"):
+                embeddings = embeddings.cpu().numpy()
+            self.vector_store.add_documents(
+                documents=[chunked_texts[row] for row in batch_rows],
+                embeddings=np.asarray(embeddings).tolist(),
+                metadatas=[{"source": chunked_doc_ids[row]} for row in batch_rows],
+                ids=[chunk_ids[row] for row in batch_rows]
+            )
+            clear_gpu_memory()
+
+        self.logger.info(f"Incremental index update: {diff.summary()}")
+        return diff
+
     def query(self, question: str, n_results: int = 3) -> QueryResult:
         """Handle query with hierarchical, hybrid, and optimized retrieval."""
         # Step 1: Retrieve relevant query history
@@ -1380,12 +1603,23 @@ class UnifiedRAPTORSystem:
 
     def _get_relevant_history(self, query: str) -> List[QueryResult]:
         """Retrieve relevant past queries for context."""
-        if not self.prompt_transformer.history:
+        history = self.prompt_transformer.history
+        if not history:
             return []
-        query_embedding = self.embedding_model.embed([query])[0]
-        history_embeddings = self.embedding_model.embed([h.query for h in self.prompt_transformer.history])
-        similarities = cosine_similarity([query_embedding], history_embeddings)[0]
-        return [self.prompt_transformer.history[i] for i in np.where(similarities > 0.8)[0]]
+        if len(history) < self._indexed_history:
+            # History was reset externally; rebuild the index from scratch
+            self.history_index.clear()
+            self._indexed_history = 0
+
+        # Embed only queries added since the last lookup, together with the new query
+        new_entries = history[self._indexed_history:]
+        embeddings = self.embedding_model.embed([h.query for h in new_entries] + [query])
+        if new_entries:
+            self.history_index.add(new_entries, embeddings[:-1])
+            self._indexed_history = len(history)
+
+        matches = self.history_index.search(embeddings[-1], threshold=0.8)
+        return [entry for entry, _ in matches]
 
     def _bm25_search(self, query: str, n_results: int = 10) -> List[Dict[str, Any]]:
         """Perform BM25 keyword search."""
@@ -1518,7 +1752,7 @@ def main():
         documents = documents[:int(len(documents) * reduction_factor)]
 
     # Index documents into the system
-    raptor_system.index_documents(documents)
+    raptor_system.index_documents(documents, num_workers=PARALLEL_BUILD_WORKERS)
 
     # Define example questions
     questions = [
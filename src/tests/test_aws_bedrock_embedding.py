@@ -1,4 +1,9 @@
 import configparser
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 import numpy as np
 from my_rag.components.embeddings.aws_embedding import AWSBedrockEmbedding
 
@@ -101,5 +106,80 @@ def test_bedrock_embedding():
     print("\n✓ All tests passed successfully!")
 
 
+class StubBedrockHandler(BaseHTTPRequestHandler):
+    """
+    Minimal bedrock-runtime InvokeModel stub. Returns a deterministic embedding
+    per text and throttles every third request.
+    """
+
+    protocol_version = "HTTP/1.1"
+    request_count = 0
+    lock = threading.Lock()
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with StubBedrockHandler.lock:
+            StubBedrockHandler.request_count += 1
+            throttle = StubBedrockHandler.request_count % 3 == 0
+
+        time.sleep(0.01)  # Simulated network round-trip
+        if throttle:
+            payload = json.dumps({"message": "Rate exceeded"}).encode()
+            self.send_response(429)
+            self.send_header("x-amzn-ErrorType", "ThrottlingException")
+        else:
+            payload = json.dumps(
+                {"embedding": stub_embedding(body["inputText"]).tolist()}
+            ).encode()
+            self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def stub_embedding(text: str) -> np.ndarray:
+    seed = int(hashlib.sha1(text.encode()).hexdigest()[:8], 16)
+    return np.random.default_rng(seed).standard_normal(8)
+
+
+def test_bedrock_embedding_local_stub():
+    """
+    Test concurrency, ordering and throttling retries against a local stub of
+    the bedrock-runtime endpoint (no AWS credentials needed).
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubBedrockHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    embedding_model = AWSBedrockEmbedding(
+        aws_access_key_id="test",
+        aws_secret_access_key="test",
+        endpoint_url=f"http://127.0.0.1:{server.server_address[1]}",
+        max_concurrency=16,
+        requests_per_second=500,
+        backoff_base=0.01,
+    )
+
+    texts = [f"chunk number {i}" for i in range(200)]
+    start = time.perf_counter()
+    embeddings = embedding_model.embed(texts)
+    elapsed = time.perf_counter() - start
+    print(f"Embedded {len(texts)} texts in {elapsed:.2f}s")
+
+    # Results come back in input order despite throttling and retries
+    expected = np.stack([stub_embedding(text) for text in texts])
+    assert embeddings.shape == expected.shape
+    assert np.allclose(embeddings, expected)
+    assert StubBedrockHandler.request_count > len(texts)
+    print("✓ Local stub test passed")
+
+    embedding_model.clean_up()
+    server.shutdown()
+
+
 if __name__ == "__main__":
+    test_bedrock_embedding_local_stub()
     test_bedrock_embedding()
@@ -0,0 +1,81 @@
+import pytest
+from my_rag.components.batching import BatchPolicy, batched_apply, is_oom_error
+
+
+def fails_above(limit, batches):
+    """Batch function that runs out of memory on batches over `limit` items."""
+
+    def process(items):
+        if len(items) > limit:
+            raise RuntimeError("CUDA out of memory. Tried to allocate 2.00 GiB")
+        batches.append(len(items))
+        return [item * 2 for item in items]
+
+    return process
+
+
+def test_is_oom_error():
+    assert is_oom_error(MemoryError())
+    assert is_oom_error(RuntimeError("CUDA out of memory"))
+    assert not is_oom_error(RuntimeError("device-side assert triggered"))
+    assert not is_oom_error(ValueError("out of memory"))
+
+
+def test_token_budget_caps_batches():
+    policy = BatchPolicy(batch_size=8, max_tokens=100)
+    lengths = [10] * 5 + [40] * 5
+    # Five items of 10 tokens fit, then a 40-token item would cost 6 x 40
+    assert policy.next_batch_end(lengths, 0, len(lengths)) == 5
+    assert policy.next_batch_end(lengths, 5, len(lengths)) == 7
+    # A single item over the budget still forms a batch
+    assert policy.next_batch_end([500], 0, 1) == 1
+
+
+def test_adaptive_policy_backs_off_on_oom():
+    batches = []
+    policy = BatchPolicy(batch_size=32, adaptive=True, grow_after=1000)
+    items = list(range(100))
+
+    assert batched_apply(items, fails_above(10, batches), policy) == [
+        item * 2 for item in items
+    ]
+    assert max(batches) <= 10 and sum(batches) == len(items)
+    assert policy.current_batch_size <= 10
+
+
+def test_adaptive_policy_grows_back():
+    policy = BatchPolicy(batch_size=32, adaptive=True, grow_after=2)
+    assert policy.on_oom(32)
+    assert policy.current_batch_size == 16
+    policy.on_success()
+    policy.on_success()
+    assert policy.current_batch_size == 32
+
+    # Failing again while shrunk doubles the successes needed before growing
+    assert policy.on_oom(32)
+    assert policy.on_oom(16)
+    assert policy.current_batch_size == 8
+    for _ in range(3):
+        policy.on_success()
+    assert policy.current_batch_size == 8
+    policy.on_success()
+    assert policy.current_batch_size == 16
+
+
+def test_unrecoverable_errors_are_raised():
+    with pytest.raises(RuntimeError):
+        batched_apply(list(range(10)), fails_above(2, []), BatchPolicy(batch_size=8))
+
+    with pytest.raises(RuntimeError):
+        # Nothing left to shrink once a single item runs out of memory
+        batched_apply(
+            list(range(10)),
+            fails_above(0, []),
+            BatchPolicy(batch_size=8, adaptive=True),
+        )
+
+    def broken(items):
+        raise ValueError("bad input")
+
+    with pytest.raises(ValueError):
+        batched_apply(list(range(10)), broken, BatchPolicy(adaptive=True))
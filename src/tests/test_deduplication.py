@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+from my_rag.components.pipeline.base import PipelineData
+from my_rag.components.pipeline.deduplicator import ChunkDeduplicator
+from my_rag.components.pipeline.embedder import DocumentEmbedder
+from my_rag.components.utils import deduplicate_texts
+from tests.fake_embedding import HashEmbedding
+
+# 30 chunks of 12 distinct texts, with duplicates spread across batches
+CHUNKS = [f"chunk {i % 12}" for i in range(30)]
+
+
+def test_deduplicate_texts():
+    unique, inverse = deduplicate_texts(["b", "a", "b", "c", "a"])
+    assert unique == ["b", "a", "c"]
+    assert inverse == [0, 1, 0, 2, 1]
+
+
+@pytest.mark.parametrize("to_disk", [False, True])
+def test_duplicates_are_embedded_once_and_fanned_out(tmp_path, to_disk):
+    model = HashEmbedding()
+    pipeline_data = PipelineData(
+        documents=list(CHUNKS),
+        metadata=[{"doc_id": f"doc{i}"} for i in range(len(CHUNKS))],
+    )
+    pipeline_data = ChunkDeduplicator().run(pipeline_data)
+    assert len(pipeline_data.unique_documents) == 12
+
+    output_path = str(tmp_path / "embeddings.npy") if to_disk else None
+    embedder = DocumentEmbedder(model, batch_size=5, output_path=output_path)
+    embeddings = embedder.run(pipeline_data).embeddings
+
+    assert model.texts_embedded == 12
+    # One row per chunk, in chunk order
+    assert len(pipeline_data.documents) == len(CHUNKS)
+    assert np.allclose(embeddings, HashEmbedding().embed(CHUNKS))
+    if to_disk:
+        assert np.allclose(np.load(output_path, mmap_mode="r"), embeddings)
+
+
+def test_embed_to_memmap_without_duplicates(tmp_path):
+    path = str(tmp_path / "embeddings.npy")
+    texts = [f"text {i}" for i in range(11)]
+    embeddings = HashEmbedding().embed_to_memmap(texts, path, batch_size=4)
+    assert embeddings.shape == (11, 16)
+    assert np.allclose(np.load(path), HashEmbedding().embed(texts))
@@ -0,0 +1,116 @@
+import threading
+import numpy as np
+import pytest
+from my_rag.components.vectorstores.ivf_store import IVFVectorStore
+from my_rag.components.vectorstores.numpy_store import NumpyVectorStore
+from my_rag.components.vectorstores.quantized_store import QuantizedVectorStore
+from my_rag.components.vectorstores.sharded_store import ShardedVectorStore
+from tests.vector_search import brute_force_search
+
+STORES = {
+    "numpy": lambda **kwargs: NumpyVectorStore(**kwargs),
+    "ivf": lambda **kwargs: IVFVectorStore(nlist=16, nprobe=16, **kwargs),
+    "int8": lambda **kwargs: QuantizedVectorStore(
+        fit_size=1000, rescore_factor=20, **kwargs
+    ),
+    "sharded": lambda **kwargs: ShardedVectorStore(num_shards=2, **kwargs),
+}
+
+
+@pytest.fixture(params=list(STORES))
+def make_store(request):
+    """Creates stores of one type and cleans them up after the test."""
+    stores = []
+
+    def make(**kwargs):
+        store = STORES[request.param](distance_metric="l2", **kwargs)
+        stores.append(store)
+        return store
+
+    yield make
+    for store in stores:
+        store.clean_up()
+
+
+def expected_ids(vectors, queries, ids, live, k=10):
+    rows = np.flatnonzero(live)
+    expected, _ = brute_force_search(vectors[rows], queries, k, "l2")
+    return [[ids[rows[i]] for i in row] for row in expected]
+
+
+def test_delete_then_compact(corpus, make_store):
+    vectors, queries, ids, documents, metadatas = corpus
+    store = make_store(compaction_threshold=None)
+    store.add_embeddings(vectors, documents, metadatas, ids)
+
+    # Delete every query's nearest neighbours, so deletes change the results
+    nearest = {
+        doc_id for row in expected_ids(vectors, queries, ids, True, 3) for doc_id in row
+    }
+    deleted = sorted(nearest) + ids[::7]
+    assert store.delete(deleted + ["missing"]) == len(set(deleted))
+    assert store.delete(deleted) == 0
+
+    live = np.ones(len(ids), dtype=bool)
+    live[[ids.index(doc_id) for doc_id in set(deleted)]] = False
+    assert len(store) == live.sum()
+    assert sorted(store.get_ids()) == sorted(np.array(ids)[live])
+    expected = expected_ids(vectors, queries, ids, live)
+    assert store.search(queries, k=10)["ids"] == expected
+
+    assert store.compact() == len(set(deleted))
+    assert store.get_collection_stats()["deleted"] == 0
+    assert store.search(queries, k=10)["ids"] == expected
+
+    # Deleted ids can be added again
+    store.add_embeddings(vectors[:1], documents[:1], metadatas[:1], ids[:1])
+    assert ids[0] in store.get_ids()
+
+
+def test_delete_where(corpus, make_store):
+    vectors, queries, ids, documents, metadatas = corpus
+    store = make_store(compaction_threshold=None)
+    store.add_embeddings(vectors, documents, metadatas, ids)
+
+    live = np.array([metadata["group"] != 0 for metadata in metadatas])
+    assert store.delete_where({"group": 0}) == len(ids) - live.sum()
+    assert store.search(queries, k=10)["ids"] == expected_ids(
+        vectors, queries, ids, live
+    )
+
+
+def test_background_compaction_during_searches(corpus, make_store):
+    vectors, queries, ids, documents, metadatas = corpus
+    store = make_store(compaction_threshold=0.2)
+    store.add_embeddings(vectors, documents, metadatas, ids)
+    live = np.ones(len(ids), dtype=bool)
+    live[::2] = False
+    expected = expected_ids(vectors, queries, ids, live)
+
+    errors = []
+    stop = threading.Event()
+
+    def search():
+        while not stop.is_set():
+            try:
+                found = store.search(queries, k=10)["ids"]
+                # Every search sees a consistent store while rows are swapped
+                assert all(len(set(row)) == 10 for row in found)
+                assert store.get_collection_stats()["count"] <= len(ids)
+            except Exception as e:
+                errors.append(e)
+                return
+
+    searcher = threading.Thread(target=search)
+    searcher.start()
+    try:
+        # Past the threshold, a background compaction starts
+        store.delete(ids[::2])
+        store.wait_for_compaction()
+    finally:
+        stop.set()
+        searcher.join()
+
+    assert not errors
+    assert store.get_collection_stats()["deleted"] == 0
+    assert store.search(queries, k=10)["ids"] == expected
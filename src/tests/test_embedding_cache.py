@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+from my_rag.components.embeddings.cached_embedding import (
+    CachedEmbedding,
+    EmbeddingCacheStore,
+)
+from tests.fake_embedding import HashEmbedding
+
+TEXTS = [f"text {i}" for i in range(50)]
+
+
+def test_hits_and_misses(tmp_path):
+    model = HashEmbedding()
+    cached = CachedEmbedding(model, cache_dir=str(tmp_path))
+
+    first = cached.embed(TEXTS[:30])
+    assert (cached.hits, cached.misses) == (0, 30)
+    assert np.allclose(first, model.embed(TEXTS[:30]))
+
+    # Only the new texts reach the model, and repeats in a batch count as hits
+    model.texts_embedded = 0
+    second = cached.embed(TEXTS[20:] + TEXTS[:5])
+    assert model.texts_embedded == 20
+    assert (cached.hits, cached.misses) == (15, 50)
+    assert np.allclose(second, model.embed(TEXTS[20:] + TEXTS[:5]))
+
+
+def test_persists_across_instances(tmp_path):
+    CachedEmbedding(HashEmbedding(), cache_dir=str(tmp_path)).embed(TEXTS)
+
+    model = HashEmbedding()
+    cached = CachedEmbedding(model, cache_dir=str(tmp_path), lru_size=0)
+    vectors = cached.embed(TEXTS)
+    assert model.texts_embedded == 0 and cached.hits == len(TEXTS)
+    assert np.allclose(vectors, HashEmbedding().embed(TEXTS))
+
+
+@pytest.mark.parametrize(
+    "settings",
+    [
+        {"instruction": "Represent the query"},
+        {"max_length": 128},
+        {"load_config": {"backend": "onnx", "onnx_quantize": True}},
+        {"load_config": {"torch_dtype": "float16"}},
+    ],
+)
+def test_settings_get_separate_namespaces(tmp_path, settings):
+    CachedEmbedding(HashEmbedding(), cache_dir=str(tmp_path)).embed(TEXTS)
+
+    model = HashEmbedding()
+    load_config = settings.pop("load_config", None)
+    cached = CachedEmbedding(model, cache_dir=str(tmp_path), load_config=load_config)
+    cached.embed(TEXTS, **settings)
+    assert model.texts_embedded == len(TEXTS)
+
+
+def test_float16_store(tmp_path):
+    cached = CachedEmbedding(HashEmbedding(), cache_dir=str(tmp_path), dtype="float16")
+    vectors = cached.embed(TEXTS)
+    assert vectors.dtype == np.float32
+    assert np.allclose(vectors, HashEmbedding().embed(TEXTS), atol=1e-3)
+
+    # A store is never reopened with another dtype
+    store_path = next(iter(cached._stores.values())).path
+    with pytest.raises(ValueError):
+        EmbeddingCacheStore(store_path, dtype="float32")
+
+
+def test_store_grows_and_reopens(tmp_path):
+    store = EmbeddingCacheStore(str(tmp_path), initial_capacity=4)
+    vectors = np.arange(40, dtype=np.float32).reshape(10, 4)
+    store.add([f"key{i}" for i in range(10)], vectors)
+    store.close()
+
+    reopened = EmbeddingCacheStore(str(tmp_path))
+    assert len(reopened) == 10 and "key9" in reopened
+    assert (reopened.get("key3") == vectors[3]).all()
+    assert reopened.get("missing") is None
@@ -0,0 +1,70 @@
+import json
+from my_rag.components.pipeline.base import PipelineData
+from my_rag.components.pipeline.embedder import DocumentEmbedder
+from my_rag.components.pipeline.incremental_indexer import IncrementalIndexer
+from my_rag.components.utils import chunk_id
+from my_rag.components.vectorstores.numpy_store import NumpyVectorStore
+from tests.fake_embedding import HashEmbedding
+
+
+def index(store, indexer, model, chunks):
+    """Runs one indexing pass over (doc_id, text) chunks."""
+    pipeline_data = PipelineData(
+        documents=[text for _, text in chunks],
+        metadata=[{"doc_id": doc_id} for doc_id, _ in chunks],
+    )
+    pipeline_data = indexer.run(pipeline_data)
+    pipeline_data = DocumentEmbedder(model).run(pipeline_data)
+    if pipeline_data.documents:
+        store.add_embeddings(
+            pipeline_data.embeddings,
+            pipeline_data.documents,
+            pipeline_data.metadata,
+            pipeline_data.chunk_ids,
+        )
+    return indexer.last_diff
+
+
+def test_only_changed_chunks_are_embedded(tmp_path):
+    store = NumpyVectorStore()
+    diff_path = str(tmp_path / "diff.json")
+    indexer = IncrementalIndexer(store, diff_path=diff_path)
+    model = HashEmbedding()
+    chunks = [("a", "alpha"), ("a", "beta"), ("a", "beta"), ("b", "gamma")]
+
+    diff = index(store, indexer, model, chunks)
+    # The repeated chunk of document 'a' is indexed once
+    assert len(diff.added) == 3 and not diff.unchanged and not diff.deleted
+    assert model.texts_embedded == 3
+    assert sorted(store.get_ids()) == sorted(
+        chunk_id(doc_id, text) for doc_id, text in set(chunks)
+    )
+
+    # Edit one chunk, drop document 'b' and add document 'c'
+    model.texts_embedded = 0
+    diff = index(store, indexer, model, [("a", "alpha"), ("a", "BETA"), ("c", "delta")])
+    assert diff.added == [chunk_id("a", "BETA"), chunk_id("c", "delta")]
+    assert diff.unchanged == [chunk_id("a", "alpha")]
+    assert sorted(diff.deleted) == sorted(
+        [chunk_id("a", "beta"), chunk_id("b", "gamma")]
+    )
+    assert model.texts_embedded == 2
+    assert sorted(store.get_ids()) == sorted(diff.added + diff.unchanged)
+    with open(diff_path) as f:
+        assert json.load(f)["added"] == 2
+
+    # Nothing changed: nothing is embedded
+    model.calls = 0
+    diff = index(store, indexer, model, [("a", "alpha"), ("a", "BETA"), ("c", "delta")])
+    assert not diff.added and not diff.deleted and model.calls == 0
+
+
+def test_keeps_missing_chunks_when_asked():
+    store = NumpyVectorStore()
+    model = HashEmbedding()
+    index(store, IncrementalIndexer(store), model, [("a", "alpha"), ("b", "beta")])
+
+    indexer = IncrementalIndexer(store, delete_missing=False)
+    diff = index(store, indexer, model, [("b", "beta")])
+    assert diff.unchanged == [chunk_id("b", "beta")] and not diff.deleted
+    assert len(store) == 2
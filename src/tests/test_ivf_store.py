@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+from my_rag.components.vectorstores.ivf_store import IVFVectorStore
+from tests.vector_search import brute_force_search, recall
+
+
+@pytest.mark.parametrize("metric", ["cosine", "ip", "l2"])
+def test_probing_every_list_is_exact(corpus, metric):
+    vectors, queries, ids, documents, metadatas = corpus
+    store = IVFVectorStore(distance_metric=metric, nlist=16, nprobe=16)
+    store.add_embeddings(vectors[:1500], documents[:1500], metadatas[:1500], ids[:1500])
+    assert store.is_trained
+    # Rows added after training go to the unsorted tail
+    store.add_embeddings(vectors[1500:], documents[1500:], metadatas[1500:], ids[1500:])
+
+    expected, expected_distances = brute_force_search(vectors, queries, 10, metric)
+    results = store.search(queries, k=10)
+
+    assert results["ids"] == [[ids[i] for i in row] for row in expected]
+    assert np.allclose(results["distances"], expected_distances, atol=1e-4)
+
+
+@pytest.mark.parametrize("metric", ["cosine", "ip", "l2"])
+def test_recall_with_few_probes(corpus, metric):
+    vectors, queries, ids, documents, metadatas = corpus
+    # Uneven norms, so inner product and l2 rankings differ
+    vectors = vectors * np.linspace(0.5, 2.0, len(vectors), dtype=np.float32)[:, None]
+    store = IVFVectorStore(distance_metric=metric, nlist=16, nprobe=4)
+    store.add_embeddings(vectors, documents, metadatas, ids)
+
+    expected, _ = brute_force_search(vectors, queries, 10, metric)
+    results = store.search(queries, k=10)
+
+    assert recall(results["ids"], [[ids[i] for i in row] for row in expected]) > 0.5
+
+
+def test_ip_probes_lists_by_inner_product(corpus):
+    vectors, queries, ids, documents, metadatas = corpus
+    store = IVFVectorStore(distance_metric="ip", nlist=16, nprobe=1)
+    store.add_embeddings(vectors, documents, metadatas, ids)
+
+    probed = store._probe(queries, 1)[:, 0]
+    assert (probed == np.argmax(queries @ store.centroids.T, axis=1)).all()
+
+
+def test_search_is_exact_before_training(corpus):
+    vectors, queries, ids, documents, metadatas = corpus
+    store = IVFVectorStore(distance_metric="l2", nlist=16, nprobe=1)
+    store.add_embeddings(vectors[:100], documents[:100], metadatas[:100], ids[:100])
+    assert not store.is_trained
+
+    expected, _ = brute_force_search(vectors[:100], queries, 5, "l2")
+    assert store.search(queries, k=5)["ids"] == [
+        [ids[i] for i in row] for row in expected
+    ]
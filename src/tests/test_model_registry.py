@@ -0,0 +1,73 @@
+import threading
+import pytest
+from my_rag.components.model_registry import ModelRegistry
+from tests.fake_embedding import HashEmbedding
+
+
+def test_shares_models_and_counts_references():
+    registry = ModelRegistry()
+    first = registry.acquire(HashEmbedding, dim=8)
+    second = registry.acquire(HashEmbedding, dim=8)
+    other = registry.acquire(HashEmbedding, dim=4)
+
+    assert first is second and first is not other
+    assert sorted(registry.loaded_models().values()) == [1, 2]
+
+    registry.release(first)
+    assert not first.cleaned_up
+    registry.release(second)
+    # The last release unloads the model
+    assert first.cleaned_up
+    assert list(registry.loaded_models().values()) == [1]
+
+    # A released model is loaded again on the next acquire
+    assert registry.acquire(HashEmbedding, dim=8) is not first
+
+
+def test_release_of_unknown_model_raises():
+    registry = ModelRegistry()
+    with pytest.raises(ValueError):
+        registry.release(HashEmbedding())
+
+    model = registry.acquire(HashEmbedding)
+    registry.release(model)
+    with pytest.raises(ValueError):
+        registry.release(model)
+
+
+def test_use_releases_on_error():
+    registry = ModelRegistry()
+    with pytest.raises(RuntimeError):
+        with registry.use(HashEmbedding) as model:
+            raise RuntimeError("evaluation failed")
+    assert model.cleaned_up and not registry.loaded_models()
+
+
+def test_concurrent_acquires_load_once():
+    registry = ModelRegistry()
+    loads = []
+
+    def factory():
+        loads.append(1)
+        return HashEmbedding()
+
+    models = []
+    threads = [
+        threading.Thread(target=lambda: models.append(registry.acquire(factory)))
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(loads) == 1 and all(model is models[0] for model in models)
+    assert list(registry.loaded_models().values()) == [8]
+
+
+def test_clear_unloads_everything():
+    registry = ModelRegistry()
+    model = registry.acquire(HashEmbedding)
+    registry.acquire(HashEmbedding)
+    registry.clear()
+    assert model.cleaned_up and not registry.loaded_models()
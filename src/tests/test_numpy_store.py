@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+from my_rag.components.vectorstores.numpy_store import NumpyVectorStore
+from tests.vector_search import brute_force_search
+
+
+@pytest.mark.parametrize("metric", ["cosine", "ip", "l2"])
+def test_search_matches_brute_force(corpus, metric):
+    vectors, queries, ids, documents, metadatas = corpus
+    # Tiny blocks so results are merged across many query and row blocks
+    store = NumpyVectorStore(
+        distance_metric=metric, query_block_size=7, max_block_bytes=4096
+    )
+    # Several adds, so the store grows past its initial capacity
+    for start in range(0, len(vectors), 700):
+        end = start + 700
+        store.add_embeddings(
+            vectors[start:end],
+            documents[start:end],
+            metadatas[start:end],
+            ids[start:end],
+        )
+
+    expected, expected_distances = brute_force_search(vectors, queries, 10, metric)
+    results = store.search(queries, k=10)
+
+    assert results["ids"] == [[ids[i] for i in row] for row in expected]
+    assert np.allclose(results["distances"], expected_distances, atol=1e-4)
+    assert results["documents"][0][0] == documents[expected[0][0]]
+
+
+def test_search_with_filter(corpus):
+    vectors, queries, ids, documents, metadatas = corpus
+    store = NumpyVectorStore(distance_metric="l2")
+    store.add_embeddings(vectors, documents, metadatas, ids)
+
+    rows = np.array(
+        [i for i, metadata in enumerate(metadatas) if metadata["group"] == 1]
+    )
+    expected, _ = brute_force_search(vectors[rows], queries, 5, "l2")
+    results = store.search(queries, k=5, filter_dict={"group": 1})
+
+    assert results["ids"] == [[ids[rows[i]] for i in row] for row in expected]
+
+
+def test_add_rejects_existing_ids(corpus):
+    vectors, queries, ids, documents, metadatas = corpus
+    store = NumpyVectorStore()
+    store.add_embeddings(vectors[:10], documents[:10], metadatas[:10], ids[:10])
+
+    with pytest.raises(ValueError):
+        store.add_embeddings(queries[:1], ["replaced"], None, [ids[3]])
+    with pytest.raises(ValueError):
+        store.add_embeddings(queries[:2], ["a", "b"], None, ["new", "new"])
+    assert len(store) == 10
@@ -0,0 +1,106 @@
+import os
+import numpy as np
+import pytest
+from my_rag.components.pipeline.parallel_index_builder import (
+    ParallelIndexBuilder,
+    iter_index_batches,
+    load_index,
+)
+from my_rag.components.utils import chunk_id
+from my_rag.components.vectorstores.numpy_store import NumpyVectorStore
+from my_rag.components.vectorstores.product_quantizer import ProductQuantizer
+from tests.fake_embedding import HashEmbedding
+
+DOCUMENTS = [f"first {i}\nsecond {i % 7}" for i in range(40)]
+DOCUMENT_IDS = [f"doc{i}" for i in range(40)]
+
+
+def split_lines(documents, document_ids):
+    """Chunks each document into its lines; picklable for the workers."""
+    texts, chunk_doc_ids = [], []
+    for document, doc_id in zip(documents, document_ids):
+        for line in document.split("\n"):
+            if line == "fail":
+                raise RuntimeError("chunking failed")
+            texts.append(line)
+            chunk_doc_ids.append(doc_id)
+    return texts, chunk_doc_ids
+
+
+def make_builder(output_dir, **kwargs):
+    return ParallelIndexBuilder(
+        str(output_dir),
+        HashEmbedding,
+        num_workers=2,
+        threads_per_worker=1,
+        slice_size=10,
+        chunk_fn=split_lines,
+        max_retries=0,
+        # Forked workers skip re-importing torch, which keeps the tests fast
+        start_method="fork",
+        **kwargs,
+    )
+
+
+def test_build_merge_and_load(tmp_path):
+    builder = make_builder(tmp_path, pq_subspaces=4, codebook_sample_size=40)
+    # The last document repeats the first, so its chunks are merged once
+    merged_dir = builder.run(DOCUMENTS + DOCUMENTS[:1], DOCUMENT_IDS + DOCUMENT_IDS[:1])
+
+    texts, chunk_doc_ids = split_lines(DOCUMENTS, DOCUMENT_IDS)
+    expected_ids = [
+        chunk_id(doc_id, text) for text, doc_id in zip(texts, chunk_doc_ids)
+    ]
+    batches = list(iter_index_batches(merged_dir, batch_size=25))
+    assert [doc_id for batch in batches for doc_id in batch["ids"]] == expected_ids
+
+    # Vectors are those of the model, and the codes encode them
+    vectors = np.concatenate([batch["embeddings"] for batch in batches])
+    codes = np.concatenate([batch["codes"] for batch in batches])
+    assert np.allclose(vectors, HashEmbedding().embed(texts))
+    quantizer = ProductQuantizer.load(os.path.join(merged_dir, "codebook.npz"))
+    assert (codes == quantizer.encode(vectors)).all()
+
+    store = NumpyVectorStore()
+    assert load_index(merged_dir, store, batch_size=25) == len(expected_ids)
+    results = store.search(HashEmbedding().embed(["first 3"]), k=1)
+    assert results["documents"] == [["first 3"]]
+    assert results["metadatas"][0][0]["doc_id"] == "doc3"
+
+
+def test_rebuild_only_redoes_missing_slices(tmp_path):
+    builder = make_builder(tmp_path)
+    slice_dirs = builder.build(DOCUMENTS, DOCUMENT_IDS)
+    assert len(slice_dirs) == 4
+    manifests = [os.path.join(slice_dir, "manifest.json") for slice_dir in slice_dirs]
+    built_at = [os.path.getmtime(manifest) for manifest in manifests]
+
+    # Lose one slice, and change the documents of another
+    os.remove(manifests[1])
+    documents = list(DOCUMENTS)
+    documents[35] = "edited"
+    builder.build(documents, DOCUMENT_IDS)
+
+    assert os.path.getmtime(manifests[0]) == built_at[0]
+    assert os.path.getmtime(manifests[2]) == built_at[2]
+    assert os.path.exists(manifests[1])
+    assert os.path.getmtime(manifests[3]) != built_at[3]
+
+
+def test_failed_slices_are_reported_and_resumed(tmp_path):
+    documents = list(DOCUMENTS)
+    documents[15] = "fail"
+    builder = make_builder(tmp_path)
+    with pytest.raises(RuntimeError):
+        builder.build(documents, DOCUMENT_IDS)
+
+    # The other slices are complete, so fixing the input resumes the build
+    complete = [
+        os.path.exists(os.path.join(str(tmp_path), f"slice_{i:05d}", "manifest.json"))
+        for i in range(4)
+    ]
+    assert complete == [True, False, True, True]
+    merged_dir = builder.run(DOCUMENTS, DOCUMENT_IDS)
+    assert sum(len(batch["ids"]) for batch in iter_index_batches(merged_dir)) == len(
+        set(zip(*split_lines(DOCUMENTS, DOCUMENT_IDS)))
+    )
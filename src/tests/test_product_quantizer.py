@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+from my_rag.components.vectorstores.product_quantizer import (
+    CodebookBuffer,
+    ProductQuantizer,
+)
+
+
+@pytest.fixture
+def vectors():
+    return np.random.default_rng(0).standard_normal((1000, 32)).astype(np.float32)
+
+
+def test_adc_scores_match_decoded_vectors(vectors):
+    quantizer = ProductQuantizer(8, codebook_size=64).train(vectors)
+    codes = quantizer.encode(vectors)
+    assert codes.shape == (len(vectors), 8) and codes.dtype == np.uint8
+
+    queries = vectors[:5] + 0.1
+    scores = quantizer.adc_scores(quantizer.lookup_tables(queries), codes)
+    assert np.allclose(scores, queries @ quantizer.decode(codes).T, atol=1e-3)
+
+    # Reconstruction is far closer than a random vector
+    error = np.linalg.norm(vectors - quantizer.decode(codes), axis=1).mean()
+    assert error < 0.7 * np.linalg.norm(vectors, axis=1).mean()
+
+
+def test_save_and_load(vectors, tmp_path):
+    path = str(tmp_path / "codebook.npz")
+    quantizer = ProductQuantizer(4, codebook_size=32).train(vectors)
+    quantizer.save(path)
+
+    loaded = ProductQuantizer.load(path)
+    assert (loaded.num_subspaces, loaded.codebook_size) == (4, 32)
+    assert (loaded.encode(vectors) == quantizer.encode(vectors)).all()
+
+
+def test_rejects_subspaces_not_dividing_dimension(vectors):
+    with pytest.raises(ValueError):
+        ProductQuantizer(5).train(vectors)
+
+
+def test_buffer_holds_vectors_back_until_training_size(vectors, tmp_path):
+    path = str(tmp_path / "codebook.npz")
+    buffer = CodebookBuffer(8, path, codebook_size=16, training_size=500)
+    ids = [f"id{i}" for i in range(len(vectors))]
+
+    released_ids, codes = buffer.add(ids[:20], vectors[:20])
+    assert released_ids == [] and len(codes) == 0 and not buffer.is_trained
+
+    released_ids, codes = buffer.add(ids[20:500], vectors[20:500])
+    assert released_ids == ids[:500] and codes.shape == (500, 8)
+    assert buffer.quantizer.codebooks.shape[1] == 16 and not buffer.pending
+
+    # Once trained, vectors are encoded as they arrive
+    released_ids, codes = buffer.add(ids[500:], vectors[500:])
+    assert released_ids == ids[500:] and len(codes) == 500
+
+    # The saved codebook is reused by a new buffer of the same shape
+    reopened = CodebookBuffer(8, path, codebook_size=16)
+    assert reopened.is_trained and not reopened.discarded_saved
+    assert CodebookBuffer(4, path, codebook_size=16).discarded_saved
+
+
+def test_buffer_never_trains_a_shrunken_codebook(vectors):
+    buffer = CodebookBuffer(8, codebook_size=64)
+    ids = [f"id{i}" for i in range(len(vectors))]
+    buffer.add(ids[:30], vectors[:30])
+    buffer.discard(ids[:5])
+
+    # Too few vectors for 64 centroids: flushing keeps them held back
+    released_ids, _ = buffer.flush()
+    assert released_ids == [] and len(buffer.pending) == 25
+
+    with pytest.raises(ValueError):
+        buffer.use(ProductQuantizer(8, codebook_size=16).train(vectors))
+
+    buffer.add(ids[30:100], vectors[30:100])
+    released_ids, codes = buffer.flush()
+    assert released_ids == ids[5:100] and len(codes) == 95
+    assert buffer.quantizer.codebooks.shape[1] == 64
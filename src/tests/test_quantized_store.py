@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+from my_rag.components.vectorstores.product_quantizer import DEFAULT_CODEBOOK_SIZE
+from my_rag.components.vectorstores.quantized_store import (
+    IVFQuantizedVectorStore,
+    QuantizedVectorStore,
+)
+from tests.vector_search import brute_force_search, pairwise_distances, recall
+
+MIN_RECALL = {"int8": 0.95, "binary": 0.5, "pq": 0.6}
+
+
+def make_store(tmp_path, **kwargs):
+    kwargs.setdefault("pq_subspaces", 8)
+    return QuantizedVectorStore(vectors_path=str(tmp_path / "vectors.npy"), **kwargs)
+
+
+def expected_ids(vectors, queries, ids, k, metric):
+    rows, _ = brute_force_search(vectors, queries, k, metric)
+    return [[ids[i] for i in row] for row in rows]
+
+
+@pytest.mark.parametrize("quantization", ["int8", "binary", "pq"])
+@pytest.mark.parametrize("metric", ["cosine", "ip", "l2"])
+def test_recall_and_exact_distances(corpus, tmp_path, quantization, metric):
+    vectors, queries, ids, documents, metadatas = corpus
+    store = make_store(
+        tmp_path, distance_metric=metric, quantization=quantization, fit_size=1000
+    )
+    store.add_embeddings(vectors, documents, metadatas, ids)
+    assert store.is_fitted
+
+    results = store.search(queries, k=10)
+    expected = expected_ids(vectors, queries, ids, 10, metric)
+    assert recall(results["ids"], expected) >= MIN_RECALL[quantization]
+
+    # Candidates are re-scored with the full vectors, so distances are exact
+    all_distances = pairwise_distances(vectors, queries, metric)
+    for query, (found, distances) in enumerate(
+        zip(results["ids"], results["distances"])
+    ):
+        rows = [ids.index(doc_id) for doc_id in found]
+        assert np.allclose(distances, all_distances[query, rows], atol=1e-4)
+    store.clean_up()
+
+
+@pytest.mark.parametrize("quantization", ["int8", "pq"])
+def test_search_is_exact_until_fitted(corpus, tmp_path, quantization):
+    vectors, queries, ids, documents, metadatas = corpus
+    store = make_store(tmp_path, distance_metric="l2", quantization=quantization)
+    # A small first batch must not fix the quantizer
+    store.add_embeddings(vectors[:20], documents[:20], metadatas[:20], ids[:20])
+    store.add_embeddings(vectors[20:], documents[20:], metadatas[20:], ids[20:])
+    assert not store.is_fitted
+
+    assert store.search(queries, k=10)["ids"] == expected_ids(
+        vectors, queries, ids, 10, "l2"
+    )
+
+    store.fit_quantizer()
+    assert store.is_fitted
+    if quantization == "pq":
+        assert store._pq.codebooks.shape[1] == DEFAULT_CODEBOOK_SIZE
+    results = store.search(queries, k=10)
+    assert recall(results["ids"], expected_ids(vectors, queries, ids, 10, "l2")) >= (
+        MIN_RECALL[quantization]
+    )
+    store.clean_up()
+
+
+def test_pq_rejects_fit_size_below_codebook_size(tmp_path):
+    with pytest.raises(ValueError):
+        make_store(tmp_path, quantization="pq", fit_size=DEFAULT_CODEBOOK_SIZE - 1)
+
+
+def test_ivf_quantized_recall(corpus, tmp_path):
+    vectors, queries, ids, documents, metadatas = corpus
+    store = IVFQuantizedVectorStore(
+        distance_metric="cosine",
+        nlist=16,
+        nprobe=16,
+        fit_size=1000,
+        vectors_path=str(tmp_path / "vectors.npy"),
+    )
+    store.add_embeddings(vectors, documents, metadatas, ids)
+    assert store.is_trained and store.is_fitted
+
+    results = store.search(queries, k=10)
+    expected = expected_ids(vectors, queries, ids, 10, "cosine")
+    assert recall(results["ids"], expected) >= MIN_RECALL["int8"]
+    store.clean_up()
@@ -1,4 +1,5 @@
 from my_rag.components.embeddings.huggingface_embedding import HuggingFaceEmbedding
+from my_rag.components.utils import deduplicate_texts
 from langchain_community.document_loaders import PyPDFDirectoryLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from my_rag.components.llms.huggingface_llm import HuggingFaceLLM
@@ -8,6 +9,7 @@ from abc import ABC, abstractmethod
 from dataclasses import dataclass
 from pathlib import Path
 import pandas as pd
+import numpy as np
 import chromadb
 import logging
 import torch
@@ -181,6 +183,9 @@ def create_document_embeddings(
         embed_document_method="embed_documents",
         instruction="",
         max_length=None,
+        output_path=None,
+        max_tokens=None,
+        adaptive_batching=True,
 ):
     contexts = dataframe[context_field].tolist()
     document_ids = dataframe[doc_id_field].tolist()
@@ -201,18 +206,40 @@ def create_document_embeddings(
 
     log_cuda_memory_usage("Before creating context embeddings")
 
-    if hasattr(embedding_model, embed_document_method):
+    # Embed each distinct chunk once; vectors are fanned back out below
+    all_chunked_texts = chunked_texts
+    chunked_texts, duplicate_inverse = deduplicate_texts(all_chunked_texts)
+    if len(chunked_texts) < len(all_chunked_texts):
+        logger.info(f"Removed {len(all_chunked_texts) - len(chunked_texts)} duplicate chunks before embedding")
+
+    # Cap padded tokens per batch and halve batches on OOM instead of failing
+    batching_kwargs = {"max_tokens": max_tokens, "adaptive_batching": adaptive_batching}
+
+    if output_path is not None and hasattr(embedding_model, "embed_to_memmap"):
+        # Stream batches into an on-disk array so RAM stays bounded for large corpora; duplicates
+        # are fanned out into it block by block
+        embeddings = embedding_model.embed_to_memmap(
+            chunked_texts, output_path, inverse=duplicate_inverse, batch_size=batch_size,
+            instruction=instruction, max_length=max_length, **batching_kwargs
+        )
+        chunked_texts = all_chunked_texts
+    elif hasattr(embedding_model, embed_document_method):
         embed_func = getattr(embedding_model, embed_document_method)
         embeddings = embed_func([f"{instruction}{text}" for text in chunked_texts] if instruction else chunked_texts)
     else:
         embeddings = embedding_model.embed(
-            chunked_texts, batch_size=batch_size, instruction=instruction, max_length=max_length
+            chunked_texts, batch_size=batch_size, instruction=instruction, max_length=max_length,
+            **batching_kwargs
         )
 
     if embeddings is None or len(embeddings) == 0:
         raise RuntimeError("Embedding function returned an empty result.")
 
-    embeddings = embeddings.cpu().numpy()
+    if hasattr(embeddings, "cpu"):
+        embeddings = embeddings.cpu().numpy()
+    if len(chunked_texts) < len(all_chunked_texts):
+        embeddings = np.asarray(embeddings)[duplicate_inverse]
+        chunked_texts = all_chunked_texts
     torch.cuda.empty_cache()
     gc.collect()
     log_cuda_memory_usage("After processing context embeddings")
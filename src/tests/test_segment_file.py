@@ -0,0 +1,104 @@
+import os
+import numpy as np
+import pytest
+from my_rag.components.vectorstores.segment_file import SegmentFile
+
+
+@pytest.fixture
+def segment(tmp_path):
+    """A segment of 200 uint8 vectors in four commits, and its contents."""
+    rng = np.random.default_rng(0)
+    segment = SegmentFile(str(tmp_path / "codes.seg"))
+    contents = {}
+    for batch in range(4):
+        ids = [f"doc{batch}_{i}" for i in range(50)]
+        vectors = rng.integers(0, 256, (50, 16), dtype=np.uint8)
+        segment.append(ids, vectors)
+        contents.update(zip(ids, vectors))
+    return segment, contents
+
+
+def assert_contents(segment, contents):
+    assert sorted(segment.ids) == sorted(contents)
+    ids = list(contents)
+    assert (segment.get(ids) == np.array([contents[i] for i in ids])).all()
+    assert segment.verify()
+
+
+def test_reopen(segment):
+    segment, contents = segment
+    # Re-appending an id replaces its vector
+    segment.append(["doc0_0"], np.zeros((1, 16), dtype=np.uint8))
+    contents["doc0_0"] = np.zeros(16, dtype=np.uint8)
+    assert segment.delete(["doc1_1", "doc1_1", "missing"]) == 1
+    del contents["doc1_1"]
+
+    assert_contents(segment, contents)
+    reopened = SegmentFile(segment.path)
+    assert reopened.dim == 16 and reopened.dtype == np.uint8
+    assert_contents(reopened, contents)
+
+
+def test_reopen_after_torn_write(segment):
+    segment, contents = segment
+    # Garbage after the last commit, including a stray magic
+    with open(segment.path, "ab") as f:
+        f.write(os.urandom(3000) + b"RAGSEG02" + os.urandom(10))
+
+    reopened = SegmentFile(segment.path)
+    assert_contents(reopened, contents)
+
+    # New commits go after the last valid one
+    reopened.append(["new"], np.ones((1, 16), dtype=np.uint8))
+    contents["new"] = np.ones(16, dtype=np.uint8)
+    assert_contents(SegmentFile(segment.path), contents)
+
+
+def test_reopen_after_truncated_commit(segment):
+    segment, contents = segment
+    segment.append(["lost"], np.ones((1, 16), dtype=np.uint8))
+    with open(segment.path, "r+b") as f:
+        f.truncate(os.path.getsize(segment.path) - 3)
+
+    assert_contents(SegmentFile(segment.path), contents)
+
+
+def test_compact(segment):
+    segment, contents = segment
+    deleted = [doc_id for doc_id in contents if doc_id.endswith("_7")]
+    segment.delete(deleted)
+    for doc_id in deleted:
+        del contents[doc_id]
+    assert segment.dead_fraction > 0
+
+    size = os.path.getsize(segment.path)
+    segment.compact()
+    assert os.path.getsize(segment.path) < size
+    assert segment.vectors.shape == (len(contents), 16)
+    assert_contents(segment, contents)
+    assert_contents(SegmentFile(segment.path), contents)
+
+    # Compacting away every row removes the file
+    segment.delete(segment.ids)
+    segment.compact()
+    assert len(segment) == 0 and not os.path.exists(segment.path)
+
+
+def test_append_batches_writes_one_commit(tmp_path):
+    path = str(tmp_path / "vectors.seg")
+    batches = [
+        ([f"doc{batch}_{i}" for i in range(10)], np.full((10, 4), batch, np.float32))
+        for batch in range(5)
+    ]
+    SegmentFile(path, dtype="float32").append_batches(iter(batches))
+
+    segment = SegmentFile(path)
+    assert len(segment) == 50 and len(segment._extents) == 1
+    assert (segment.get(["doc3_2"]) == 3).all()
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / "other.seg"
+    path.write_bytes(b"not a segment file" * 10)
+    with pytest.raises(ValueError):
+        SegmentFile(str(path))
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+from my_rag.components.vectorstores.sharded_store import ShardedVectorStore
+from tests.vector_search import brute_force_search
+
+
+@pytest.fixture
+def make_store():
+    """Creates sharded stores and stops their workers after the test."""
+    stores = []
+
+    def make(**kwargs):
+        store = ShardedVectorStore(num_shards=3, **kwargs)
+        stores.append(store)
+        return store
+
+    yield make
+    for store in stores:
+        store.clean_up()
+
+
+@pytest.mark.parametrize("metric", ["cosine", "ip", "l2"])
+def test_search_matches_brute_force(corpus, make_store, metric):
+    vectors, queries, ids, documents, metadatas = corpus
+    store = make_store(distance_metric=metric)
+    # Uneven batches, spread over the shards
+    store.add_embeddings(vectors[:1234], documents[:1234], metadatas[:1234], ids[:1234])
+    store.add_embeddings(vectors[1234:], documents[1234:], metadatas[1234:], ids[1234:])
+    assert len(store) == len(vectors)
+    assert sum(store.get_collection_stats()["shard_sizes"]) == len(vectors)
+
+    expected, expected_distances = brute_force_search(vectors, queries, 10, metric)
+    results = store.search(queries, k=10)
+
+    assert results["ids"] == [[ids[i] for i in row] for row in expected]
+    assert np.allclose(results["distances"], expected_distances, atol=1e-4)
+    assert results["metadatas"][0][0] == metadatas[expected[0][0]]
+
+
+def test_search_with_filter(corpus, make_store):
+    vectors, queries, ids, documents, metadatas = corpus
+    store = make_store(distance_metric="l2")
+    store.add_embeddings(vectors, documents, metadatas, ids)
+
+    rows = np.array(
+        [i for i, metadata in enumerate(metadatas) if metadata["group"] == 2]
+    )
+    expected, _ = brute_force_search(vectors[rows], queries, 5, "l2")
+    results = store.search(queries, k=5, filter_dict={"group": 2})
+
+    assert results["ids"] == [[ids[rows[i]] for i in row] for row in expected]
@@ -0,0 +1,105 @@
+import numpy as np
+import pytest
+from my_rag.components.vectorstores.ivf_store import IVFVectorStore
+from my_rag.components.vectorstores.numpy_store import NumpyVectorStore
+from my_rag.components.vectorstores.quantized_store import (
+    IVFQuantizedVectorStore,
+    QuantizedVectorStore,
+)
+from my_rag.components.vectorstores.sharded_store import ShardedVectorStore
+
+STORES = {
+    "numpy": lambda metric: NumpyVectorStore(distance_metric=metric),
+    "ivf": lambda metric: IVFVectorStore(distance_metric=metric, nlist=16, nprobe=4),
+    "int8": lambda metric: QuantizedVectorStore(distance_metric=metric, fit_size=1000),
+    "pq": lambda metric: QuantizedVectorStore(
+        distance_metric=metric, quantization="pq", pq_subspaces=8, fit_size=1000
+    ),
+    "ivf_pq": lambda metric: IVFQuantizedVectorStore(
+        distance_metric=metric,
+        nlist=16,
+        nprobe=4,
+        quantization="pq",
+        pq_subspaces=8,
+        fit_size=1000,
+    ),
+}
+
+
+@pytest.mark.parametrize("store_type", list(STORES))
+@pytest.mark.parametrize("metric", ["cosine", "l2"])
+def test_round_trip(corpus, tmp_path, store_type, metric):
+    vectors, queries, ids, documents, metadatas = corpus
+    store = STORES[store_type](metric)
+    store.add_embeddings(vectors[:1900], documents[:1900], metadatas[:1900], ids[:1900])
+    store.delete(["id5", "id7"])
+
+    path = str(tmp_path / "snapshot")
+    count = store.export_snapshot(path)
+    restored = STORES[store_type](metric)
+    assert restored.import_snapshot(path) == count == len(store)
+    # A compatible snapshot is adopted as is, with its vectors memory-mapped
+    assert isinstance(restored._embeddings, np.memmap)
+
+    for filter_dict in [None, {"group": 1}]:
+        expected = store.search(queries, k=10, filter_dict=filter_dict)
+        results = restored.search(queries, k=10, filter_dict=filter_dict)
+        assert results["ids"] == expected["ids"]
+        assert np.allclose(results["distances"], expected["distances"], atol=1e-5)
+
+    # The restored store keeps working after adds and deletes
+    for updated in (store, restored):
+        updated.add_embeddings(
+            vectors[1900:], documents[1900:], metadatas[1900:], ids[1900:]
+        )
+        updated.delete(["id10"])
+    assert restored.search(queries, k=10)["ids"] == store.search(queries, k=10)["ids"]
+
+
+def test_import_into_another_metric_re_adds_rows(corpus, tmp_path):
+    vectors, queries, ids, documents, metadatas = corpus
+    store = NumpyVectorStore(distance_metric="cosine")
+    store.add_embeddings(vectors, documents, metadatas, ids)
+    path = str(tmp_path / "snapshot")
+    store.export_snapshot(path)
+
+    restored = NumpyVectorStore(distance_metric="l2")
+    assert restored.import_snapshot(path) == len(vectors)
+    assert not isinstance(restored._embeddings, np.memmap)
+
+    # The cosine store holds, and exports, normalized vectors
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    reference = NumpyVectorStore(distance_metric="l2")
+    reference.add_embeddings(normalized, documents, metadatas, ids)
+    assert restored.search(queries, k=5)["ids"] == reference.search(queries, k=5)["ids"]
+
+
+def test_sharded_round_trip(corpus, tmp_path):
+    vectors, queries, ids, documents, metadatas = corpus
+    path = str(tmp_path / "snapshot")
+    store = ShardedVectorStore(num_shards=3, distance_metric="l2")
+    restored = ShardedVectorStore(num_shards=2, distance_metric="l2")
+    try:
+        store.add_embeddings(vectors, documents, metadatas, ids)
+        store.delete(["id1"])
+        store.export_snapshot(path)
+
+        reference = NumpyVectorStore(distance_metric="l2")
+        assert reference.import_snapshot(path) == len(vectors) - 1
+        assert restored.import_snapshot(path) == len(vectors) - 1
+        expected = store.search(queries, k=10, filter_dict={"group": 2})["ids"]
+        assert reference.search(queries, k=10, filter_dict={"group": 2})["ids"] == (
+            expected
+        )
+        assert restored.search(queries, k=10, filter_dict={"group": 2})["ids"] == (
+            expected
+        )
+    finally:
+        store.clean_up()
+        restored.clean_up()
+
+
+def test_empty_store(tmp_path):
+    path = str(tmp_path / "snapshot")
+    assert NumpyVectorStore().export_snapshot(path) == 0
+    assert NumpyVectorStore().import_snapshot(path) == 0
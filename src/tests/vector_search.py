@@ -0,0 +1,30 @@
+import numpy as np
+
+
+def pairwise_distances(vectors, queries, metric):
+    """Distance of every query to every vector, as Chroma reports them."""
+    if metric == "cosine":
+        vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        queries = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+    if metric == "l2":
+        return ((queries[:, None, :] - vectors[None, :, :]) ** 2).sum(axis=2)
+    return 1.0 - queries @ vectors.T
+
+
+def brute_force_search(vectors, queries, k, metric):
+    """Exact top-k rows and distances of each query."""
+    distances = pairwise_distances(vectors, queries, metric)
+    order = np.argsort(distances, axis=1, kind="stable")[:, :k]
+    return order, np.take_along_axis(distances, order, axis=1)
+
+
+def recall(found_ids, expected_ids):
+    """Mean fraction of the expected ids found per query."""
+    return float(
+        np.mean(
+            [
+                len(set(found) & set(expected)) / len(expected)
+                for found, expected in zip(found_ids, expected_ids)
+            ]
+        )
+    )